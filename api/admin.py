@@ -1,14 +1,27 @@
 from .models import (
-    ExtendedUser, Parliamentary, ParliamentaryVote, Proposition,
-    SocialInformation, UserFollowing, UserVote, ContactUs
+    CompatibilityRefresh, ExtendedUser, Parliamentary, ParliamentaryVote,
+    Proposition, SocialInformation, UserFollowing, UserVote, ContactUs
 )
 from django.contrib import admin
 
 
+class CompatibilityRefreshAdmin(admin.ModelAdmin):
+    list_display = [
+        'created',
+        'started',
+        'finished',
+        'total_users',
+        'processed_users',
+        'touched_rows',
+        'skipped_rows'
+    ]
+
+
 class ExtendedUserAdmin(admin.ModelAdmin):
     list_display = [
         'user',
-        'should_update'
+        'should_update',
+        'update_scheduled'
     ]
 
 
@@ -81,6 +94,7 @@ class ContactUsAdmin(admin.ModelAdmin):
     ]
 
 
+admin.site.register(CompatibilityRefresh, CompatibilityRefreshAdmin)
 admin.site.register(ExtendedUser, ExtendedUserAdmin)
 admin.site.register(Parliamentary, ParliamentaryAdmin)
 admin.site.register(ParliamentaryVote, ParliamentaryVoteAdmin)
@@ -1,5 +1,34 @@
 from django.apps import AppConfig
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_migrate, post_save
+)
+
+
+def create_search_index(sender, using='default', **kwargs):
+    from api.search import create_search_index
+
+    create_search_index(using)
 
 
 class ApiConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        from django.contrib.auth import get_user_model
+        from django.contrib.auth.models import Group
+
+        from api.authentication import (
+            permissions_changed, token_deleted, user_changed
+        )
+
+        # The search index isn't a model, so it is created after migrating
+        post_migrate.connect(create_search_index, sender=self)
+
+        # Rejects the cached credentials of changed users and deleted tokens
+        User = get_user_model()
+        post_save.connect(user_changed, sender=User)
+        post_delete.connect(user_changed, sender=User)
+        for relation in [User.groups, User.user_permissions,
+                         Group.permissions]:
+            m2m_changed.connect(permissions_changed, sender=relation.through)
+        post_delete.connect(token_deleted, sender='authtoken.Token')
@@ -0,0 +1,221 @@
+import hashlib
+import hmac
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Q
+
+from rest_framework.authentication import (
+    BasicAuthentication, TokenAuthentication
+)
+
+
+CACHE_ALIAS = 'auth'
+
+CREDENTIAL_KEY = 'credential:{kind}:{digest}'
+USER_VERSION_KEY = 'user_version:{user}'
+REVOKED_KEY = 'revoked:{digest}'
+
+
+def keyed_digest(*values):
+    """
+    Returns the digest of the values keyed by the SECRET_KEY, so that
+    neither credentials nor unsalted hashes of them are stored in the cache.
+    """
+    return hmac.new(
+        settings.SECRET_KEY.encode('utf-8'),
+        '\0'.join(values).encode('utf-8'),
+        hashlib.sha256
+    ).hexdigest()
+
+
+def get_user_version(user_id):
+    """
+    Returns the version of the user, bumped by every change to him.
+
+    A missing version (never bumped, or evicted) starts from the current
+    time in milliseconds, so that it doesn't go back to a version some
+    cached credentials may still hold.
+    """
+    cache = caches[CACHE_ALIAS]
+    key = USER_VERSION_KEY.format(user=user_id)
+
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+
+    return version
+
+
+def bump_user_version(user_id):
+    """
+    Moves the version of the user forward, now and again when the current
+    transaction commits, rejecting the credentials cached with his previous
+    state.
+    """
+    def bump():
+        cache = caches[CACHE_ALIAS]
+        key = USER_VERSION_KEY.format(user=user_id)
+
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, int(time.time() * 1000), None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+class CachedCredentialsMixin(object):
+    """
+    Caches the (user, auth) resolved from valid credentials, keyed by their
+    digest, for the TIMEOUT of the 'auth' cache, so that warm requests are
+    authenticated without queries.
+
+    A cached entry is only accepted while the version of its user is still
+    the one it was cached with, and its credentials weren't revoked, as set
+    by the User, permissions and Token signals below.
+    """
+    credential_kind = None
+
+    def get_cached(self, digest):
+        cache = caches[CACHE_ALIAS]
+
+        cached = cache.get(
+            CREDENTIAL_KEY.format(kind=self.credential_kind, digest=digest)
+        )
+        if cached is None:
+            return None
+
+        user, auth, version = cached
+        version_key = USER_VERSION_KEY.format(user=user.pk)
+        revoked_key = REVOKED_KEY.format(digest=digest)
+
+        current = cache.get_many([version_key, revoked_key])
+        if revoked_key in current or current.get(version_key) != version:
+            return None
+
+        return user, auth
+
+    def set_cached(self, digest, user, auth):
+        """
+        Caches the user read again after his version, so that changes
+        committed since the credentials were checked either are read or
+        bump the version afterwards.
+        """
+        version = get_user_version(user.pk)
+
+        current = get_user_model().objects.filter(pk=user.pk).first()
+        if current is None or not current.is_active or \
+                current.password != user.password:
+            return
+
+        if auth is not None:
+            auth.user = current
+
+        caches[CACHE_ALIAS].set(
+            CREDENTIAL_KEY.format(kind=self.credential_kind, digest=digest),
+            (current, auth, version)
+        )
+
+
+class CachedBasicAuthentication(CachedCredentialsMixin, BasicAuthentication):
+    """
+    BasicAuthentication skipping the user query and password hash check of
+    the credentials already checked.
+    """
+    credential_kind = 'basic'
+
+    def authenticate_credentials(self, userid, password, request=None):
+        digest = keyed_digest(userid, password)
+
+        cached = self.get_cached(digest)
+        if cached is not None:
+            return cached
+
+        user, auth = super(
+            CachedBasicAuthentication,
+            self
+        ).authenticate_credentials(userid, password, request)
+        self.set_cached(digest, user, auth)
+
+        return user, auth
+
+
+class CachedTokenAuthentication(CachedCredentialsMixin, TokenAuthentication):
+    """
+    TokenAuthentication skipping the token and user query of the tokens
+    already resolved.
+    """
+    credential_kind = 'token'
+
+    def authenticate_credentials(self, key):
+        digest = keyed_digest(key)
+
+        cached = self.get_cached(digest)
+        if cached is not None:
+            return cached
+
+        user, token = super(
+            CachedTokenAuthentication,
+            self
+        ).authenticate_credentials(key)
+        self.set_cached(digest, user, token)
+
+        return user, token
+
+
+def user_changed(sender, instance, **kwargs):
+    bump_user_version(instance.pk)
+
+
+def permissions_changed(sender, instance, action, model, pk_set, **kwargs):
+    """
+    Bumps the version of the users whose groups or permissions, or the
+    permissions of whose groups, changed.
+    """
+    if action not in ('pre_clear', 'post_add', 'post_remove'):
+        return
+
+    User = get_user_model()
+
+    if isinstance(instance, User):
+        users_ids = [instance.pk]
+    elif model is User:
+        if pk_set is None:
+            pk_set = User.objects.filter(
+                Q(groups=instance) if isinstance(instance, Group)
+                else Q(user_permissions=instance)
+            ).values_list('pk', flat=True)
+        users_ids = pk_set
+    else:
+        if isinstance(instance, Group):
+            groups = [instance]
+        elif pk_set is None:
+            groups = Group.objects.filter(permissions=instance)
+        else:
+            groups = pk_set
+
+        users_ids = User.objects.filter(
+            groups__in=groups
+        ).values_list('pk', flat=True).distinct()
+
+    for user_id in list(users_ids):
+        bump_user_version(user_id)
+
+
+def token_deleted(sender, instance, **kwargs):
+    """
+    Revokes the deleted token, for longer than its cached entry may live.
+    """
+    cache = caches[CACHE_ALIAS]
+    cache.set(
+        REVOKED_KEY.format(digest=keyed_digest(instance.key)),
+        True,
+        2 * cache.default_timeout
+    )
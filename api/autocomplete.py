@@ -0,0 +1,177 @@
+import re
+import threading
+import time
+
+from django.conf import settings
+
+from api.models import Parliamentary
+from api.search import normalize
+
+
+class TrieNode(object):
+    __slots__ = ('children', 'complete', 'below')
+
+    def __init__(self):
+        self.children = dict()
+        # Parliamentarians with a word ending at this node, and with a word
+        # starting with the prefix of this node
+        self.complete = set()
+        self.below = set()
+
+
+class AutocompleteIndex(object):
+    """
+    Prefix trie over the normalized words of the parliamentarians names,
+    parties and federal units, holding only their ids so that suggestions
+    are ranked without touching the database.
+
+    The data of the suggested parliamentarians, such as their follower
+    counts, is read by the caller on each request, so it is never older
+    than the index.
+    """
+
+    def __init__(self, parliamentarians):
+        """
+        Indexes the given (id, name, political_party, federal_unit) rows.
+        """
+        self.root = TrieNode()
+        parliamentarians = list(parliamentarians)
+        self.parliamentarians_ids = [row[0] for row in parliamentarians]
+        self.sort_names = [normalize(row[1]) for row in parliamentarians]
+
+        for index, (parliamentary_id, name, political_party,
+                    federal_unit) in enumerate(parliamentarians):
+            text = ' '.join([name, political_party, federal_unit])
+            for word in set(words(text)):
+                self.add(word, index)
+
+    def add(self, word, index):
+        node = self.root
+        node.below.add(index)
+        for character in word:
+            node = node.children.setdefault(character, TrieNode())
+            node.below.add(index)
+        node.complete.add(index)
+
+    def match(self, word, max_typos):
+        """
+        Returns {index: (typos, complete)} of the parliamentarians with a
+        word starting with the given one, up to max_typos edits away,
+        keeping their best match.
+
+        Walks the trie with the rows of the Levenshtein distances between
+        the word and the prefix of each node, pruning the branches already
+        more than max_typos edits away.
+        """
+        hits = list()
+
+        def walk(node, row):
+            typos = row[-1]
+            if typos <= max_typos:
+                hits.append((typos, False, node.complete))
+                hits.append((typos, True, node.below))
+
+            if min(row) > max_typos:
+                return
+
+            for character, child in node.children.items():
+                next_row = [row[0] + 1]
+                for column in range(1, len(word) + 1):
+                    next_row.append(min(
+                        next_row[column - 1] + 1,
+                        row[column] + 1,
+                        row[column - 1] + (word[column - 1] != character)
+                    ))
+                walk(child, next_row)
+
+        walk(self.root, list(range(len(word) + 1)))
+
+        # Updates from the worst hits to the best ones, which overwrite them
+        matches = dict()
+        for typos, incomplete, indexes in sorted(
+            hits,
+            key=lambda hit: hit[:2],
+            reverse=True
+        ):
+            matches.update(dict.fromkeys(indexes, (typos, not incomplete)))
+
+        return matches
+
+    def suggest(self, query, limit):
+        """
+        Returns the ids of the limit parliamentarians with words
+        starting with every word of the query, allowing one typo in the
+        whole query (in words of 3 or more characters). Complete words rank
+        before prefixes, which rank before typos.
+        """
+        query_words = words(query)
+        if not query_words:
+            return []
+
+        candidates = None
+        for word in query_words:
+            matches = self.match(word, 1 if len(word) >= 3 else 0)
+            if candidates is None:
+                candidates = {
+                    index: (typos, int(complete))
+                    for index, (typos, complete) in matches.items()
+                }
+            else:
+                candidates = {
+                    index: (typos + matches[index][0],
+                            complete + matches[index][1])
+                    for index, (typos, complete) in candidates.items()
+                    if index in matches
+                }
+
+        ranked = sorted(
+            (typos, -complete, self.sort_names[index], index)
+            for index, (typos, complete) in candidates.items()
+            if typos <= 1
+        )[:limit]
+
+        return [
+            self.parliamentarians_ids[index] for _, _, _, index in ranked
+        ]
+
+
+def words(text):
+    return re.findall(r'[a-z0-9]+', normalize(text))
+
+
+_autocomplete_index = None
+_autocomplete_index_built = None
+_autocomplete_lock = threading.Lock()
+
+
+def get_autocomplete_index():
+    """
+    Returns the autocomplete index of this process, building it when there
+    is none yet, it was invalidated or it is older than AUTOCOMPLETE_TTL
+    seconds (refreshing the processes that didn't create the
+    parliamentarians).
+    """
+    global _autocomplete_index, _autocomplete_index_built
+
+    with _autocomplete_lock:
+        if _autocomplete_index is None or \
+                time.monotonic() - _autocomplete_index_built > \
+                settings.AUTOCOMPLETE_TTL:
+            _autocomplete_index = AutocompleteIndex(
+                Parliamentary.objects.order_by('id').values_list(
+                    'id',
+                    'name',
+                    'political_party',
+                    'federal_unit'
+                )
+            )
+            _autocomplete_index_built = time.monotonic()
+
+        return _autocomplete_index
+
+
+def invalidate_autocomplete_index():
+    global _autocomplete_index
+
+    with _autocomplete_lock:
+        _autocomplete_index = None
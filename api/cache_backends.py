@@ -0,0 +1,133 @@
+import pickle
+
+import redis
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+# Increments only existing keys, as the other backends do
+INCR_EXISTING = """
+if redis.call('exists', KEYS[1]) == 1 then
+    return redis.call('incrby', KEYS[1], ARGV[1])
+end
+return nil
+"""
+
+
+class RedisCache(BaseCache):
+    """
+    Django cache backend storing in the Redis server of the LOCATION URL,
+    in the OPTIONS['DB'] database (by default 1, apart from the celery
+    broker one). Integers are stored as such, so that incr is atomic.
+    """
+
+    def __init__(self, server, params):
+        super(RedisCache, self).__init__(params)
+
+        options = params.get('OPTIONS', {})
+        self._client = redis.StrictRedis.from_url(
+            server,
+            db=options.get('DB', 1)
+        )
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _timeout(self, timeout):
+        """
+        Returns the expiration of the timeout in milliseconds, or None when
+        it doesn't expire.
+        """
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return None
+
+        return max(int(timeout * 1000), 0)
+
+    def _dumps(self, value):
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    def _loads(self, value):
+        try:
+            return int(value)
+        except ValueError:
+            return pickle.loads(value)
+
+    def _set(self, client, key, value, timeout, only_new=False):
+        timeout = self._timeout(timeout)
+        if timeout == 0:
+            client.delete(key)
+            return False
+
+        return client.set(
+            key,
+            self._dumps(value),
+            px=timeout,
+            nx=only_new
+        )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return bool(self._set(
+            self._client,
+            self._key(key, version),
+            value,
+            timeout,
+            only_new=True
+        ))
+
+    def get(self, key, default=None, version=None):
+        value = self._client.get(self._key(key, version))
+        if value is None:
+            return default
+        return self._loads(value)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._set(self._client, self._key(key, version), value, timeout)
+
+    def delete(self, key, version=None):
+        self._client.delete(self._key(key, version))
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        values = self._client.mget(
+            [self._key(key, version) for key in keys]
+        )
+
+        return {
+            key: self._loads(value)
+            for key, value in zip(keys, values)
+            if value is not None
+        }
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        pipeline = self._client.pipeline()
+        for key, value in data.items():
+            self._set(pipeline, self._key(key, version), value, timeout)
+        pipeline.execute()
+
+        return []
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            self._client.delete(*keys)
+
+    def has_key(self, key, version=None):
+        return bool(self._client.exists(self._key(key, version)))
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+
+        value = self._client.eval(INCR_EXISTING, 1, key, delta)
+        if value is None:
+            raise ValueError("Key '%s' not found" % key)
+
+        return value
+
+    def clear(self):
+        self._client.flushdb()
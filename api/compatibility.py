@@ -0,0 +1,989 @@
+import logging
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from billiard import Pool
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.db.models import Count, F, Max, Q
+from django.utils import timezone
+
+from api.models import (
+    Compatibility, ExtendedUser, GroupCompatibility, Parliamentary,
+    ParliamentaryVote, UserVote
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+# Compatibility formula constants
+COMPATIBILITY_A = 1
+COMPATIBILITY_B = 2
+
+# Values of the parliamentary votes in the vote matrix, any other option is 0
+VOTE_VALUES = {
+    'Y': 1,
+    'N': -1
+}
+
+
+def calc_compatibility(valid_votes, matching_votes, user_valid_votes):
+    """
+    Returns the compatibility score between an user and a parliamentary.
+
+    user_valid_votes is the number of 'Y' and 'N' votes of the user.
+    """
+    A = COMPATIBILITY_A
+    B = COMPATIBILITY_B
+
+    try:
+        return (
+            matching_votes * (
+                user_valid_votes*A + valid_votes*B
+            ) / (
+                valid_votes * user_valid_votes * (A+B)
+            )
+        ) * 100
+    except ZeroDivisionError:
+        return 0
+
+
+def calc_compatibilities(valid_votes, matching_votes, user_valid_votes):
+    """
+    Vectorized calc_compatibility over numpy arrays of valid_votes and
+    matching_votes, giving exactly the same scores.
+    """
+    A = COMPATIBILITY_A
+    B = COMPATIBILITY_B
+
+    valid_votes = np.asarray(valid_votes, dtype=np.int64)
+    matching_votes = np.asarray(matching_votes, dtype=np.int64)
+    user_valid_votes = np.asarray(user_valid_votes, dtype=np.int64)
+
+    numerator = matching_votes * (user_valid_votes*A + valid_votes*B)
+    denominator = valid_votes * user_valid_votes * (A+B)
+
+    compatibilities = np.zeros(numerator.shape, dtype=np.float64)
+    np.divide(
+        numerator,
+        denominator,
+        out=compatibilities,
+        where=denominator != 0
+    )
+
+    return compatibilities * 100
+
+
+class VoteMatrix(object):
+    """
+    Parliamentary votes kept as a dense parliamentarians x propositions int8
+    matrix, where 'Y' is +1, 'N' is -1 and any other option (or no vote) is 0.
+
+    The valid and matching votes of an user against every parliamentary are
+    computed with column gathers (one user) or matrix products (many users).
+    """
+
+    def __init__(self, parliamentarians_ids, propositions_ids):
+        self.parliamentarians_ids = np.asarray(
+            parliamentarians_ids,
+            dtype=np.int64
+        )
+        self.parliamentary_index = {
+            parliamentary_id: index
+            for index, parliamentary_id in enumerate(parliamentarians_ids)
+        }
+        self.proposition_index = {
+            proposition_id: index
+            for index, proposition_id in enumerate(propositions_ids)
+        }
+        self.votes = np.zeros(
+            (len(self.parliamentary_index), len(self.proposition_index)),
+            dtype=np.int8
+        )
+
+    @classmethod
+    def from_db(cls):
+        """
+        Builds the matrix with all parliamentarians and every proposition
+        which has a 'Y' or 'N' parliamentary vote.
+        """
+        parliamentarians_ids = Parliamentary.objects.order_by(
+            'id'
+        ).values_list('id', flat=True)
+
+        parliamentary_votes = ParliamentaryVote.objects.filter(
+            Q(option='Y') | Q(option='N')
+        )
+
+        propositions_ids = parliamentary_votes.order_by(
+            'proposition'
+        ).values_list('proposition', flat=True).distinct()
+
+        vote_matrix = cls(list(parliamentarians_ids), list(propositions_ids))
+        vote_matrix.add_votes(
+            parliamentary_votes.values_list(
+                'parliamentary',
+                'proposition',
+                'option'
+            ).iterator()
+        )
+
+        return vote_matrix
+
+    def add_votes(self, votes):
+        """
+        Sets the given (parliamentary_id, proposition_id, option) votes,
+        ignoring parliamentarians and propositions unknown to the matrix.
+        """
+        for parliamentary_id, proposition_id, option in votes:
+            row = self.parliamentary_index.get(parliamentary_id)
+            column = self.proposition_index.get(proposition_id)
+
+            if row is not None and column is not None:
+                self.votes[row, column] = VOTE_VALUES.get(option, 0)
+
+    def user_vectors(self, user_votes):
+        """
+        Returns the user votes, given as (proposition_id, option) pairs, as
+        the columns he voted on and the columns and values of his 'Y' and 'N'
+        votes.
+        """
+        voted_columns = list()
+        valid_columns = list()
+        valid_values = list()
+
+        for proposition_id, option in user_votes:
+            column = self.proposition_index.get(proposition_id)
+
+            if column is not None:
+                voted_columns.append(column)
+
+                if option in VOTE_VALUES:
+                    valid_columns.append(column)
+                    valid_values.append(VOTE_VALUES[option])
+
+        return (
+            np.asarray(voted_columns, dtype=np.intp),
+            np.asarray(valid_columns, dtype=np.intp),
+            np.asarray(valid_values, dtype=np.int8)
+        )
+
+    def counts(self, user_votes):
+        """
+        Returns the valid_votes and matching_votes arrays, aligned with
+        parliamentarians_ids, of one user.
+        """
+        voted_columns, valid_columns, valid_values = \
+            self.user_vectors(user_votes)
+
+        valid_votes = np.count_nonzero(self.votes[:, voted_columns], axis=1)
+        matching_votes = np.count_nonzero(
+            self.votes[:, valid_columns] == valid_values,
+            axis=1
+        )
+
+        return valid_votes, matching_votes
+
+    def counts_batch(self, users_votes):
+        """
+        Returns the users x parliamentarians valid_votes and matching_votes
+        matrices of a batch of users, given as a list of user votes.
+        """
+        voted = np.zeros(
+            (len(users_votes), self.votes.shape[1]),
+            dtype=np.float32
+        )
+        values = np.zeros(voted.shape, dtype=np.float32)
+
+        for row, user_votes in enumerate(users_votes):
+            voted_columns, valid_columns, valid_values = \
+                self.user_vectors(user_votes)
+            voted[row, voted_columns] = 1
+            values[row, valid_columns] = valid_values
+
+        # float32 products are exact for counts below 2**24
+        parliamentary_values = self.votes.T.astype(np.float32)
+        parliamentary_voted = np.abs(parliamentary_values)
+
+        valid_votes = voted @ parliamentary_voted
+        matching_votes = (
+            np.abs(values) @ parliamentary_voted +
+            values @ parliamentary_values
+        ) / 2
+
+        return (
+            np.rint(valid_votes).astype(np.int64),
+            np.rint(matching_votes).astype(np.int64)
+        )
+
+
+_vote_matrix = None
+_vote_matrix_state = None
+
+
+def get_vote_matrix():
+    """
+    Returns the vote matrix of this process, rebuilding it when
+    parliamentarians or parliamentary votes were added or removed.
+    """
+    global _vote_matrix, _vote_matrix_state
+
+    state = (
+        Parliamentary.objects.aggregate(count=Count('id'), last=Max('id')),
+        ParliamentaryVote.objects.aggregate(count=Count('id'), last=Max('id'))
+    )
+
+    if _vote_matrix is None or state != _vote_matrix_state:
+        _vote_matrix = VoteMatrix.from_db()
+        _vote_matrix_state = state
+
+    return _vote_matrix
+
+
+def invalidate_vote_matrix():
+    global _vote_matrix, _vote_matrix_state
+
+    _vote_matrix = None
+    _vote_matrix_state = None
+
+
+class VoteBitsetIndex(object):
+    """
+    Parliamentary votes kept, for each proposition, as a pair of Python int
+    bitsets over a dense parliamentary ordinal space: the parliamentarians
+    who voted 'Y' and the ones who voted 'N'.
+
+    User votes are sparse, so the valid and matching votes of an user against
+    every parliamentary are computed by adding, bitwise across all
+    parliamentarians at once, the bitsets of the propositions he voted on.
+    """
+
+    def __init__(self):
+        self.parliamentarians_ids = list()
+        self.parliamentary_index = dict()
+        self.yes = dict()
+        self.no = dict()
+        self.last_vote_id = 0
+        self.votes_count = 0
+        self.stale = False
+
+    @classmethod
+    def from_db(cls):
+        """
+        Builds the index with all parliamentarians in one streaming pass over
+        the parliamentary votes.
+        """
+        vote_index = cls()
+        vote_index.update_from_db()
+
+        return vote_index
+
+    def update_from_db(self):
+        """
+        Adds the parliamentarians and parliamentary votes created since the
+        index was built or last updated.
+        """
+        new_parliamentarians_ids = Parliamentary.objects.filter(
+            id__gt=max(self.parliamentarians_ids, default=0)
+        ).order_by('id').values_list('id', flat=True)
+
+        for parliamentary_id in new_parliamentarians_ids:
+            self.parliamentary_index[parliamentary_id] = \
+                len(self.parliamentarians_ids)
+            self.parliamentarians_ids.append(parliamentary_id)
+
+        new_votes = ParliamentaryVote.objects.filter(
+            id__gt=self.last_vote_id
+        ).order_by('id').values_list(
+            'id',
+            'parliamentary',
+            'proposition',
+            'option'
+        )
+
+        for vote_id, parliamentary_id, proposition_id, option in \
+                new_votes.iterator():
+            self.add_vote(parliamentary_id, proposition_id, option)
+            self.last_vote_id = vote_id
+            self.votes_count += 1
+
+    @property
+    def parliamentarians_count(self):
+        return len(self.parliamentarians_ids)
+
+    def add_vote(self, parliamentary_id, proposition_id, option):
+        """
+        Sets the given parliamentary vote, marking the index stale when the
+        parliamentary is unknown to it, such as one committed after a
+        parliamentary with a greater id was already indexed.
+        """
+        ordinal = self.parliamentary_index.get(parliamentary_id)
+
+        if ordinal is None:
+            self.stale = True
+            return
+
+        bit = 1 << ordinal
+
+        if option == 'Y':
+            self.yes[proposition_id] = self.yes.get(proposition_id, 0) | bit
+        elif option == 'N':
+            self.no[proposition_id] = self.no.get(proposition_id, 0) | bit
+
+    def counts(self, user_votes):
+        """
+        Returns the valid_votes and matching_votes lists, aligned with
+        parliamentarians_ids, of the user votes given as
+        (proposition_id, option) pairs.
+        """
+        valid_bitsets = list()
+        matching_bitsets = list()
+
+        for proposition_id, option in user_votes:
+            yes = self.yes.get(proposition_id, 0)
+            no = self.no.get(proposition_id, 0)
+
+            valid_bitsets.append(yes | no)
+
+            if option == 'Y':
+                matching_bitsets.append(yes)
+            elif option == 'N':
+                matching_bitsets.append(no)
+
+        size = len(self.parliamentarians_ids)
+
+        return (
+            counter_values(count_bits(valid_bitsets), size),
+            counter_values(count_bits(matching_bitsets), size)
+        )
+
+
+def count_bits(bitsets):
+    """
+    Counts, for every bit position, how many of the bitsets have it set.
+
+    Returns the counts as bit planes: bit k of the i-th plane is the i-th bit
+    of the count of position k.
+    """
+    counter = list()
+
+    while bitsets:
+        carries = list()
+
+        # Full adders reduce every three bitsets of this plane's weight to
+        # one, carrying to the next plane
+        while len(bitsets) > 1:
+            reduced = list()
+
+            for i in range(0, len(bitsets) - 1, 3):
+                group = bitsets[i:i + 3]
+
+                if len(group) == 3:
+                    a, b, c = group
+                    partial = a ^ b
+                    reduced.append(partial ^ c)
+                    carries.append(a & b | partial & c)
+                else:
+                    a, b = group
+                    reduced.append(a ^ b)
+                    carries.append(a & b)
+
+            if len(bitsets) % 3 == 1:
+                reduced.append(bitsets[-1])
+
+            bitsets = reduced
+
+        counter.append(bitsets[0])
+        bitsets = carries
+
+    return counter
+
+
+def counter_values(counter, size):
+    """
+    Returns the first size counts of the bit planes of count_bits as a list.
+    """
+    values = np.zeros(size, dtype=np.int64)
+    length = (size + 7) // 8
+
+    for i, plane in enumerate(counter):
+        bits = np.unpackbits(
+            np.frombuffer(plane.to_bytes(length, 'little'), dtype=np.uint8),
+            bitorder='little'
+        )
+        values += bits[:size].astype(np.int64) << i
+
+    return values.tolist()
+
+
+_vote_bitset_index = None
+_vote_bitset_index_state = None
+
+
+def get_vote_bitset_index():
+    """
+    Returns the vote bitset index of this process, catching up with the
+    parliamentarians and parliamentary votes created since its last use and
+    rebuilding it when any of them was removed or missed.
+
+    The returned index may still be stale if parliamentarians were missed
+    again while rebuilding it; it is rebuilt again on the next use.
+    """
+    global _vote_bitset_index, _vote_bitset_index_state
+
+    state = (
+        Parliamentary.objects.aggregate(count=Count('id'), last=Max('id')),
+        ParliamentaryVote.objects.aggregate(count=Count('id'), last=Max('id'))
+    )
+
+    if _vote_bitset_index is None or _vote_bitset_index.stale or \
+            state != _vote_bitset_index_state:
+        if _vote_bitset_index is None or _vote_bitset_index.stale:
+            _vote_bitset_index = VoteBitsetIndex.from_db()
+        else:
+            _vote_bitset_index.update_from_db()
+
+        if _vote_bitset_index.stale or \
+                (_vote_bitset_index.parliamentarians_count,
+                 _vote_bitset_index.votes_count) != \
+                (state[0]['count'], state[1]['count']):
+            _vote_bitset_index = VoteBitsetIndex.from_db()
+
+        _vote_bitset_index_state = state
+
+    return _vote_bitset_index
+
+
+def invalidate_vote_bitset_index():
+    global _vote_bitset_index, _vote_bitset_index_state
+
+    _vote_bitset_index = None
+    _vote_bitset_index_state = None
+
+
+def sql_compatibility_counts(user):
+    """
+    Returns (parliamentary_id, valid_votes, matching_votes) of the user for
+    all parliamentarians, counting both in a single query.
+
+    The parliamentary votes on propositions the user voted on are LEFT
+    JOINed to the parliamentarians, so the ones with no overlap get zeros.
+    """
+    quote_name = connection.ops.quote_name
+
+    def table(model):
+        return quote_name(model._meta.db_table)
+
+    def column(model, name):
+        return quote_name(model._meta.get_field(name).column)
+
+    sql = (
+        'SELECT {parliamentary}.{id}, '
+        'COUNT({user_vote}.{id}), '
+        'COALESCE(SUM(CASE WHEN {user_vote}.{user_option} = '
+        '{parliamentary_vote}.{parliamentary_option} THEN 1 ELSE 0 END), 0) '
+        'FROM {parliamentary} '
+        'LEFT JOIN ('
+        '{parliamentary_vote} INNER JOIN {user_vote} ON '
+        '{user_vote}.{user_proposition} = '
+        '{parliamentary_vote}.{parliamentary_proposition} AND '
+        '{user_vote}.{user} = %s AND '
+        '{parliamentary_vote}.{parliamentary_option} IN (%s, %s)'
+        ') ON {parliamentary_vote}.{parliamentary_vote_parliamentary} = '
+        '{parliamentary}.{id} '
+        'GROUP BY {parliamentary}.{id} '
+        'ORDER BY {parliamentary}.{id}'
+    ).format(
+        parliamentary=table(Parliamentary),
+        parliamentary_vote=table(ParliamentaryVote),
+        user_vote=table(UserVote),
+        id=quote_name('id'),
+        user=column(UserVote, 'user'),
+        user_option=column(UserVote, 'option'),
+        user_proposition=column(UserVote, 'proposition'),
+        parliamentary_option=column(ParliamentaryVote, 'option'),
+        parliamentary_proposition=column(ParliamentaryVote, 'proposition'),
+        parliamentary_vote_parliamentary=column(
+            ParliamentaryVote,
+            'parliamentary'
+        )
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user.pk, 'Y', 'N'])
+        return [tuple(row) for row in cursor.fetchall()]
+
+
+def matrix_compatibility_counts(user):
+    """
+    Returns (parliamentary_id, valid_votes, matching_votes) of the user for
+    all parliamentarians, using the vote matrix of this process.
+    """
+    vote_matrix = get_vote_matrix()
+    user_votes = user.votes.values_list('proposition', 'option')
+
+    valid_votes, matching_votes = vote_matrix.counts(user_votes)
+
+    return list(zip(
+        vote_matrix.parliamentarians_ids.tolist(),
+        valid_votes.tolist(),
+        matching_votes.tolist()
+    ))
+
+
+def bitset_compatibility_counts(user):
+    """
+    Returns (parliamentary_id, valid_votes, matching_votes) of the user for
+    all parliamentarians, using the vote bitset index of this process, or
+    the sql engine while the index is stale.
+    """
+    vote_index = get_vote_bitset_index()
+
+    if vote_index.stale:
+        return sql_compatibility_counts(user)
+
+    user_votes = user.votes.values_list('proposition', 'option')
+
+    valid_votes, matching_votes = vote_index.counts(user_votes)
+
+    return list(zip(
+        vote_index.parliamentarians_ids,
+        valid_votes,
+        matching_votes
+    ))
+
+
+COMPATIBILITY_ENGINES = {
+    'sql': sql_compatibility_counts,
+    'matrix': matrix_compatibility_counts,
+    'bitset': bitset_compatibility_counts,
+}
+
+
+def compatibility_counts(user):
+    """
+    Returns (parliamentary_id, valid_votes, matching_votes) of the user for
+    all parliamentarians, using the COMPATIBILITY_ENGINE setting.
+    """
+    engine = COMPATIBILITY_ENGINES[settings.COMPATIBILITY_ENGINE]
+    return engine(user)
+
+
+def update_user_compatibility(user):
+    """
+    Recomputes and stores the compatibilities of the user with all
+    parliamentarians, clearing his update flags in the same transaction, so
+    that he is only marked up to date once they are stored.
+
+    Returns the number of stored rows touched and skipped as unchanged.
+    """
+
+    with transaction.atomic():
+        # Vote writes lock the user too (see update_compatibility_vote), so
+        # votes not seen here apply their deltas to the rows stored here
+        ExtendedUser.objects.select_for_update().filter(user=user).exists()
+
+        user_valid_votes = user.votes.filter(
+            Q(option='Y') | Q(option='N')
+        ).count()
+
+        compatibilities = [
+            (
+                user.pk,
+                parliamentary_id,
+                valid_votes,
+                matching_votes,
+                calc_compatibility(
+                    valid_votes,
+                    matching_votes,
+                    user_valid_votes
+                )
+            )
+            for parliamentary_id, valid_votes, matching_votes
+            in compatibility_counts(user)
+        ]
+
+        touched, skipped = store_compatibilities(compatibilities)
+
+        ExtendedUser.objects.filter(user=user).update(
+            should_update=False,
+            update_scheduled=None
+        )
+
+    logger.info(
+        'Compatibilities of user %s: %s rows touched, %s skipped',
+        user.pk,
+        touched,
+        skipped
+    )
+
+    return touched, skipped
+
+
+# Stored rows fields, starting with the ones they are unique together by
+COMPATIBILITY_FIELDS = (
+    'user', 'parliamentary', 'valid_votes', 'matching_votes', 'compatibility'
+)
+GROUP_COMPATIBILITY_FIELDS = (
+    'user', 'group', 'name', 'parliamentarians', 'valid_votes',
+    'matching_votes', 'compatibility'
+)
+
+
+def store_compatibilities(compatibilities):
+    """
+    Stores the given
+    (user_id, parliamentary_id, valid_votes, matching_votes, compatibility)
+    rows and the political party and federal unit aggregates of them.
+
+    Returns the number of compatibility rows touched and skipped.
+    """
+    users_ids = {row[0] for row in compatibilities}
+
+    touched, skipped = store_rows(
+        Compatibility,
+        COMPATIBILITY_FIELDS,
+        2,
+        compatibilities
+    )
+    store_group_compatibilities(users_ids, compatibilities)
+
+    bump_compatibility_version(users_ids)
+
+    return touched, skipped
+
+
+COMPATIBILITY_MAP_KEY = 'compatibility_map:{user}:{version}'
+
+
+def bump_compatibility_version(users_ids):
+    """
+    Moves the compatibility version of the given users forward, which must
+    happen in the transaction writing their compatibilities, so that the
+    maps cached for the previous version are no longer read.
+    """
+    ExtendedUser.objects.filter(user__in=users_ids).update(
+        compatibility_version=F('compatibility_version') + 1
+    )
+
+
+def get_compatibility_map(user):
+    """
+    Returns the {parliamentary_id: compatibility} map of the user, cached
+    for the current version of his compatibilities.
+
+    A new version is committed together with the rows it stands for, so
+    the map of a version is replaced as a whole once a recompute finishes.
+    """
+    version = ExtendedUser.objects.filter(user=user).values_list(
+        'compatibility_version',
+        flat=True
+    ).first()
+
+    key = COMPATIBILITY_MAP_KEY.format(user=user.pk, version=version)
+    compatibility_map = cache.get(key)
+
+    if compatibility_map is None:
+        compatibility_map = dict(
+            user.compatibilities.values_list('parliamentary', 'compatibility')
+        )
+        cache.set(key, compatibility_map, settings.COMPATIBILITY_MAP_TIMEOUT)
+
+    return compatibility_map
+
+
+def group_compatibilities(compatibilities):
+    """
+    Returns the (user_id, group, name, parliamentarians, valid_votes,
+    matching_votes, compatibility) aggregates of the given compatibility rows
+    by political party and by federal unit, where compatibility is the mean
+    of the parliamentarians scores weighted by their valid votes.
+    """
+    parliamentarians_groups = {
+        parliamentary_id: (
+            (GroupCompatibility.POLITICAL_PARTY, political_party),
+            (GroupCompatibility.FEDERAL_UNIT, federal_unit)
+        )
+        for parliamentary_id, political_party, federal_unit
+        in Parliamentary.objects.values_list(
+            'id',
+            'political_party',
+            'federal_unit'
+        )
+    }
+
+    totals = dict()
+    for user_id, parliamentary_id, valid_votes, matching_votes, \
+            compatibility in compatibilities:
+        for group, name in parliamentarians_groups[parliamentary_id]:
+            if name:
+                group_totals = totals.setdefault(
+                    (user_id, group, name),
+                    [0, 0, 0, 0.0]
+                )
+                group_totals[0] += 1
+                group_totals[1] += valid_votes
+                group_totals[2] += matching_votes
+                group_totals[3] += compatibility * valid_votes
+
+    return [
+        key + (
+            parliamentarians,
+            valid_votes,
+            matching_votes,
+            weighted_compatibility / valid_votes if valid_votes else 0
+        )
+        for key, (parliamentarians, valid_votes, matching_votes,
+                  weighted_compatibility) in sorted(totals.items())
+    ]
+
+
+def update_user_group_compatibilities(user):
+    """
+    Recomputes and stores the political party and federal unit aggregates
+    of the user from his stored compatibilities.
+    """
+    store_group_compatibilities(
+        [user.pk],
+        list(
+            user.compatibilities.order_by(
+                'parliamentary'
+            ).values_list(*COMPATIBILITY_FIELDS)
+        )
+    )
+
+
+def store_group_compatibilities(users_ids, compatibilities):
+    """
+    Stores the political party and federal unit aggregates of the given
+    compatibility rows of the users, deleting their stored aggregates of
+    groups no longer found in them, such as the party a parliamentary left.
+
+    Must run in the transaction writing the compatibilities, so that the
+    users never read a mix of old and new groups.
+    """
+    rows = group_compatibilities(compatibilities)
+
+    store_rows(GroupCompatibility, GROUP_COMPATIBILITY_FIELDS, 3, rows)
+
+    groups = {tuple(row[:3]) for row in rows}
+    stale = [
+        pk
+        for pk, *group in GroupCompatibility.objects.filter(
+            user__in=users_ids
+        ).values_list('pk', 'user', 'group', 'name')
+        if tuple(group) not in groups
+    ]
+    GroupCompatibility.objects.filter(pk__in=stale).delete()
+
+
+def store_rows(model, fields, unique, rows):
+    """
+    Upserts the given rows of the fields of a model, by the first unique
+    fields, skipping the ones already stored with the same values.
+
+    The model must have an user field and be unique together by the first
+    unique fields. Returns the number of rows touched and skipped.
+    """
+    stored = set(
+        model.objects.filter(
+            user__in={row[0] for row in rows}
+        ).values_list(*fields)
+    )
+
+    changed = [row for row in rows if tuple(row) not in stored]
+    upsert_rows(model, fields, unique, changed)
+
+    return len(changed), len(rows) - len(changed)
+
+
+def upsert_rows(model, fields, unique, rows):
+    """
+    Inserts or updates, by the first unique fields, the given rows of the
+    fields of a model.
+    """
+    columns = [
+        connection.ops.quote_name(model._meta.get_field(name).column)
+        for name in fields
+    ]
+
+    batch_size = 500
+    if connection.features.max_query_params:
+        batch_size = min(
+            batch_size,
+            connection.features.max_query_params // len(columns)
+        )
+
+    sql = (
+        'INSERT INTO {table} ({columns}) VALUES {values} '
+        'ON CONFLICT ({unique}) DO UPDATE SET {updates}'
+    )
+    row_values = '({})'.format(', '.join(['%s'] * len(columns)))
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            cursor.execute(
+                sql.format(
+                    table=connection.ops.quote_name(model._meta.db_table),
+                    columns=', '.join(columns),
+                    values=', '.join([row_values] * len(batch)),
+                    unique=', '.join(columns[:unique]),
+                    updates=', '.join(
+                        '{column} = excluded.{column}'.format(column=column)
+                        for column in columns[unique:]
+                    )
+                ),
+                [value for row in batch for value in row]
+            )
+
+
+def refresh_users_compatibilities(users_ids):
+    """
+    Recomputes, in batch with the vote matrix, and stores the compatibilities
+    of the given users, clearing their update flags in the same transaction.
+
+    Returns the number of refreshed users and of stored rows touched and
+    skipped as unchanged.
+    """
+    vote_matrix = get_vote_matrix()
+
+    with transaction.atomic():
+        # Vote writes lock these users too (see update_compatibility_vote),
+        # so votes not seen here apply their deltas to the rows stored here
+        users_ids = list(
+            ExtendedUser.objects.select_for_update().filter(
+                user__in=users_ids
+            ).values_list('user', flat=True)
+        )
+
+        users_votes = defaultdict(list)
+        for user_id, proposition_id, option in UserVote.objects.filter(
+            user__in=users_ids
+        ).values_list('user', 'proposition', 'option'):
+            users_votes[user_id].append((proposition_id, option))
+
+        users_votes = [users_votes[user_id] for user_id in users_ids]
+        users_valid_votes = np.array([
+            sum(1 for proposition_id, option in user_votes
+                if option in VOTE_VALUES)
+            for user_votes in users_votes
+        ])
+
+        valid_votes, matching_votes = vote_matrix.counts_batch(users_votes)
+        compatibilities = calc_compatibilities(
+            valid_votes,
+            matching_votes,
+            users_valid_votes[:, np.newaxis]
+        )
+
+        parliamentarians_ids = vote_matrix.parliamentarians_ids.tolist()
+        touched, skipped = store_compatibilities([
+            row
+            for i, user_id in enumerate(users_ids)
+            for row in zip(
+                [user_id] * len(parliamentarians_ids),
+                parliamentarians_ids,
+                valid_votes[i].tolist(),
+                matching_votes[i].tolist(),
+                compatibilities[i].tolist()
+            )
+        ])
+
+        ExtendedUser.objects.filter(user__in=users_ids).update(
+            should_update=False,
+            update_scheduled=None
+        )
+
+    return len(users_ids), touched, skipped
+
+
+def _close_connections():
+    connections.close_all()
+
+
+def refresh_compatibilities(refresh, processes=None, chunk_size=None):
+    """
+    Runs the CompatibilityRefresh job: recomputes the compatibilities of all
+    users flagged with should_update and update_scheduled, sharding them in
+    chunks across a pool of processes.
+
+    Users are unflagged as their chunks are stored, so running the job again
+    after a failure resumes it with the remaining users.
+    """
+    if processes is None:
+        processes = settings.COMPATIBILITY_REFRESH_PROCESSES
+    if chunk_size is None:
+        chunk_size = settings.COMPATIBILITY_REFRESH_CHUNK_SIZE
+
+    users_ids = list(
+        ExtendedUser.objects.filter(
+            should_update=True,
+            update_scheduled__isnull=False
+        ).order_by('user').values_list('user', flat=True)
+    )
+    chunks = [
+        users_ids[start:start + chunk_size]
+        for start in range(0, len(users_ids), chunk_size)
+    ]
+
+    if refresh.started is None:
+        refresh.started = timezone.now()
+    refresh.total_users = refresh.processed_users + len(users_ids)
+    refresh.save()
+
+    # Built before forking, so that it is shared by the pool processes
+    get_vote_matrix()
+
+    start = time.perf_counter()
+    processed_users = 0
+
+    # SQLite serializes writers, so chunks run in this process
+    if processes == 1 or len(chunks) <= 1 or connection.vendor == 'sqlite':
+        pool = None
+        results = map(refresh_users_compatibilities, chunks)
+    else:
+        # Pool processes must not share the database connection
+        _close_connections()
+        # billiard pools can be started from celery worker processes
+        pool = Pool(processes, initializer=_close_connections)
+        results = pool.imap_unordered(refresh_users_compatibilities, chunks)
+
+    try:
+        for refreshed_users, touched, skipped in results:
+            processed_users += refreshed_users
+            elapsed = time.perf_counter() - start
+
+            refresh.processed_users += refreshed_users
+            refresh.touched_rows += touched
+            refresh.skipped_rows += skipped
+            refresh.save(update_fields=[
+                'processed_users',
+                'touched_rows',
+                'skipped_rows'
+            ])
+
+            logger.info(
+                'Compatibility refresh %s: %s/%s users (%.1f users/s), '
+                '%s rows touched, %s skipped',
+                refresh.pk,
+                refresh.processed_users,
+                refresh.total_users,
+                processed_users / elapsed if elapsed else 0,
+                refresh.touched_rows,
+                refresh.skipped_rows
+            )
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    refresh.finished = timezone.now()
+    refresh.save()
+
+    return refresh
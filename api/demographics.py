@@ -0,0 +1,463 @@
+from collections import Counter, defaultdict
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from api.models import (
+    AGE_CHOICES, DemographicCell, ParliamentaryVote, SocialInformation,
+    UserVote
+)
+from api.response_cache import CACHE_ALIAS
+
+
+# Answers whose percentage is charted, any other option is only counted in
+# the total (and in 'others' for the parliamentarians)
+CHART_ANSWERS = ['Y', 'N', 'A']
+
+# Charted values of each social information dimension, None meaning users
+# who didn't inform it
+DIMENSIONS = {
+    'region': ['N', 'NE', 'CO', 'SE', 'S', None],
+    'income': ['E', 'D', 'C', 'B', 'A', None],
+    'education': ['SE', 'EF', 'EM', 'ES', 'PG', None],
+    'race': ['B', 'PR', 'A', 'PA', 'I', None],
+    'gender': ['M', 'F', 'O', None],
+}
+
+# Dimensions of the demographic cube, which also buckets the voters age
+CUBE_DIMENSIONS = dict(
+    DIMENSIONS,
+    age=[age for age, _ in AGE_CHOICES[1:]] + [None]
+)
+
+# Lowest age of each age bucket
+AGE_BUCKETS = [
+    (60, '60+'),
+    (45, '45-59'),
+    (35, '35-44'),
+    (25, '25-34'),
+    (16, '16-24'),
+    (0, '0-15'),
+]
+
+CACHE_KEY = 'demographics:{proposition_id}'
+
+
+def percentage(part, total):
+    return round(part / total * 100, 2)
+
+
+def calc_totals_chart(option_votes, others=False):
+    """
+    Returns the chart of the {option: votes} counts, with the percentage of
+    the votes with other options if others is True.
+    """
+    total = sum(option_votes.values())
+
+    if not total:
+        chart = {answer: 0.0 for answer in CHART_ANSWERS}
+        if others:
+            chart['others'] = 0.0
+        chart['count'] = 0
+        return chart
+
+    chart = {
+        answer: percentage(option_votes[answer], total)
+        for answer in CHART_ANSWERS
+    }
+    if others:
+        chart['others'] = percentage(
+            total - sum(option_votes[answer] for answer in CHART_ANSWERS),
+            total
+        )
+    chart['count'] = total
+
+    return chart
+
+
+def calc_dimension_chart(value_votes, values):
+    """
+    Returns the chart of a dimension from its {value: {option: votes}}
+    counts, for each of the charted values.
+    """
+    return {
+        value: calc_totals_chart(value_votes.get(value, Counter()))
+        for value in values
+    }
+
+
+def age_bucket(birth_date, today=None):
+    """
+    Returns the age bucket of a birth date, or None if there is none.
+    """
+    if birth_date is None:
+        return None
+
+    today = today or date.today()
+    age = today.year - birth_date.year - (
+        (today.month, today.day) < (birth_date.month, birth_date.day)
+    )
+
+    for lowest_age, bucket in AGE_BUCKETS:
+        if age >= lowest_age:
+            return bucket
+
+    return AGE_BUCKETS[-1][1]
+
+
+def voter_profile(social_information):
+    """
+    Returns the (region, income, education, race, gender, age) cube cell
+    values of a voter with the given social information (or None), blank
+    when uninformed.
+    """
+    if social_information is None:
+        return ('',) * len(CUBE_DIMENSIONS)
+
+    return tuple(
+        value or ''
+        for value in [
+            social_information.region,
+            social_information.income,
+            social_information.education,
+            social_information.race,
+            social_information.gender,
+            age_bucket(social_information.birth_date),
+        ]
+    )
+
+
+def user_profile(user):
+    """
+    Returns the voter_profile of the user, as currently stored.
+    """
+    return voter_profile(
+        SocialInformation.objects.filter(owner=user).first()
+    )
+
+
+def count_cells(proposition_id):
+    """
+    Returns the {(option, *profile): votes} cube cells of the proposition,
+    counted from its user votes.
+    """
+    lookups = ['user__social_information__' + dimension
+               for dimension in DIMENSIONS]
+    lookups.append('user__social_information__birth_date')
+
+    cells = Counter()
+    for row in UserVote.objects.filter(
+        proposition=proposition_id
+    ).values('option', *lookups).annotate(votes=Count('id')).order_by():
+        profile = [row[lookup] or '' for lookup in lookups[:-1]]
+        profile.append(age_bucket(row[lookups[-1]]) or '')
+
+        cells[(row['option'],) + tuple(profile)] += row['votes']
+
+    return cells
+
+
+def cell_lookups(cell):
+    return dict(zip(['option'] + list(CUBE_DIMENSIONS), cell))
+
+
+def create_cube(proposition_id):
+    """
+    Creates the cube cells of a proposition, counted from its votes. Returns
+    whether they were created, or already existed.
+    """
+    try:
+        with transaction.atomic():
+            DemographicCell.objects.bulk_create([
+                DemographicCell(
+                    proposition_id=proposition_id,
+                    votes=votes,
+                    **cell_lookups(cell)
+                )
+                for cell, votes in count_cells(proposition_id).items()
+            ])
+    except IntegrityError:
+        return False
+
+    return True
+
+
+def add_to_cube(proposition_id, deltas):
+    """
+    Adds the given {(option, *profile): delta} deltas to the cube cells of
+    the proposition, and drops its cached demographics.
+
+    Propositions without cells get them counted from their votes, which
+    must already include the counted changes.
+    """
+    deltas = {cell: delta for cell, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    invalidate_demographics([proposition_id])
+
+    cells = DemographicCell.objects.filter(proposition=proposition_id)
+
+    with transaction.atomic():
+        if not cells.exists() and create_cube(proposition_id):
+            return
+
+        for cell, delta in deltas.items():
+            lookups = cell_lookups(cell)
+            if cells.filter(**lookups).update(votes=F('votes') + delta):
+                continue
+
+            try:
+                with transaction.atomic():
+                    DemographicCell.objects.create(
+                        proposition_id=proposition_id,
+                        votes=delta,
+                        **lookups
+                    )
+            except IntegrityError:
+                # Created concurrently
+                cells.filter(**lookups).update(votes=F('votes') + delta)
+
+
+def update_vote_cube(user, proposition_id, old_option=None, new_option=None):
+    """
+    Updates the cube after a vote of the user changed from old_option to
+    new_option (None meaning that there was no vote before, or there is no
+    vote after).
+    """
+    if old_option == new_option:
+        return
+
+    profile = user_profile(user)
+
+    deltas = Counter()
+    if old_option is not None:
+        deltas[(old_option,) + profile] -= 1
+    if new_option is not None:
+        deltas[(new_option,) + profile] += 1
+
+    add_to_cube(proposition_id, deltas)
+
+
+def update_user_vote_cube(user_vote, data):
+    """
+    Updates the cube after user_vote was edited to the serialized data.
+    """
+    if user_vote.proposition_id == data['proposition']:
+        update_vote_cube(
+            user_vote.user,
+            user_vote.proposition_id,
+            user_vote.option,
+            data['option']
+        )
+    else:
+        update_vote_cube(
+            user_vote.user,
+            user_vote.proposition_id,
+            old_option=user_vote.option
+        )
+        update_vote_cube(
+            user_vote.user,
+            data['proposition'],
+            new_option=data['option']
+        )
+
+
+def move_voter_cells(user, old_profile):
+    """
+    Moves the votes of the user from the cube cells of its old_profile to
+    the ones of its current profile, after its social information changed.
+    """
+    new_profile = user_profile(user)
+    if new_profile == old_profile:
+        return
+
+    deltas = defaultdict(Counter)
+    for vote in UserVote.objects.filter(user=user).values(
+        'proposition',
+        'option'
+    ):
+        proposition_deltas = deltas[vote['proposition']]
+        proposition_deltas[(vote['option'],) + old_profile] -= 1
+        proposition_deltas[(vote['option'],) + new_profile] += 1
+
+    for proposition_id, proposition_deltas in deltas.items():
+        add_to_cube(proposition_id, proposition_deltas)
+
+
+def rebuild_cube():
+    """
+    Counts again every cube cell from the votes, moving the voters who
+    changed age buckets since they were counted. Returns the number of
+    cells.
+    """
+    with transaction.atomic():
+        DemographicCell.objects.all().delete()
+
+        propositions_ids = list(UserVote.objects.values_list(
+            'proposition',
+            flat=True
+        ).distinct().order_by())
+
+        cells = list()
+        for proposition_id in propositions_ids:
+            cells.extend(
+                DemographicCell(
+                    proposition_id=proposition_id,
+                    votes=votes,
+                    **cell_lookups(cell)
+                )
+                for cell, votes in count_cells(proposition_id).items()
+            )
+        DemographicCell.objects.bulk_create(cells, batch_size=1000)
+
+    invalidate_demographics(propositions_ids)
+
+    return len(cells)
+
+
+def cube_cells(proposition_id):
+    """
+    Returns the values of the cube cells of the proposition, creating them
+    when there are none yet.
+    """
+    fields = ['option'] + list(CUBE_DIMENSIONS) + ['votes']
+
+    cells = list(DemographicCell.objects.filter(
+        proposition=proposition_id
+    ).values(*fields))
+
+    if not cells and create_cube(proposition_id):
+        cells = list(DemographicCell.objects.filter(
+            proposition=proposition_id
+        ).values(*fields))
+
+    return cells
+
+
+def slice_cube(proposition_id, filters, group_by=None):
+    """
+    Returns the chart of the user votes of the proposition whose voters
+    match every {dimension: values} filter, summing the cube cells, and with
+    the charts of each value of the group_by dimension if given.
+    """
+    if not DemographicCell.objects.filter(
+        proposition=proposition_id
+    ).exists():
+        create_cube(proposition_id)
+
+    cells = DemographicCell.objects.filter(proposition=proposition_id)
+    for dimension, values in filters.items():
+        cells = cells.filter(**{
+            dimension + '__in': [value or '' for value in values]
+        })
+
+    fields = ['option']
+    if group_by is not None:
+        fields.append(group_by)
+
+    option_votes = Counter()
+    value_votes = defaultdict(Counter)
+    for cell in cells.values(*fields).annotate(
+        votes_sum=Sum('votes')
+    ).order_by():
+        option_votes[cell['option']] += cell['votes_sum']
+        if group_by is not None:
+            value_votes[cell[group_by] or None][cell['option']] += \
+                cell['votes_sum']
+
+    chart = calc_totals_chart(option_votes)
+    if group_by is not None:
+        chart[group_by] = calc_dimension_chart(
+            value_votes,
+            CUBE_DIMENSIONS[group_by]
+        )
+
+    return chart
+
+
+def calc_demographics(proposition_id):
+    """
+    Returns the parliamentarians and population votes charts of the
+    proposition, with the population ones broken down by each social
+    information dimension, or None when it has no votes of either.
+
+    The population charts are summed up from the cube cells of the
+    proposition.
+    """
+    parliamentarians_votes = Counter({
+        vote['option']: vote['votes']
+        for vote in ParliamentaryVote.objects.filter(
+            proposition=proposition_id
+        ).values('option').annotate(votes=Count('id')).order_by()
+    })
+    if not parliamentarians_votes:
+        return None
+
+    population_votes = Counter()
+    dimensions_votes = {
+        dimension: defaultdict(Counter) for dimension in DIMENSIONS
+    }
+    for cell in cube_cells(proposition_id):
+        population_votes[cell['option']] += cell['votes']
+        for dimension in DIMENSIONS:
+            dimensions_votes[dimension][cell[dimension] or None][
+                cell['option']
+            ] += cell['votes']
+
+    if not sum(population_votes.values()):
+        return None
+
+    demographics = {
+        'parliamentarians_total_votes': calc_totals_chart(
+            parliamentarians_votes,
+            others=True
+        ),
+        'population_total_votes': calc_totals_chart(population_votes),
+    }
+    for dimension, values in DIMENSIONS.items():
+        demographics[dimension] = calc_dimension_chart(
+            dimensions_votes[dimension],
+            values
+        )
+
+    return demographics
+
+
+def get_demographics(proposition_id):
+    """
+    Returns the calc_demographics of the proposition, cached in the shared
+    responses cache until its votes change, or for DEMOGRAPHICS_CACHE_TIMEOUT
+    seconds at most.
+    """
+    cache = caches[CACHE_ALIAS]
+    key = CACHE_KEY.format(proposition_id=proposition_id)
+
+    # Stored wrapped, so that propositions without votes are cached too
+    cached = cache.get(key)
+    if cached is None:
+        cached = (calc_demographics(proposition_id),)
+        cache.set(key, cached, settings.DEMOGRAPHICS_CACHE_TIMEOUT)
+
+    return cached[0]
+
+
+def invalidate_demographics(propositions_ids):
+    """
+    Drops the cached demographics of the given propositions, now and again
+    when the current transaction commits, so that a concurrent request
+    can't cache them from the votes before the change.
+    """
+    keys = [
+        CACHE_KEY.format(proposition_id=proposition_id)
+        for proposition_id in propositions_ids
+    ]
+    if not keys:
+        return
+
+    cache = caches[CACHE_ALIAS]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
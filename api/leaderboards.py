@@ -0,0 +1,148 @@
+import json
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from api.compatibility import upsert_rows
+from api.models import (
+    LeaderboardEntry, Parliamentary, ParliamentaryVote, UserFollowing
+)
+from api.response_cache import FOLLOWING, LEADERBOARD, bump_generation
+from api.serializers import parliamentary_values_serializer
+
+
+# Stored rows fields, starting with the ones they are unique together by
+LEADERBOARD_FIELDS = ('kind', 'rank', 'parliamentary', 'count', 'payload')
+
+# Set while a refresh of the leaderboard is waiting to run
+SCHEDULED_KEY = 'leaderboard_scheduled:{kind}'
+
+
+def most_active_counts():
+    """
+    Returns (parliamentary_id, valid votes count) of the parliamentarians
+    who voted 'Y' or 'N', in leaderboard order.
+    """
+    return ParliamentaryVote.objects.filter(
+        Q(option='Y') | Q(option='N')
+    ).values_list('parliamentary').annotate(
+        votes=Count('option')
+    ).order_by('-votes', 'parliamentary__name', 'parliamentary')
+
+
+def most_followed_counts():
+    """
+    Returns (parliamentary_id, followers count) of all parliamentarians, in
+    leaderboard order, scanning the follower_count index.
+    """
+    return Parliamentary.objects.values_list('id', 'follower_count').order_by(
+        '-follower_count',
+        'name',
+        'id'
+    )
+
+
+LEADERBOARD_COUNTS = {
+    LeaderboardEntry.MOST_ACTIVE: most_active_counts,
+    LeaderboardEntry.MOST_FOLLOWED: most_followed_counts,
+}
+
+
+def leaderboard_rows(kind):
+    """
+    Counts the leaderboard of the given kind, returning its
+    (kind, rank, parliamentary_id, count, payload) rows, with the
+    parliamentarians serialized as payload.
+    """
+    counts = list(LEADERBOARD_COUNTS[kind]())
+    parliamentarians = {
+        parliamentary['id']: parliamentary
+        for parliamentary in parliamentary_values_serializer.serialize(
+            Parliamentary.objects.filter(
+                id__in=[parliamentary_id for parliamentary_id, _ in counts]
+            ).values(*parliamentary_values_serializer.lookups())
+        )
+    }
+
+    return [
+        (
+            kind,
+            rank,
+            parliamentary_id,
+            count,
+            json.dumps(parliamentarians[parliamentary_id])
+        )
+        for rank, (parliamentary_id, count) in enumerate(counts, 1)
+    ]
+
+
+def refresh_leaderboard(kind):
+    """
+    Counts again and stores the leaderboard of the given kind, so that a
+    page of it is a single range read of the (kind, rank) index.
+
+    Only the entries that changed are written, and the responses showing
+    them are then marked stale. Returns how many.
+    """
+    cache.delete(SCHEDULED_KEY.format(kind=kind))
+
+    rows = leaderboard_rows(kind)
+
+    with transaction.atomic():
+        stored = set(
+            LeaderboardEntry.objects.filter(kind=kind).values_list(
+                *LEADERBOARD_FIELDS
+            )
+        )
+
+        changed = [row for row in rows if row not in stored]
+        upsert_rows(LeaderboardEntry, LEADERBOARD_FIELDS, 2, changed)
+
+        removed, _ = LeaderboardEntry.objects.filter(
+            kind=kind,
+            rank__gt=len(rows)
+        ).delete()
+
+        if changed or removed:
+            bump_generation(LEADERBOARD)
+
+    return len(changed)
+
+
+def reconcile_follower_counts():
+    """
+    Counts again the followers of every parliamentary, repairing the
+    follower_count that drifted (as when followings are deleted along with
+    their users) and refreshing the leaderboards showing it.
+
+    Returns the number of repaired parliamentarians.
+    """
+    followers = UserFollowing.objects.filter(
+        parliamentary=OuterRef('pk')
+    ).order_by().values('parliamentary').annotate(
+        count=Count('id')
+    ).values('count')
+    counted = Coalesce(Subquery(followers, output_field=IntegerField()), 0)
+
+    drifted = list(
+        Parliamentary.objects.annotate(
+            counted=counted
+        ).exclude(
+            follower_count=F('counted')
+        ).values_list('id', flat=True)
+    )
+
+    # Counted again in the UPDATE, so that followings made meanwhile are not
+    # overwritten
+    repaired = Parliamentary.objects.filter(
+        pk__in=drifted
+    ).update(follower_count=counted)
+
+    if repaired:
+        bump_generation(FOLLOWING)
+        for kind, _ in LeaderboardEntry.KIND_CHOICES:
+            refresh_leaderboard(kind)
+
+    return repaired
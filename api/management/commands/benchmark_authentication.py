@@ -0,0 +1,87 @@
+import time
+from base64 import b64encode
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from rest_framework.authentication import (
+    BasicAuthentication, TokenAuthentication
+)
+from rest_framework.authtoken.models import Token
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+from api.authentication import (
+    CachedBasicAuthentication, CachedTokenAuthentication
+)
+
+
+class AuthenticatedView(APIView):
+
+    def get(self, request):
+        return Response({'user': request.user.pk})
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the throughput of requests authenticated with Basic and '
+        'Token credentials, with and without the cached authentication.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+
+    def handle(self, *args, **options):
+        password = 'benchmark_authentication'
+        user = User.objects.create_user(
+            username='benchmark_authentication {}'.format(time.time()),
+            password=password
+        )
+        token = Token.objects.create(user=user)
+
+        basic = 'Basic ' + b64encode(
+            '{}:{}'.format(user.username, password).encode('utf-8')
+        ).decode('ascii')
+
+        try:
+            for name, authentication, header in [
+                ('Basic', BasicAuthentication, basic),
+                ('Cached Basic', CachedBasicAuthentication, basic),
+                ('Token', TokenAuthentication, 'Token ' + token.key),
+                ('Cached Token', CachedTokenAuthentication,
+                 'Token ' + token.key),
+            ]:
+                elapsed = self.run_requests(
+                    authentication,
+                    header,
+                    user,
+                    options['requests']
+                )
+
+                self.stdout.write(
+                    '{name:>12}: {throughput:8.1f} requests/s '
+                    '({requests} requests in {elapsed:.2f}s)'.format(
+                        name=name,
+                        throughput=options['requests'] / elapsed,
+                        requests=options['requests'],
+                        elapsed=elapsed
+                    )
+                )
+        finally:
+            token.delete()
+            user.delete()
+
+    def run_requests(self, authentication, header, user, requests):
+        view = AuthenticatedView.as_view(
+            authentication_classes=[authentication]
+        )
+        factory = APIRequestFactory()
+
+        start = time.perf_counter()
+        for _ in range(requests):
+            response = view(factory.get('/', HTTP_AUTHORIZATION=header))
+            if response.data['user'] != user.pk:
+                raise AssertionError('Request not authenticated')
+
+        return time.perf_counter() - start
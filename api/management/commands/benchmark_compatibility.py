@@ -0,0 +1,140 @@
+import time
+
+import numpy as np
+
+from django.core.management.base import BaseCommand
+
+from api.compatibility import (
+    VoteBitsetIndex, VoteMatrix, calc_compatibilities
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the numpy compatibility engine on synthetic parliamentary '
+        'and user votes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--parliamentarians', type=int, default=513)
+        parser.add_argument('--propositions', type=int, default=5000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--user-votes', type=int, default=300)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        random = np.random.RandomState(options['seed'])
+
+        vote_matrix = VoteMatrix(
+            range(options['parliamentarians']),
+            range(options['propositions'])
+        )
+        vote_matrix.votes[:] = random.choice(
+            [1, -1, 0],
+            size=vote_matrix.votes.shape,
+            p=[0.45, 0.35, 0.2]
+        )
+
+        vote_index = VoteBitsetIndex()
+        vote_index.parliamentary_index = vote_matrix.parliamentary_index
+        vote_index.parliamentarians_ids = list(vote_matrix.parliamentary_index)
+        for row, column in zip(*np.nonzero(vote_matrix.votes)):
+            vote_index.add_vote(
+                int(row),
+                int(column),
+                'Y' if vote_matrix.votes[row, column] > 0 else 'N'
+            )
+
+        users_votes = [
+            list(zip(
+                random.choice(
+                    options['propositions'],
+                    options['user_votes'],
+                    replace=False
+                ).tolist(),
+                random.choice(['Y', 'N', 'A'], options['user_votes']).tolist()
+            ))
+            for user in range(options['users'])
+        ]
+
+        self.stdout.write(
+            '{parliamentarians} parliamentarians x {propositions} '
+            'propositions, {users} users with {user_votes} votes each'.format(
+                **options
+            )
+        )
+
+        # Reference: one pass over the user votes per parliamentary
+        reference_users = users_votes[:10]
+        start = time.perf_counter()
+        reference = [
+            self.python_counts(vote_matrix, user_votes)
+            for user_votes in reference_users
+        ]
+        python_time = (time.perf_counter() - start) / len(reference_users)
+
+        start = time.perf_counter()
+        single = [
+            vote_matrix.counts(user_votes) for user_votes in users_votes
+        ]
+        single_time = (time.perf_counter() - start) / len(users_votes)
+
+        start = time.perf_counter()
+        bitset = [vote_index.counts(user_votes) for user_votes in users_votes]
+        bitset_time = (time.perf_counter() - start) / len(users_votes)
+
+        start = time.perf_counter()
+        valid_votes, matching_votes = vote_matrix.counts_batch(users_votes)
+        user_valid_votes = np.array([
+            sum(1 for proposition, option in user_votes if option in 'YN')
+            for user_votes in users_votes
+        ])
+        calc_compatibilities(
+            valid_votes,
+            matching_votes,
+            user_valid_votes[:, np.newaxis]
+        )
+        batch_time = time.perf_counter() - start
+
+        for i, (valid, matching) in enumerate(reference):
+            assert valid == single[i][0].tolist() == bitset[i][0] == \
+                valid_votes[i].tolist()
+            assert matching == single[i][1].tolist() == bitset[i][1] == \
+                matching_votes[i].tolist()
+
+        self.stdout.write(
+            'python loop: {:10.3f} ms/user'.format(python_time * 1000)
+        )
+        self.stdout.write(
+            'matrix:      {:10.3f} ms/user'.format(single_time * 1000)
+        )
+        self.stdout.write(
+            'bitset:      {:10.3f} ms/user'.format(bitset_time * 1000)
+        )
+        self.stdout.write(
+            'batch:       {:10.0f} users/s ({:.3f} s for {} users)'.format(
+                len(users_votes) / batch_time,
+                batch_time,
+                len(users_votes)
+            )
+        )
+
+    @staticmethod
+    def python_counts(vote_matrix, user_votes):
+        values = {'Y': 1, 'N': -1}
+        valid_votes = list()
+        matching_votes = list()
+
+        for row in vote_matrix.votes.tolist():
+            valid = 0
+            matching = 0
+            for proposition_id, option in user_votes:
+                parliamentary_vote = row[proposition_id]
+                if parliamentary_vote:
+                    valid += 1
+                    if values.get(option) == parliamentary_vote:
+                        matching += 1
+            valid_votes.append(valid)
+            matching_votes.append(matching)
+
+        return valid_votes, matching_votes
@@ -0,0 +1,103 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count, F, Q
+from django.test.utils import CaptureQueriesContext
+
+from api.compatibility import sql_compatibility_counts
+from api.models import Parliamentary
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks, on the users of the database, the single conditional '
+        'aggregation query of the compatibility counts against the previous '
+        'two GROUP BY queries merged in Python.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+
+    def handle(self, *args, **options):
+        users = list(
+            User.objects.filter(
+                votes__isnull=False
+            ).distinct().order_by('id')[:options['users']]
+        )
+
+        if not users:
+            self.stdout.write('There are no users with votes to benchmark.')
+            return
+
+        results = dict()
+        for name, counts in (('two queries', self.two_queries_counts),
+                             ('single query', sql_compatibility_counts)):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                results[name] = [counts(user) for user in users]
+                elapsed = time.perf_counter() - start
+
+            self.stdout.write(
+                '{:12}: {:10.3f} ms/user, {:.0f} queries/user'.format(
+                    name,
+                    elapsed / len(users) * 1000,
+                    len(queries) / len(users)
+                )
+            )
+
+        assert results['two queries'] == results['single query']
+
+    @staticmethod
+    def two_queries_counts(user):
+        all_parliamentarians_ids = Parliamentary.objects.order_by(
+            'id'
+        ).values_list('id', flat=True)
+
+        valid_votes_queryset = user.votes.filter(
+            Q(proposition__parliamentary_votes__option='Y') |
+            Q(proposition__parliamentary_votes__option='N')
+        ).annotate(
+            parliamentary=F('proposition__parliamentary_votes__parliamentary')
+        ).values(
+            'parliamentary'
+        ).annotate(
+            valid_votes=Count('parliamentary')
+        ).order_by(
+            'parliamentary'
+        )
+
+        matching_votes_queryset = user.votes.filter(
+            (
+                Q(proposition__parliamentary_votes__option='Y') |
+                Q(proposition__parliamentary_votes__option='N')
+            ),
+            Q(proposition__parliamentary_votes__option=F('option'))
+        ).annotate(
+            parliamentary=F('proposition__parliamentary_votes__parliamentary')
+        ).values(
+            'parliamentary'
+        ).annotate(
+            matching_votes=Count('parliamentary')
+        ).order_by(
+            'parliamentary'
+        )
+
+        valid_votes = {
+            valid_vote['parliamentary']: valid_vote['valid_votes']
+            for valid_vote in valid_votes_queryset
+        }
+        matching_votes = {
+            matching_vote['parliamentary']: matching_vote['matching_votes']
+            for matching_vote in matching_votes_queryset
+        }
+
+        return [
+            (
+                parliamentary_id,
+                valid_votes.get(parliamentary_id, 0),
+                matching_votes.get(parliamentary_id, 0)
+            )
+            for parliamentary_id in all_parliamentarians_ids
+        ]
@@ -0,0 +1,75 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rest_framework.renderers import JSONRenderer
+
+from api.models import Compatibility, Parliamentary, Proposition
+from api.serializers import (
+    CompatibilitySerializer, ParliamentarySerializer, PropositionSerializer,
+    compatibility_values_serializer, parliamentary_values_serializer,
+    proposition_values_serializer
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the rows serialized per second by the ModelSerializers '
+        'and their values() serializers, checking they render the same JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        for name, serializer_class, values_serializer, queryset in [
+            ('Parliamentary', ParliamentarySerializer,
+             parliamentary_values_serializer, Parliamentary.objects.all()),
+            ('Proposition', PropositionSerializer,
+             proposition_values_serializer, Proposition.objects.all()),
+            ('Compatibility', CompatibilitySerializer,
+             compatibility_values_serializer,
+             Compatibility.objects.select_related('parliamentary')),
+        ]:
+            queryset = queryset.order_by('id')[:options['rows']]
+            if not queryset.exists():
+                self.stdout.write('{name:>13}: no rows'.format(name=name))
+                continue
+
+            model_elapsed, model_data = self.run_serializer(
+                lambda: serializer_class(list(queryset), many=True).data,
+                options['repeat']
+            )
+            values_elapsed, values_data = self.run_serializer(
+                lambda: values_serializer.serialize(
+                    queryset.values(*values_serializer.lookups())
+                ),
+                options['repeat']
+            )
+
+            renderer = JSONRenderer()
+            if renderer.render(model_data) != renderer.render(values_data):
+                raise CommandError('{} JSON differs'.format(name))
+
+            rows = len(values_data) * options['repeat']
+            self.stdout.write(
+                '{name:>13}: {model:10.1f} rows/s ModelSerializer, '
+                '{values:10.1f} rows/s values() ({speedup:.1f}x)'.format(
+                    name=name,
+                    model=rows / model_elapsed,
+                    values=rows / values_elapsed,
+                    speedup=model_elapsed / values_elapsed
+                )
+            )
+
+    def run_serializer(self, serialize, repeat):
+        """
+        Returns the time taken to query and serialize the rows repeat times,
+        and their data.
+        """
+        start = time.perf_counter()
+        for _ in range(repeat):
+            data = serialize()
+
+        return time.perf_counter() - start, data
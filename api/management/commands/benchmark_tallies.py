@@ -0,0 +1,106 @@
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from api.models import Proposition, PropositionTally, UserVote
+from api.tallies import USERS, add_to_tally, rebuild_tallies, tally_fields
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks many threads voting at the same time on one proposition, '
+        'with a single tally row and with sharded tally rows.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--votes', type=int, default=50)
+        parser.add_argument('--shards', type=int, default=8)
+
+    def handle(self, *args, **options):
+        for shards in sorted({1, options['shards']}):
+            proposition = Proposition.objects.create(
+                native_id='benchmark_tallies {}'.format(time.time()),
+                number=0,
+                year=0,
+                last_update=timezone.now()
+            )
+            users = [
+                User.objects.create(
+                    username='benchmark_tallies {} {}'.format(
+                        proposition.pk,
+                        i
+                    )
+                )
+                for i in range(options['threads'] * options['votes'])
+            ]
+
+            try:
+                elapsed = self.run_threads(
+                    proposition,
+                    users,
+                    options['threads'],
+                    shards
+                )
+
+                stored = PropositionTally.objects.filter(
+                    proposition=proposition
+                ).count()
+                drift = rebuild_tallies(save=False).get(proposition.pk)
+
+                self.stdout.write(
+                    '{shards:3} shards: {throughput:8.1f} votes/s '
+                    '({votes} votes in {elapsed:.2f}s, {stored} tally rows, '
+                    '{drift})'.format(
+                        shards=shards,
+                        throughput=len(users) / elapsed,
+                        votes=len(users),
+                        elapsed=elapsed,
+                        stored=stored,
+                        drift='drifted' if drift else 'no drift'
+                    )
+                )
+            finally:
+                UserVote.objects.filter(proposition=proposition).delete()
+                PropositionTally.objects.filter(
+                    proposition=proposition
+                ).delete()
+                User.objects.filter(
+                    pk__in=[user.pk for user in users]
+                ).delete()
+                proposition.delete()
+
+    def run_threads(self, proposition, users, threads, shards):
+        counts = dict.fromkeys(tally_fields(USERS, 'Y'), 1)
+        barrier = threading.Barrier(threads)
+
+        def vote(users):
+            barrier.wait()
+            try:
+                for user in users:
+                    with transaction.atomic():
+                        UserVote.objects.create(
+                            user=user,
+                            proposition=proposition,
+                            option='Y'
+                        )
+                        add_to_tally(proposition.pk, counts, shards)
+            finally:
+                connection.close()
+
+        workers = [
+            threading.Thread(target=vote, args=(users[i::threads],))
+            for i in range(threads)
+        ]
+
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        return time.perf_counter() - start
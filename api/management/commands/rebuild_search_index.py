@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from api.search import create_search_index, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Indexes again every proposition for the full-text search.'
+
+    def handle(self, *args, **options):
+        create_search_index()
+        count = rebuild_search_index()
+
+        self.stdout.write('{count} propositions indexed'.format(count=count))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from api.tallies import rebuild_tallies
+
+
+class Command(BaseCommand):
+    help = (
+        'Counts again the propositions tallies from the user and '
+        'parliamentary votes, reporting and fixing the ones that drifted.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report the drift, without fixing it.'
+        )
+
+    def handle(self, *args, **options):
+        drift = rebuild_tallies(save=not options['check'])
+
+        for proposition_id, differences in sorted(drift.items()):
+            self.stdout.write(
+                'Proposition {proposition}: {differences}'.format(
+                    proposition=proposition_id,
+                    differences=', '.join(
+                        '{field} {stored} != {counted}'.format(
+                            field=field,
+                            stored=stored,
+                            counted=counted
+                        )
+                        for field, (stored, counted)
+                        in sorted(differences.items())
+                    )
+                )
+            )
+
+        self.stdout.write(
+            '{count} tallies {action}'.format(
+                count=len(drift),
+                action='drifted' if options['check'] else 'rebuilt'
+            )
+        )
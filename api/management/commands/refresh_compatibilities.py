@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.compatibility import refresh_compatibilities
+from api.models import CompatibilityRefresh, ExtendedUser
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes the compatibilities of the users flagged to be '
+        'refreshed, resuming the last unfinished refresh job if any.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=None)
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Flag every user to be refreshed before running.'
+        )
+
+    def handle(self, *args, **options):
+        if options['all']:
+            ExtendedUser.objects.update(
+                should_update=True,
+                update_scheduled=timezone.now()
+            )
+
+        refresh = CompatibilityRefresh.objects.filter(
+            finished=None
+        ).order_by('created').first()
+        if refresh is None:
+            refresh = CompatibilityRefresh.objects.create()
+
+        already_processed = refresh.processed_users
+        already_touched = refresh.touched_rows
+        already_skipped = refresh.skipped_rows
+        start = time.perf_counter()
+
+        refresh = refresh_compatibilities(
+            refresh,
+            processes=options['processes'],
+            chunk_size=options['chunk_size']
+        )
+
+        elapsed = time.perf_counter() - start
+        processed = refresh.processed_users - already_processed
+        self.stdout.write(
+            'Refreshed {processed} users ({done}/{total} in this job) in '
+            '{elapsed:.1f}s ({throughput:.1f} users/s), {touched} rows '
+            'touched and {skipped} skipped'.format(
+                processed=processed,
+                done=refresh.processed_users,
+                total=refresh.total_users,
+                elapsed=elapsed,
+                throughput=processed / elapsed if elapsed else 0,
+                touched=refresh.touched_rows - already_touched,
+                skipped=refresh.skipped_rows - already_skipped
+            )
+        )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from api.leaderboards import refresh_leaderboard
+from api.models import LeaderboardEntry
+
+
+class Command(BaseCommand):
+    help = (
+        'Counts again and stores the most active and most followed '
+        'parliamentarians leaderboards.'
+    )
+
+    def handle(self, *args, **options):
+        for kind, name in LeaderboardEntry.KIND_CHOICES:
+            changed = refresh_leaderboard(kind)
+
+            self.stdout.write('{name}: {changed} entries changed'.format(
+                name=name,
+                changed=changed
+            ))
@@ -48,6 +48,16 @@ GENDER_CHOICES = (
     ('O', 'Outros')
 )
 
+AGE_CHOICES = (
+    (None, 'Null'),
+    ('0-15', '0-15'),
+    ('16-24', '16-24'),
+    ('25-34', '25-34'),
+    ('35-44', '35-44'),
+    ('45-59', '45-59'),
+    ('60+', '60+')
+)
+
 VOTE_CHOICES = (
     ('Y', 'Yes'),
     ('N', 'No'),
@@ -127,11 +137,19 @@ class Parliamentary(models.Model):
     education = models.CharField(max_length=150, default='N')
     email = models.CharField(max_length=100, blank=True)
     photo = models.URLField(blank=True)
+    # Denormalized count of the followers, kept by the UserFollowing writes
+    follower_count = models.IntegerField(default=0)
 
     def __str__(self):
         return '{name}'.format(name=self.name)
 
     class Meta:
+        indexes = [
+            models.Index(
+                fields=['-follower_count', 'name', 'id'],
+                name='parliamentary_followers_idx'
+            )
+        ]
         verbose_name = "Parliamentary"
         verbose_name_plural = "Parliamentarians"
 
@@ -155,6 +173,13 @@ class Proposition(models.Model):
         )
 
     class Meta:
+        # Supports the keyset pagination of the propositions listings
+        indexes = [
+            models.Index(
+                fields=['-last_update', '-id'],
+                name='proposition_keyset_idx'
+            )
+        ]
         verbose_name = "Proposition"
         verbose_name_plural = "Propositions"
 
@@ -207,6 +232,89 @@ class ParliamentaryVote(models.Model):
         verbose_name_plural = "Parliamentary Votes"
 
 
+class PropositionTally(models.Model):
+
+    proposition = models.ForeignKey(
+        Proposition,
+        on_delete=models.DO_NOTHING,
+        related_name='tallies'
+    )
+    shard = models.IntegerField(default=0)
+
+    users_total = models.IntegerField(default=0)
+    users_yes = models.IntegerField(default=0)
+    users_no = models.IntegerField(default=0)
+    users_abstention = models.IntegerField(default=0)
+    users_obstruction = models.IntegerField(default=0)
+    users_missing = models.IntegerField(default=0)
+
+    parliamentarians_total = models.IntegerField(default=0)
+    parliamentarians_yes = models.IntegerField(default=0)
+    parliamentarians_no = models.IntegerField(default=0)
+    parliamentarians_abstention = models.IntegerField(default=0)
+    parliamentarians_obstruction = models.IntegerField(default=0)
+    parliamentarians_missing = models.IntegerField(default=0)
+
+    def __str__(self):
+        return 'Tally of {proposition} (shard {shard})'.format(
+            proposition=self.proposition_id,
+            shard=self.shard
+        )
+
+    class Meta:
+        unique_together = ('proposition', 'shard')
+        verbose_name = "Proposition Tally"
+        verbose_name_plural = "Proposition Tallies"
+
+
+class DemographicCell(models.Model):
+
+    # Count of the user votes of a proposition with an option and a voter
+    # profile, whose uninformed values are stored blank
+    proposition = models.ForeignKey(
+        Proposition,
+        on_delete=models.DO_NOTHING,
+        related_name='demographic_cells'
+    )
+    option = models.CharField(max_length=1, choices=VOTE_CHOICES, blank=True)
+    region = models.CharField(
+        max_length=10,
+        choices=REGION_CHOICES,
+        blank=True
+    )
+    income = models.CharField(
+        max_length=20,
+        choices=INCOME_CHOICES,
+        blank=True
+    )
+    education = models.CharField(
+        max_length=10,
+        choices=EDUCATION_CHOICES,
+        blank=True
+    )
+    race = models.CharField(max_length=10, choices=RACE_CHOICES, blank=True)
+    gender = models.CharField(
+        max_length=10,
+        choices=GENDER_CHOICES,
+        blank=True
+    )
+    age = models.CharField(max_length=10, choices=AGE_CHOICES, blank=True)
+    votes = models.IntegerField(default=0)
+
+    def __str__(self):
+        return 'Demographic cell of {proposition}'.format(
+            proposition=self.proposition_id
+        )
+
+    class Meta:
+        unique_together = (
+            'proposition', 'option', 'region', 'income', 'education', 'race',
+            'gender', 'age'
+        )
+        verbose_name = "Demographic Cell"
+        verbose_name_plural = "Demographic Cells"
+
+
 class UserFollowing(models.Model):
 
     user = models.ForeignKey(
@@ -242,10 +350,50 @@ class Compatibility(models.Model):
     compatibility = models.FloatField(blank=True)
 
     class Meta:
+        unique_together = ('user', 'parliamentary')
+        indexes = [
+            models.Index(
+                fields=['user', '-compatibility', 'id'],
+                name='compatibility_ranking_idx'
+            )
+        ]
         verbose_name = "Compatibility"
         verbose_name_plural = "Compatibilities"
 
 
+class GroupCompatibility(models.Model):
+
+    POLITICAL_PARTY = 'P'
+    FEDERAL_UNIT = 'F'
+    GROUP_CHOICES = (
+        (POLITICAL_PARTY, 'Political Party'),
+        (FEDERAL_UNIT, 'Federal Unit'),
+    )
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        related_name='group_compatibilities'
+    )
+    group = models.CharField(max_length=1, choices=GROUP_CHOICES)
+    name = models.CharField(max_length=100)
+    parliamentarians = models.IntegerField(default=0)
+    valid_votes = models.IntegerField(default=0)
+    matching_votes = models.IntegerField(default=0)
+    compatibility = models.FloatField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'group', 'name')
+        indexes = [
+            models.Index(
+                fields=['user', 'group', '-compatibility', 'name'],
+                name='group_compatibility_rank_idx'
+            )
+        ]
+        verbose_name = "Group Compatibility"
+        verbose_name_plural = "Group Compatibilities"
+
+
 class ExtendedUser(models.Model):
 
     user = models.OneToOneField(
@@ -254,12 +402,66 @@ class ExtendedUser(models.Model):
         related_name='extended_user'
     )
     should_update = models.BooleanField(default=True)
+    # When a pending recompute of the compatibilities was scheduled
+    update_scheduled = models.DateTimeField(null=True, blank=True)
+    # Incremented along with every write of the user compatibilities
+    compatibility_version = models.IntegerField(default=0)
 
     class Meta:
         verbose_name = "Extended User"
         verbose_name_plural = "Extended Users"
 
 
+class CompatibilityRefresh(models.Model):
+
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(default=None, null=True)
+    finished = models.DateTimeField(default=None, null=True)
+    total_users = models.IntegerField(default=0)
+    processed_users = models.IntegerField(default=0)
+    touched_rows = models.IntegerField(default=0)
+    skipped_rows = models.IntegerField(default=0)
+
+    def __str__(self):
+        return 'Compatibility refresh {created}'.format(created=self.created)
+
+    class Meta:
+        verbose_name = "Compatibility Refresh"
+        verbose_name_plural = "Compatibility Refreshes"
+
+
+class LeaderboardEntry(models.Model):
+
+    MOST_ACTIVE = 'A'
+    MOST_FOLLOWED = 'F'
+    KIND_CHOICES = (
+        (MOST_ACTIVE, 'Most Active'),
+        (MOST_FOLLOWED, 'Most Followed'),
+    )
+
+    kind = models.CharField(max_length=1, choices=KIND_CHOICES)
+    rank = models.IntegerField()
+    parliamentary = models.ForeignKey(
+        Parliamentary,
+        on_delete=models.DO_NOTHING,
+        related_name='leaderboard_entries'
+    )
+    count = models.IntegerField(default=0)
+    # Serialized parliamentary, as JSON
+    payload = models.TextField()
+
+    def __str__(self):
+        return '{kind} #{rank}'.format(
+            kind=self.get_kind_display(),
+            rank=self.rank
+        )
+
+    class Meta:
+        unique_together = ('kind', 'rank')
+        verbose_name = "Leaderboard Entry"
+        verbose_name_plural = "Leaderboard Entries"
+
+
 class ContactUs(models.Model):
     topic = models.CharField(max_length=150)
     email = models.EmailField(max_length=250, blank=True)
@@ -0,0 +1,180 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as DecodeError
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from api.search import SEARCH_RANK, is_ranked
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginates by the values of the last returned row of the ordering fields
+    (the view keyset_ordering, by default newest last_update and then id),
+    filtering the next page with them instead of skipping an OFFSET, so that
+    deep pages take as long as the first one.
+
+    Searched querysets keep their relevance order, paginating by their
+    search rank first.
+
+    The pages only link to the next one, with an opaque cursor.
+    """
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+    ordering = ('-last_update', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, default_limit):
+        self.default_limit = default_limit
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = tuple(getattr(view, 'keyset_ordering', self.ordering))
+        if is_ranked(queryset):
+            self.ordering = ('-' + SEARCH_RANK,) + self.ordering
+        self.limit = self.get_limit(request)
+
+        queryset = queryset.order_by(*self.ordering)
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self.after(position))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        page = list(queryset[:self.limit + 1])
+
+        self.next_position = None
+        if len(page) > self.limit:
+            page = page[:self.limit]
+            self.next_position = [
+                self.field_value(page[-1], field.lstrip('-'))
+                for field in self.ordering
+            ]
+
+        return page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data)
+        ]))
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return self.default_limit
+
+        return limit if limit > 0 else self.default_limit
+
+    def after(self, position):
+        """
+        Returns the filter of the rows after the given ordering fields
+        values, comparing them lexicographically.
+
+        The redundant bound on the first field lets the database seek the
+        ordering index to the position instead of scanning it up to there.
+        """
+        after = Q()
+        equal = Q()
+
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = '__lt' if field.startswith('-') else '__gt'
+
+            after |= equal & Q(**{name + lookup: value})
+            equal &= Q(**{name: value})
+
+        first_field = self.ordering[0]
+        bound = '__lte' if first_field.startswith('-') else '__gte'
+
+        return Q(**{first_field.lstrip('-') + bound: position[0]}) & after
+
+    def field_value(self, row, field):
+        if isinstance(row, dict):
+            value = row[field]
+        else:
+            value = row
+            for attribute in field.split('__'):
+                value = getattr(value, attribute)
+
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return value
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+
+        try:
+            position = json.loads(
+                urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+            )
+        except (DecodeError, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(position, list) or \
+                len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        return position
+
+    def encode_cursor(self, position):
+        return urlsafe_b64encode(
+            json.dumps(position).encode('utf-8')
+        ).decode('ascii')
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.next_position)
+        )
+
+
+class OptionalCursorPagination(LimitOffsetPagination):
+    """
+    LimitOffsetPagination, unless the request asks for ?pagination=cursor
+    (or follows a cursor link), which is paginated by KeysetPagination.
+    """
+    pagination_query_param = 'pagination'
+
+    def use_cursor(self, request):
+        return (
+            request.query_params.get(self.pagination_query_param) ==
+            'cursor' or KeysetPagination.cursor_query_param in
+            request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.use_cursor(request):
+            self.keyset = KeysetPagination(self.default_limit)
+            return self.keyset.paginate_queryset(queryset, request, view)
+
+        return super(OptionalCursorPagination, self).paginate_queryset(
+            queryset,
+            request,
+            view
+        )
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+
+        return super(OptionalCursorPagination, self).get_paginated_response(
+            data
+        )
@@ -3,68 +3,69 @@ from rest_framework import permissions
 from .models import SocialInformation
 
 
+def is_detail(view):
+    """
+    Returns whether the view acts on a single object, which is then
+    checked by has_object_permission.
+    """
+    return (view.lookup_url_kwarg or view.lookup_field) in view.kwargs
+
+
+def social_information_id(request):
+    """
+    Returns the id of the social information of the request user, or None,
+    querying it once per request.
+    """
+    try:
+        return request._social_information_id
+    except AttributeError:
+        request._social_information_id = SocialInformation.objects.filter(
+            owner=request.user
+        ).values_list('id', flat=True).first()
+
+    return request._social_information_id
+
+
 class UserPermissions(permissions.BasePermission):
+    """
+    Anyone may sign up and ask for the actual user, and users may see and
+    edit, but not delete, themselves. Only superusers may list or act on
+    other users.
+    """
 
     def has_permission(self, request, view):
-        permission = False
-        authorized_user = False
-
         if request.user.is_superuser:
             return True
 
-        elif (request.user.is_anonymous and request.method == 'POST'):
+        elif view.action == 'actual_user':
             return True
 
-        elif 'users' in request.path and 'actual_user' not in request.path:
-            url_id = request.path.split('/users/')[1][:-1]
-            user_id = str(request.user.id)
-
-            if(url_id == user_id):
-                authorized_user = True
-
-            if(request.method != 'DELETE' and request.method != 'POST' and
-                    authorized_user):
-                return True
+        elif request.user.is_anonymous:
+            return request.method == 'POST'
 
-        else:
-            permission = True
+        return is_detail(view) and request.method != 'DELETE'
 
-        return permission
+    def has_object_permission(self, request, view, obj):
+        return request.user.is_superuser or obj.pk == request.user.pk
 
 
 class SocialInformationPermissions(permissions.BasePermission):
+    """
+    Users may create their social information once, and see and edit, but
+    not delete, it. Only superusers may list or act on others.
+    """
 
     def has_permission(self, request, view):
-        permission = False
-        authorized_user = False
-
         if request.user.is_superuser:
             return True
 
         elif request.user.is_anonymous:
             return False
 
-        elif (request.method == 'POST' and
-                SocialInformation.objects.filter(
-                    owner=request.user
-                ).count() == 0):
-            return True
-
-        elif 'social_informations' in request.path:
-
-            social_information = \
-                SocialInformation.objects.filter(owner=request.user.id)
-            if(social_information):
-                social_information = social_information.first().id
-            url_id = request.path.split('/social_informations/')[1][:-1]
-
-            if(url_id == str(social_information)):
-                authorized_user = True
-
-            if(request.method != 'DELETE' and authorized_user):
-                return True
+        elif request.method == 'POST':
+            return social_information_id(request) is None
 
-        else:
-            permission = True
+        return is_detail(view) and request.method != 'DELETE'
 
-        return permission
+    def has_object_permission(self, request, view, obj):
+        return request.user.is_superuser or obj.owner_id == request.user.pk
@@ -0,0 +1,205 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from rest_framework.response import Response
+
+
+# Generations of the data the cached responses are computed from: the
+# loader ingested parliamentarians, propositions and votes, the
+# propositions tallies, the users followings and the stored leaderboards
+INGEST = 'ingest'
+TALLY = 'tally'
+FOLLOWING = 'following'
+LEADERBOARD = 'leaderboard'
+
+CACHE_ALIAS = 'responses'
+
+GENERATION_KEY = 'generation:{name}'
+MODIFIED_KEY = 'modified:{name}'
+RESPONSE_KEY = 'response:{url}:{generations}'
+
+
+def get_counters(keys, start):
+    """
+    Returns the values of the given keys, adding the missing ones as start.
+    """
+    cache = caches[CACHE_ALIAS]
+
+    counters = cache.get_many(keys)
+    for key in keys:
+        if key not in counters:
+            cache.add(key, start, None)
+            counters[key] = cache.get(key, start)
+
+    return [counters[key] for key in keys]
+
+
+def get_generations(names):
+    """
+    Returns the current generation counter of each of the given names.
+
+    Missing counters (never bumped, or evicted) start from the current time
+    in milliseconds, so that they don't go back to a generation whose
+    responses may still be cached.
+    """
+    return get_counters(
+        [GENERATION_KEY.format(name=name) for name in names],
+        int(time.time() * 1000)
+    )
+
+
+def get_modified(names):
+    """
+    Returns the timestamp, in seconds, of the last bump of any of the given
+    names. Missing ones count as modified now.
+    """
+    return max(get_counters(
+        [MODIFIED_KEY.format(name=name) for name in names],
+        int(time.time())
+    ))
+
+
+def bump_generation(name):
+    """
+    Moves the generation of the given name forward, so that every response
+    cached from the previous one is stale, now and again when the current
+    transaction commits.
+    """
+    def bump():
+        cache = caches[CACHE_ALIAS]
+        key = GENERATION_KEY.format(name=name)
+
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, int(time.time() * 1000), None)
+
+        cache.set(MODIFIED_KEY.format(name=name), int(time.time()), None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def today():
+    """
+    Returns the start of the current day, which responses computed from the
+    current date (as how many days ago something happened) depend on.
+    """
+    return timezone.localtime().replace(
+        hour=0,
+        minute=0,
+        second=0,
+        microsecond=0
+    )
+
+
+def cache_response(*names, daily=False):
+    """
+    Caches the responses of a viewset method to anonymous requests, keyed by
+    their URL and the generations of the given names (and the current day,
+    when daily), for RESPONSE_CACHE_TIMEOUT seconds.
+    """
+    def decorator(method):
+        @wraps(method)
+        def cached_method(self, request, *args, **kwargs):
+            if request.user.is_authenticated:
+                return method(self, request, *args, **kwargs)
+
+            generations = [
+                str(generation) for generation in get_generations(names)
+            ]
+            if daily:
+                generations.append(today().date().isoformat())
+
+            cache = caches[CACHE_ALIAS]
+            key = RESPONSE_KEY.format(
+                url=hashlib.md5(
+                    request.build_absolute_uri().encode('utf-8')
+                ).hexdigest(),
+                generations='.'.join(generations)
+            )
+
+            cached = cache.get(key)
+            if cached is not None:
+                data, status = cached
+                return Response(data, status=status)
+
+            response = method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(
+                    key,
+                    (response.data, response.status_code),
+                    settings.RESPONSE_CACHE_TIMEOUT
+                )
+
+            return response
+
+        return cached_method
+
+    return decorator
+
+
+def conditional_response(*names, last_update=None, daily=False):
+    """
+    Answers the conditional GET requests of anonymous users to a viewset
+    method with 304 Not Modified, before it runs, when their If-None-Match
+    or If-Modified-Since headers match the validators of the current data.
+
+    The ETag hashes the URL (so each page has its own) and the generations
+    of the given names; the Last-Modified is the last bump of any of them
+    or, when later, the datetime returned by the last_update function. Daily
+    responses also change, and are modified, at the start of every day.
+    """
+    def decorator(method):
+        @wraps(method)
+        def conditional_method(self, request, *args, **kwargs):
+            if request.user.is_authenticated:
+                return method(self, request, *args, **kwargs)
+
+            validators = [request.build_absolute_uri()]
+            validators.extend(
+                str(generation) for generation in get_generations(names)
+            )
+
+            modified = get_modified(names)
+            if last_update is not None:
+                updated = last_update()
+                if updated is not None:
+                    validators.append(updated.isoformat())
+                    modified = max(modified, int(updated.timestamp()))
+
+            if daily:
+                day = today()
+                validators.append(day.date().isoformat())
+                modified = max(modified, int(day.timestamp()))
+
+            etag = quote_etag(hashlib.md5(
+                ':'.join(validators).encode('utf-8')
+            ).hexdigest())
+
+            response = get_conditional_response(
+                request,
+                etag=etag,
+                last_modified=modified
+            )
+            if response is None:
+                response = method(self, request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(modified)
+
+            return response
+
+        return conditional_method
+
+    return decorator
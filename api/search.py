@@ -0,0 +1,333 @@
+import re
+import unicodedata
+
+from django.db import connections, transaction
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from api.models import Proposition
+
+
+SEARCH_TABLE = 'api_proposition_search'
+
+# Relevance annotated to the searched querysets
+SEARCH_RANK = 'search_rank'
+
+STOPWORDS = {
+    'a', 'ao', 'aos', 'as', 'com', 'da', 'das', 'de', 'do', 'dos', 'e', 'em',
+    'na', 'nas', 'no', 'nos', 'o', 'os', 'ou', 'para', 'pela', 'pelas',
+    'pelo', 'pelos', 'por', 'que', 'se', 'sem', 'um', 'uma',
+}
+
+# (suffix, replacement, shortest stem) rules folding Portuguese plurals,
+# applied to accent free words, the first matching one only
+PLURAL_RULES = [
+    ('oes', 'ao', 2),
+    ('aes', 'ao', 3),
+    ('ais', 'al', 2),
+    ('eis', 'el', 3),
+    ('ns', 'm', 2),
+    ('res', 'r', 3),
+    ('zes', 'z', 2),
+    ('ses', 's', 2),
+    ('s', '', 2),
+]
+
+
+def normalize(text):
+    """
+    Returns the text lowercased and without accents.
+    """
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(
+        character for character in decomposed
+        if not unicodedata.combining(character)
+    )
+
+
+def stem(word):
+    """
+    Light Portuguese stemmer, which folds the plural and the gender of the
+    normalized word, such that 'publicas' and 'publico' share 'public'.
+    """
+    if len(word) <= 3 or word.isdigit():
+        return word
+
+    for suffix, replacement, shortest in PLURAL_RULES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= shortest:
+            word = word[:-len(suffix)] + replacement
+            break
+
+    if word.endswith('mente') and len(word) > 7:
+        word = word[:-len('mente')]
+
+    if word[-1] in 'aeo' and len(word) > 3:
+        word = word[:-1]
+
+    return word
+
+
+def search_terms(text):
+    """
+    Returns the stems of the words of the text, but the stopwords.
+    """
+    return [
+        stem(word) for word in re.findall(r'[a-z0-9]+', normalize(text))
+        if word not in STOPWORDS
+    ]
+
+
+def proposition_document(proposition):
+    """
+    Returns the indexed text of the proposition: the stems of its abstract,
+    type, number and year.
+    """
+    return ' '.join(search_terms(' '.join([
+        proposition.abstract,
+        proposition.proposition_type,
+        proposition.proposition_type_initials,
+        str(proposition.number),
+        str(proposition.year),
+    ])))
+
+
+class SQLiteSearchBackend(object):
+    """
+    Indexes the propositions in an FTS5 table, whose rowid is the
+    proposition id, ranking by bm25.
+    """
+
+    def create_index(self, cursor):
+        cursor.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS {table} '
+            'USING fts5(document)'.format(table=SEARCH_TABLE)
+        )
+
+    def index(self, cursor, documents):
+        cursor.executemany(
+            'DELETE FROM {table} WHERE rowid = %s'.format(table=SEARCH_TABLE),
+            [(proposition_id,) for proposition_id, _ in documents]
+        )
+        cursor.executemany(
+            'INSERT INTO {table} (rowid, document) '
+            'VALUES (%s, %s)'.format(table=SEARCH_TABLE),
+            documents
+        )
+
+    def match(self, terms):
+        match = ' AND '.join('"{}"*'.format(term) for term in terms)
+
+        ids_sql = (
+            'SELECT rowid FROM {table} WHERE {table} MATCH %s'.format(
+                table=SEARCH_TABLE
+            )
+        )
+        rank_sql = (
+            'SELECT -bm25({table}) FROM {table} '
+            'WHERE {table} MATCH %s AND rowid = {{column}}'.format(
+                table=SEARCH_TABLE
+            )
+        )
+
+        return ids_sql, rank_sql, match
+
+
+class PostgreSQLSearchBackend(object):
+    """
+    Indexes the propositions in a tsvector table with a GIN index, ranking
+    by ts_rank. The documents are already stemmed, so they are parsed with
+    the 'simple' configuration.
+    """
+
+    def create_index(self, cursor):
+        cursor.execute(
+            'CREATE TABLE IF NOT EXISTS {table} ('
+            'proposition_id integer PRIMARY KEY '
+            'REFERENCES api_proposition (id) ON DELETE CASCADE, '
+            'document tsvector NOT NULL)'.format(table=SEARCH_TABLE)
+        )
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS {table}_document_idx '
+            'ON {table} USING GIN (document)'.format(table=SEARCH_TABLE)
+        )
+
+    def index(self, cursor, documents):
+        cursor.executemany(
+            'INSERT INTO {table} (proposition_id, document) '
+            'VALUES (%s, to_tsvector(\'simple\', %s)) '
+            'ON CONFLICT (proposition_id) '
+            'DO UPDATE SET document = EXCLUDED.document'.format(
+                table=SEARCH_TABLE
+            ),
+            documents
+        )
+
+    def match(self, terms):
+        match = ' & '.join('{}:*'.format(term) for term in terms)
+
+        ids_sql = (
+            'SELECT proposition_id FROM {table} '
+            'WHERE document @@ to_tsquery(\'simple\', %s)'.format(
+                table=SEARCH_TABLE
+            )
+        )
+        rank_sql = (
+            'SELECT ts_rank(document, to_tsquery(\'simple\', %s)) '
+            'FROM {table} WHERE proposition_id = {{column}}'.format(
+                table=SEARCH_TABLE
+            )
+        )
+
+        return ids_sql, rank_sql, match
+
+
+SEARCH_BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgreSQLSearchBackend,
+}
+
+
+def get_search_backend(using='default'):
+    """
+    Returns the search backend of the database, or None when it has no
+    full-text index.
+    """
+    backend = SEARCH_BACKENDS.get(connections[using].vendor)
+    return backend() if backend is not None else None
+
+
+def index_propositions(propositions, using='default'):
+    """
+    Adds the given propositions to the search index, replacing their
+    previous documents.
+    """
+    backend = get_search_backend(using)
+    if backend is None:
+        return
+
+    documents = [
+        (proposition.pk, proposition_document(proposition))
+        for proposition in propositions
+    ]
+    if not documents:
+        return
+
+    with connections[using].cursor() as cursor:
+        backend.index(cursor, documents)
+
+
+def create_search_index(using='default'):
+    """
+    Creates the search index if needed, indexing every proposition when it
+    is empty.
+    """
+    backend = get_search_backend(using)
+    if backend is None:
+        return
+
+    connection = connections[using]
+    if Proposition._meta.db_table not in \
+            connection.introspection.table_names():
+        return
+
+    with transaction.atomic(using=using):
+        with connection.cursor() as cursor:
+            backend.create_index(cursor)
+            cursor.execute(
+                'SELECT 1 FROM {table} LIMIT 1'.format(table=SEARCH_TABLE)
+            )
+            empty = cursor.fetchone() is None
+
+        if empty:
+            rebuild_search_index(using)
+
+
+def rebuild_search_index(using='default'):
+    """
+    Indexes again every proposition. Returns how many were indexed.
+    """
+    propositions = Proposition.objects.using(using).only(
+        'abstract',
+        'proposition_type',
+        'proposition_type_initials',
+        'number',
+        'year'
+    )
+
+    with transaction.atomic(using=using):
+        with connections[using].cursor() as cursor:
+            cursor.execute('DELETE FROM {table}'.format(table=SEARCH_TABLE))
+
+        count = 0
+        batch = list()
+        for proposition in propositions.iterator():
+            batch.append(proposition)
+            if len(batch) == 1000:
+                index_propositions(batch, using)
+                count += len(batch)
+                batch = list()
+        index_propositions(batch, using)
+
+    return count + len(batch)
+
+
+def contains_propositions(queryset, query, field='pk'):
+    """
+    Filters the queryset by the propositions, referenced by the given
+    field, whose texts or numbers contain the whole query.
+    """
+    prefix = '' if field == 'pk' else field + '__'
+    return queryset.filter(
+        Q(**{prefix + 'abstract__icontains': query}) |
+        Q(**{prefix + 'number__contains': query}) |
+        Q(**{prefix + 'proposition_type__icontains': query}) |
+        Q(**{prefix + 'proposition_type_initials__icontains': query}) |
+        Q(**{prefix + 'year__contains': query})
+    )
+
+
+def is_ranked(queryset):
+    """
+    Returns whether the queryset is ordered by search_propositions relevance.
+    """
+    return SEARCH_RANK in queryset.query.annotations
+
+
+def search_propositions(queryset, query, field='pk'):
+    """
+    Filters the queryset by the propositions, referenced by the given
+    field, that have every word of the query (accents, case, plurals and
+    gender aside, and as prefixes), ordering it by relevance first.
+
+    Queries made only of stopwords, and databases without a search index,
+    fall back to contains_propositions.
+    """
+    terms = search_terms(query)
+    backend = get_search_backend(queryset.db)
+    if not terms or backend is None:
+        return contains_propositions(queryset, query, field)
+
+    ids_sql, rank_sql, match = backend.match(terms)
+
+    quote_name = connections[queryset.db].ops.quote_name
+    column = '{table}.{column}'.format(
+        table=quote_name(queryset.model._meta.db_table),
+        column=quote_name(queryset.model._meta.get_field(
+            queryset.model._meta.pk.name if field == 'pk' else field
+        ).column)
+    )
+
+    # A RawSQL __in lookup would be parenthesized twice, as a single value
+    return queryset.extra(
+        where=['{column} IN ({ids_sql})'.format(
+            column=column,
+            ids_sql=ids_sql
+        )],
+        params=[match]
+    ).annotate(**{
+        SEARCH_RANK: RawSQL(
+            rank_sql.format(column=column),
+            [match],
+            output_field=FloatField()
+        )
+    }).order_by('-' + SEARCH_RANK, *queryset.query.order_by)
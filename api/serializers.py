@@ -1,6 +1,7 @@
 from .models import (
-    Compatibility, ExtendedUser, Parliamentary, ParliamentaryVote, Proposition,
-    SocialInformation, UserFollowing, UserVote, ContactUs
+    Compatibility, ExtendedUser, GroupCompatibility, Parliamentary,
+    ParliamentaryVote, Proposition, SocialInformation, UserFollowing,
+    UserVote, ContactUs
 )
 from rest_framework import serializers
 from django.contrib.auth.models import User
@@ -83,8 +84,10 @@ class ParliamentarySerializer(serializers.ModelSerializer):
             'birth_date',
             'education',
             'email',
-            'photo'
+            'photo',
+            'follower_count'
         ]
+        read_only_fields = ['follower_count']
 
 
 class PropositionSerializer(serializers.ModelSerializer):
@@ -156,6 +159,18 @@ class CompatibilitySerializer(serializers.ModelSerializer):
         ]
 
 
+class GroupCompatibilitySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = GroupCompatibility
+        fields = [
+            'name',
+            'parliamentarians',
+            'valid_votes',
+            'matching_votes',
+            'compatibility'
+        ]
+
+
 class ContactUsSerializer(serializers.ModelSerializer):
     class Meta:
         model = ContactUs
@@ -166,3 +181,85 @@ class ContactUsSerializer(serializers.ModelSerializer):
             'choice',
             'text'
         ]
+
+
+class ValuesSerializer(object):
+    """
+    Read-only counterpart of a ModelSerializer for the rows of a values()
+    queryset of its lookups(), building the same data (nested serializers
+    included) with the fields conversions resolved once rather than for
+    every row.
+    """
+
+    # Fields representing the values read from their model fields as they
+    # are
+    IDENTITY_FIELDS = (
+        serializers.CharField,
+        serializers.ChoiceField,
+        serializers.IntegerField,
+        serializers.PrimaryKeyRelatedField,
+    )
+
+    def __init__(self, serializer_class, prefix=''):
+        self.serializer_class = serializer_class
+        self.prefix = prefix
+        self._fields = None
+
+    @property
+    def fields(self):
+        """
+        Returns (name, lookup, convert) of the readable fields, where
+        convert is None for the identity fields and the nested
+        ValuesSerializer for the nested serializers.
+        """
+        if self._fields is None:
+            fields = list()
+
+            for name, field in self.serializer_class().fields.items():
+                if field.write_only:
+                    continue
+
+                lookup = self.prefix + '__'.join(field.source_attrs)
+                if isinstance(field, serializers.BaseSerializer):
+                    convert = ValuesSerializer(type(field), lookup + '__')
+                elif isinstance(field, self.IDENTITY_FIELDS):
+                    convert = None
+                else:
+                    convert = field.to_representation
+
+                fields.append((name, lookup, convert))
+
+            self._fields = fields
+
+        return self._fields
+
+    def lookups(self):
+        lookups = list()
+        for _, lookup, convert in self.fields:
+            if isinstance(convert, ValuesSerializer):
+                lookups.extend(convert.lookups())
+            else:
+                lookups.append(lookup)
+
+        return lookups
+
+    def to_representation(self, row):
+        data = dict()
+        for name, lookup, convert in self.fields:
+            if convert is None:
+                data[name] = row[lookup]
+            elif isinstance(convert, ValuesSerializer):
+                data[name] = convert.to_representation(row)
+            else:
+                value = row[lookup]
+                data[name] = None if value is None else convert(value)
+
+        return data
+
+    def serialize(self, rows):
+        return [self.to_representation(row) for row in rows]
+
+
+parliamentary_values_serializer = ValuesSerializer(ParliamentarySerializer)
+proposition_values_serializer = ValuesSerializer(PropositionSerializer)
+compatibility_values_serializer = ValuesSerializer(CompatibilitySerializer)
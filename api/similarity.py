@@ -0,0 +1,144 @@
+import os
+import tempfile
+
+import numpy as np
+
+from django.conf import settings
+
+from api.compatibility import get_vote_matrix
+
+
+def calc_similarity_matrix(vote_matrix):
+    """
+    Returns the parliamentarians x parliamentarians agreement and overlap
+    matrices of a vote matrix.
+
+    overlap counts the propositions on which both parliamentarians voted 'Y'
+    or 'N', and agreement is the percentage of them on which both voted the
+    same, following the matching rule of the users compatibilities.
+    """
+    votes = vote_matrix.votes.astype(np.float32)
+    voted = np.abs(votes)
+
+    # float32 products are exact for counts below 2**24
+    overlap = voted @ voted.T
+    matching = (overlap + votes @ votes.T) / 2
+
+    agreement = np.zeros(overlap.shape, dtype=np.float32)
+    np.divide(matching, overlap, out=agreement, where=overlap != 0)
+
+    return agreement * 100, np.rint(overlap).astype(np.int32)
+
+
+def update_similarity_matrix():
+    """
+    Recomputes the similarity matrix from the parliamentary votes and
+    atomically replaces the SIMILARITY_MATRIX_PATH file with it.
+    """
+    vote_matrix = get_vote_matrix()
+    agreement, overlap = calc_similarity_matrix(vote_matrix)
+
+    path = settings.SIMILARITY_MATRIX_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    descriptor, temporary_path = tempfile.mkstemp(
+        dir=os.path.dirname(path),
+        suffix='.npz'
+    )
+    with os.fdopen(descriptor, 'wb') as matrix_file:
+        np.savez(
+            matrix_file,
+            parliamentarians_ids=vote_matrix.parliamentarians_ids,
+            agreement=agreement,
+            overlap=overlap
+        )
+    os.replace(temporary_path, path)
+
+
+class SimilarityMatrix(object):
+    """
+    Agreement (float32) and overlap (int32) between every pair of
+    parliamentarians, as stored by update_similarity_matrix.
+    """
+
+    def __init__(self, parliamentarians_ids, agreement, overlap):
+        self.parliamentarians_ids = parliamentarians_ids
+        self.parliamentary_index = {
+            parliamentary_id: index
+            for index, parliamentary_id
+            in enumerate(parliamentarians_ids.tolist())
+        }
+        self.agreement = agreement
+        self.overlap = overlap
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            return cls(
+                arrays['parliamentarians_ids'],
+                arrays['agreement'],
+                arrays['overlap']
+            )
+
+    def most_similar(self, parliamentary_id, limit):
+        """
+        Returns (parliamentary_id, agreement, overlap) of the limit
+        parliamentarians who most agree with the given one, among the ones
+        with any overlap, in agreement and then overlap order.
+        """
+        index = self.parliamentary_index.get(parliamentary_id)
+        if index is None or limit <= 0:
+            return []
+
+        agreement = self.agreement[index]
+        overlap = self.overlap[index]
+
+        candidates = np.flatnonzero(overlap)
+        candidates = candidates[candidates != index]
+
+        if limit < len(candidates):
+            # Keeps every candidate tied with the limit-th one, so that the
+            # overlap breaks the ties
+            threshold = np.partition(
+                agreement[candidates],
+                len(candidates) - limit
+            )[len(candidates) - limit]
+            candidates = candidates[agreement[candidates] >= threshold]
+
+        candidates = candidates[np.lexsort((
+            self.parliamentarians_ids[candidates],
+            -overlap[candidates],
+            -agreement[candidates]
+        ))][:limit]
+
+        return list(zip(
+            self.parliamentarians_ids[candidates].tolist(),
+            agreement[candidates].tolist(),
+            overlap[candidates].tolist()
+        ))
+
+
+_similarity_matrix = None
+_similarity_matrix_mtime = None
+
+
+def get_similarity_matrix():
+    """
+    Returns the similarity matrix of this process, reloading it when the
+    SIMILARITY_MATRIX_PATH file was replaced and computing it when there
+    is none yet.
+    """
+    global _similarity_matrix, _similarity_matrix_mtime
+
+    path = settings.SIMILARITY_MATRIX_PATH
+
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        update_similarity_matrix()
+        mtime = os.stat(path).st_mtime_ns
+
+    if _similarity_matrix is None or mtime != _similarity_matrix_mtime:
+        _similarity_matrix = SimilarityMatrix.load(path)
+        _similarity_matrix_mtime = mtime
+
+    return _similarity_matrix
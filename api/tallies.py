@@ -0,0 +1,372 @@
+import random
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    Count, F, IntegerField, OuterRef, Subquery, Sum
+)
+
+from api.demographics import invalidate_demographics
+from api.models import ParliamentaryVote, PropositionTally, UserVote
+from api.response_cache import TALLY, bump_generation
+
+
+USERS = 'users'
+PARLIAMENTARIANS = 'parliamentarians'
+
+TALLY_VOTES = {
+    USERS: UserVote,
+    PARLIAMENTARIANS: ParliamentaryVote,
+}
+
+# Suffix of the tally counter of each option, any other option is only
+# counted in the total
+TALLY_OPTIONS = {
+    'Y': 'yes',
+    'N': 'no',
+    'A': 'abstention',
+    'O': 'obstruction',
+    'M': 'missing',
+}
+
+TALLY_FIELDS = [
+    '{kind}_{counter}'.format(kind=kind, counter=counter)
+    for kind in TALLY_VOTES
+    for counter in ['total'] + list(TALLY_OPTIONS.values())
+]
+
+# Tally fields summed by annotate_tallies to compute the approvals
+APPROVAL_FIELDS = [
+    'users_total',
+    'users_yes',
+    'parliamentarians_total',
+    'parliamentarians_yes',
+]
+
+# Names of the sums of the APPROVAL_FIELDS annotated by annotate_tallies
+TALLY_ANNOTATIONS = ['tally_' + field for field in APPROVAL_FIELDS]
+
+
+def tally_fields(kind, option):
+    """
+    Returns the tally fields counting a vote of the given kind and option.
+    """
+    fields = ['{kind}_total'.format(kind=kind)]
+
+    if option in TALLY_OPTIONS:
+        fields.append('{kind}_{option}'.format(
+            kind=kind,
+            option=TALLY_OPTIONS[option]
+        ))
+
+    return fields
+
+
+def count_tallies(propositions_ids=None):
+    """
+    Returns the tally fields values of the given propositions (or of all
+    voted propositions), counted from the user and parliamentary votes.
+    """
+    tallies = defaultdict(dict)
+
+    for kind, model in TALLY_VOTES.items():
+        votes = model.objects.all()
+        if propositions_ids is not None:
+            votes = votes.filter(proposition__in=propositions_ids)
+
+        for vote in votes.values('proposition', 'option').annotate(
+            votes=Count('id')
+        ).order_by():
+            tally = tallies[vote['proposition']]
+            for field in tally_fields(kind, vote['option']):
+                tally[field] = tally.get(field, 0) + vote['votes']
+
+    return tallies
+
+
+def sum_tallies(propositions_ids=None):
+    """
+    Returns the tally fields values of the given propositions (or of all
+    tallied propositions), summing their stored shards.
+    """
+    tallies = PropositionTally.objects.all()
+    if propositions_ids is not None:
+        tallies = tallies.filter(proposition__in=propositions_ids)
+
+    return {
+        tally['proposition']: {
+            field: tally[field] for field in TALLY_FIELDS if tally[field]
+        }
+        for tally in tallies.values('proposition').annotate(
+            **{field: Sum(field) for field in TALLY_FIELDS}
+        ).order_by()
+    }
+
+
+def create_tally(proposition_id):
+    """
+    Creates the first shard of the tally of a proposition, counted from its
+    votes. Returns whether it was created, or already existed.
+    """
+    try:
+        with transaction.atomic():
+            PropositionTally.objects.create(
+                proposition_id=proposition_id,
+                shard=0,
+                **count_tallies([proposition_id])[proposition_id]
+            )
+    except IntegrityError:
+        return False
+
+    return True
+
+
+def add_to_tally(proposition_id, counts, shards=None):
+    """
+    Adds the given {field: delta} counts to a random shard, out of the
+    TALLY_SHARDS setting (or of the given number of shards), of the tally of
+    the proposition.
+
+    Propositions without a tally get one counted from their votes, which
+    must already include the counted changes. The cached demographics of the
+    proposition, and every cached response depending on the tallies, are
+    dropped.
+    """
+    counts = {field: delta for field, delta in counts.items() if delta}
+    if not counts:
+        return
+
+    invalidate_demographics([proposition_id])
+    bump_generation(TALLY)
+
+    if shards is None:
+        shards = settings.TALLY_SHARDS
+    shard = random.randrange(shards)
+
+    tallies = PropositionTally.objects.filter(
+        proposition=proposition_id,
+        shard=shard
+    )
+    updates = {field: F(field) + delta for field, delta in counts.items()}
+
+    with transaction.atomic():
+        if tallies.update(**updates):
+            return
+
+        if not PropositionTally.objects.filter(
+            proposition=proposition_id
+        ).exists() and create_tally(proposition_id):
+            return
+
+        try:
+            with transaction.atomic():
+                PropositionTally.objects.create(
+                    proposition_id=proposition_id,
+                    shard=shard,
+                    **counts
+                )
+        except IntegrityError:
+            # Created concurrently
+            tallies.update(**updates)
+
+
+def update_tally(proposition_id, kind, old_option=None, new_option=None):
+    """
+    Updates the tally of a proposition after one of its votes of the given
+    kind changed from old_option to new_option (None meaning that there was
+    no vote before, or there is no vote after).
+    """
+    if old_option == new_option:
+        return
+
+    counts = Counter()
+    if old_option is not None:
+        counts.subtract(tally_fields(kind, old_option))
+    if new_option is not None:
+        counts.update(tally_fields(kind, new_option))
+
+    add_to_tally(proposition_id, counts)
+
+
+def update_user_vote_tally(user_vote, data):
+    """
+    Updates the tallies after user_vote was edited to the serialized data.
+    """
+    if user_vote.proposition_id == data['proposition']:
+        update_tally(
+            user_vote.proposition_id,
+            USERS,
+            user_vote.option,
+            data['option']
+        )
+    else:
+        update_tally(
+            user_vote.proposition_id,
+            USERS,
+            old_option=user_vote.option
+        )
+        update_tally(data['proposition'], USERS, new_option=data['option'])
+
+
+def add_parliamentary_votes_tallies(parliamentary_votes):
+    """
+    Adds the given created parliamentary votes to the tallies.
+    """
+    counts = defaultdict(Counter)
+    for vote in parliamentary_votes:
+        counts[vote.proposition_id].update(
+            tally_fields(PARLIAMENTARIANS, vote.option)
+        )
+
+    for proposition_id, proposition_counts in counts.items():
+        add_to_tally(proposition_id, proposition_counts)
+
+
+def annotate_tallies(queryset, proposition='pk'):
+    """
+    Annotates the queryset with the sums, prefixed by 'tally_', of the
+    shards of the tally of the proposition referenced by the given field.
+
+    The sums are correlated subqueries rather than a joined GROUP BY, so
+    that they are only computed for the rows of the requested page, and the
+    ordering of the queryset can still be read from an index.
+    """
+    return queryset.annotate(**{
+        annotation: Subquery(
+            PropositionTally.objects.filter(
+                proposition=OuterRef(proposition)
+            ).order_by().values('proposition').annotate(
+                tally_sum=Sum(field)
+            ).values('tally_sum'),
+            output_field=IntegerField()
+        )
+        for annotation, field in zip(TALLY_ANNOTATIONS, APPROVAL_FIELDS)
+    })
+
+
+def calc_approvals(tallied, proposition_id):
+    """
+    Returns the parliamentarians and population approvals of the
+    proposition, from the tally sums annotated to tallied (an instance or a
+    values() row) by annotate_tallies, or else from its stored shards.
+    Propositions without a tally get one counted from their votes.
+    """
+    if isinstance(tallied, dict):
+        sums = [tallied.get(annotation) for annotation in TALLY_ANNOTATIONS]
+    else:
+        sums = [
+            getattr(tallied, annotation, None)
+            for annotation in TALLY_ANNOTATIONS
+        ]
+
+    if sums[0] is None:
+        tallies = sum_tallies([proposition_id])
+        if proposition_id not in tallies:
+            create_tally(proposition_id)
+            tallies = sum_tallies([proposition_id])
+
+        tally = tallies.get(proposition_id, {})
+        sums = [tally.get(field, 0) for field in APPROVAL_FIELDS]
+
+    users_total, users_yes, parliamentarians_total, parliamentarians_yes = \
+        sums
+
+    approvals = list()
+    for yes, total in ((parliamentarians_yes, parliamentarians_total),
+                       (users_yes, users_total)):
+        try:
+            approvals.append(yes / total * 100)
+        except ZeroDivisionError:
+            approvals.append(0)
+
+    return tuple(approvals)
+
+
+def compact_tally(proposition_id):
+    """
+    Folds the shards of the tally of a proposition into its first one.
+    """
+    with transaction.atomic():
+        shards = list(
+            PropositionTally.objects.select_for_update().filter(
+                proposition=proposition_id
+            ).order_by('shard')
+        )
+
+        if len(shards) < 2:
+            return
+
+        for field in TALLY_FIELDS:
+            setattr(
+                shards[0],
+                field,
+                sum(getattr(shard, field) for shard in shards)
+            )
+        shards[0].save()
+
+        PropositionTally.objects.filter(
+            pk__in=[shard.pk for shard in shards[1:]]
+        ).delete()
+
+
+def compact_tallies():
+    """
+    Folds the shards of every tally into its first one. Returns the number
+    of compacted tallies.
+    """
+    propositions_ids = PropositionTally.objects.values(
+        'proposition'
+    ).annotate(
+        shards=Count('id')
+    ).filter(
+        shards__gt=1
+    ).values_list('proposition', flat=True)
+
+    propositions_ids = list(propositions_ids)
+    for proposition_id in propositions_ids:
+        compact_tally(proposition_id)
+
+    return len(propositions_ids)
+
+
+def rebuild_tallies(save=True):
+    """
+    Counts again all tallies from the votes, storing them compacted if save
+    is True.
+
+    Returns the {proposition_id: {field: (stored, counted)}} drift of the
+    stored tallies that didn't match the votes.
+    """
+    with transaction.atomic():
+        list(PropositionTally.objects.select_for_update().values('id'))
+
+        stored = sum_tallies()
+        counted = count_tallies()
+
+        drift = dict()
+        for proposition_id in set(stored) | set(counted):
+            stored_tally = stored.get(proposition_id, {})
+            counted_tally = counted.get(proposition_id, {})
+
+            differences = {
+                field: (stored_tally.get(field, 0),
+                        counted_tally.get(field, 0))
+                for field in TALLY_FIELDS
+                if stored_tally.get(field, 0) != counted_tally.get(field, 0)
+            }
+            if differences:
+                drift[proposition_id] = differences
+
+        if save:
+            for proposition_id in drift:
+                PropositionTally.objects.filter(
+                    proposition=proposition_id
+                ).delete()
+                PropositionTally.objects.create(
+                    proposition_id=proposition_id,
+                    shard=0,
+                    **counted.get(proposition_id, {})
+                )
+
+    return drift
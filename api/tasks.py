@@ -5,8 +5,23 @@ from base64 import b64encode
 
 from celery import task
 
+from django.contrib.auth.models import User
+
 import requests
 
+from .compatibility import (
+    refresh_compatibilities as run_compatibility_refresh,
+    update_user_compatibility
+)
+from .demographics import rebuild_cube
+from .leaderboards import (
+    reconcile_follower_counts as run_follower_counts_reconciliation,
+    refresh_leaderboard as run_leaderboard_refresh
+)
+from .models import CompatibilityRefresh
+from .similarity import update_similarity_matrix as run_similarity_update
+from .tallies import compact_tallies as run_tallies_compaction
+
 
 def __get_credentials():
     with open('.loader_credentials.json', 'r') as f:
@@ -51,3 +66,42 @@ def get_propositions():
             "Authorization": __get_credentials()
         }
     )
+
+
+@task()
+def update_compatibility(user_id):
+    update_user_compatibility(User.objects.get(pk=user_id))
+
+
+@task(acks_late=True)
+def refresh_compatibilities(refresh_id):
+    refresh = CompatibilityRefresh.objects.get(pk=refresh_id)
+
+    if refresh.finished is None:
+        run_compatibility_refresh(refresh)
+        update_similarity_matrix.delay()
+
+
+@task()
+def update_similarity_matrix():
+    run_similarity_update()
+
+
+@task()
+def compact_tallies():
+    run_tallies_compaction()
+
+
+@task()
+def rebuild_demographic_cube():
+    rebuild_cube()
+
+
+@task()
+def refresh_leaderboard(kind):
+    run_leaderboard_refresh(kind)
+
+
+@task()
+def reconcile_follower_counts():
+    run_follower_counts_reconciliation()
@@ -1,14 +1,65 @@
 import datetime
-from django.test import Client
-from django.contrib.auth.models import User
-from .models import SocialInformation, ContactUs
+import os
+import tempfile
+from base64 import b64encode
+from django.conf import settings
+from django.test import Client, override_settings
+from django.contrib.auth.models import Group, Permission, User
+from django.utils import timezone
+from .models import (
+    SocialInformation, ContactUs, Compatibility, CompatibilityRefresh,
+    DemographicCell, GroupCompatibility,
+    ExtendedUser, LeaderboardEntry, Parliamentary, ParliamentaryVote,
+    Proposition, PropositionTally, UserFollowing, UserVote
+)
+from django.core.cache import cache, caches
+from django.db import connection
+from django.db.models import Count, F, Max, Q
+from django.test.utils import CaptureQueriesContext
+from .authentication import CachedTokenAuthentication
+from .autocomplete import invalidate_autocomplete_index
+from .compatibility import (
+    VoteBitsetIndex, bitset_compatibility_counts, calc_compatibilities,
+    calc_compatibility, get_vote_bitset_index, get_vote_matrix,
+    invalidate_vote_bitset_index, invalidate_vote_matrix,
+    matrix_compatibility_counts, refresh_users_compatibilities,
+    sql_compatibility_counts
+)
+from .demographics import get_demographics, rebuild_cube
+from .leaderboards import reconcile_follower_counts, refresh_leaderboard
+from .response_cache import INGEST, TALLY, bump_generation
+from .permissions import social_information_id
+from .search import index_propositions, search_terms
+from .serializers import (
+    CompatibilitySerializer, ParliamentarySerializer, PropositionSerializer,
+    compatibility_values_serializer, parliamentary_values_serializer,
+    proposition_values_serializer
+)
+from .tallies import (
+    add_parliamentary_votes_tallies, compact_tallies, rebuild_tallies,
+    sum_tallies
+)
+from .tasks import update_compatibility as update_compatibility_task
+from .utils import (
+    schedule_compatibility_refresh, schedule_compatibility_update,
+    update_user_compatibility
+)
 from django.urls import include, path, reverse
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIRequestFactory, APITestCase
 from .views import SocialInformationViewset, UserViewset, ContactUsViewset
 from  rest_framework import serializers, status
 from django.utils.translation import ugettext_lazy as _
+from django.core.management import call_command
+from rest_framework.renderers import JSONRenderer
+from io import StringIO
+from unittest import mock
+from voxpopapi.celery import app as celery_app
 # Create your tests here.
 
+# There is no broker while testing, so tasks run synchronously
+celery_app.conf.task_always_eager = True
+
 
 class UserTests(APITestCase):
 
@@ -269,3 +320,2354 @@ class SocialInformationTests(APITestCase):
                 "Date has wrong format. Use one of these formats instead: YYYY[-MM[-DD]]."
             ]}
         )
+
+
+class CompatibilityTests(APITestCase):
+
+    def setUp(self):
+        """
+        This method will run before any test.
+        """
+        self.user = User.objects.create(
+            username='teste',
+            first_name='teste',
+            last_name='teste',
+            email='teste@teste.com',
+            password='teste'
+        )
+        self.extended_user = ExtendedUser.objects.create(user=self.user)
+
+        self.parliamentarians = [
+            Parliamentary.objects.create(
+                parliamentary_id=str(i),
+                name='Parliamentary {}'.format(i),
+                political_party='P{}'.format(i % 2),
+                federal_unit='DF'
+            )
+            for i in range(4)
+        ]
+        self.propositions = [
+            Proposition.objects.create(
+                native_id=str(i),
+                proposition_type='Projeto de Lei',
+                proposition_type_initials='PL',
+                number=i,
+                year=2018,
+                abstract='Proposition {}'.format(i),
+                last_update=timezone.now()
+            )
+            for i in range(3)
+        ]
+
+        options = [
+            ['Y', 'N', 'Y', 'A'],
+            ['N', 'N', 'Y', 'Y'],
+            ['Y', 'O', 'N', 'N'],
+        ]
+        for proposition, proposition_options in zip(self.propositions,
+                                                    options):
+            for parliamentary, option in zip(self.parliamentarians,
+                                             proposition_options):
+                ParliamentaryVote.objects.create(
+                    proposition=proposition,
+                    parliamentary=parliamentary,
+                    option=option
+                )
+
+        self.url = '/api/user_votes/'
+        self.client.force_authenticate(self.user)
+
+        invalidate_vote_matrix()
+        invalidate_vote_bitset_index()
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+        similarity_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(similarity_dir.cleanup)
+        similarity_settings = self.settings(
+            SIMILARITY_MATRIX_PATH=os.path.join(
+                similarity_dir.name,
+                'similarity_matrix.npz'
+            )
+        )
+        similarity_settings.enable()
+        self.addCleanup(similarity_settings.disable)
+
+    def compatibilities(self):
+        return [
+            (
+                compatibility.parliamentary_id,
+                compatibility.valid_votes,
+                compatibility.matching_votes,
+                round(compatibility.compatibility, 6)
+            )
+            for compatibility in self.user.compatibilities.order_by(
+                'parliamentary'
+            )
+        ]
+
+    def group_compatibilities(self):
+        return [
+            (
+                group_compatibility.group,
+                group_compatibility.name,
+                group_compatibility.parliamentarians,
+                group_compatibility.valid_votes,
+                group_compatibility.matching_votes,
+                round(group_compatibility.compatibility, 6)
+            )
+            for group_compatibility in
+            self.user.group_compatibilities.order_by('group', 'name')
+        ]
+
+    def assertCompatibilitiesUpToDate(self):
+        incremental = self.compatibilities()
+        incremental_groups = self.group_compatibilities()
+        update_user_compatibility(self.user)
+        self.assertEqual(incremental, self.compatibilities())
+        self.assertEqual(incremental_groups, self.group_compatibilities())
+
+    def compute(self):
+        update_user_compatibility(self.user)
+        ExtendedUser.objects.filter(user=self.user).update(
+            should_update=False
+        )
+
+    def test_incremental_create_vote(self):
+        """
+        Ensure casting a vote updates the stored compatibilities in place.
+        """
+        UserVote.objects.create(
+            user=self.user,
+            proposition=self.propositions[0],
+            option='Y'
+        )
+        self.compute()
+
+        data = {'proposition': self.propositions[1].pk, 'option': 'N'}
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        self.extended_user.refresh_from_db()
+        self.assertFalse(self.extended_user.should_update)
+        self.assertCompatibilitiesUpToDate()
+
+    def test_vote_after_new_parliamentary(self):
+        """
+        Ensure voting after a parliamentary was ingested stores his
+        compatibility, which is served meanwhile as 0.
+        """
+        UserVote.objects.create(
+            user=self.user,
+            proposition=self.propositions[0],
+            option='Y'
+        )
+        self.compute()
+
+        parliamentary = Parliamentary.objects.create(
+            parliamentary_id='new',
+            name='New parliamentary'
+        )
+
+        response = self.client.get('/api/parliamentarians/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data['results'][-1]['compatibility'],
+            0
+        )
+
+        data = {'proposition': self.propositions[1].pk, 'option': 'N'}
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        self.assertTrue(
+            self.user.compatibilities.filter(
+                parliamentary=parliamentary
+            ).exists()
+        )
+        self.assertCompatibilitiesUpToDate()
+
+    def test_incremental_update_vote(self):
+        """
+        Ensure changing a vote updates the stored compatibilities in place.
+        """
+        UserVote.objects.create(
+            user=self.user,
+            proposition=self.propositions[0],
+            option='Y'
+        )
+        user_vote = UserVote.objects.create(
+            user=self.user,
+            proposition=self.propositions[1],
+            option='Y'
+        )
+        self.compute()
+
+        for option in ['N', 'A', 'Y']:
+            response = self.client.patch(
+                self.url + str(user_vote.pk) + '/',
+                {'option': option},
+                format='json'
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertCompatibilitiesUpToDate()
+
+        response = self.client.put(
+            self.url + str(user_vote.pk) + '/',
+            {'proposition': self.propositions[2].pk, 'option': 'N'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertCompatibilitiesUpToDate()
+
+    def test_incremental_destroy_vote(self):
+        """
+        Ensure removing a vote updates the stored compatibilities in place.
+        """
+        UserVote.objects.create(
+            user=self.user,
+            proposition=self.propositions[0],
+            option='N'
+        )
+        user_vote = UserVote.objects.create(
+            user=self.user,
+            proposition=self.propositions[2],
+            option='Y'
+        )
+        self.compute()
+
+        response = self.client.delete(self.url + str(user_vote.pk) + '/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertCompatibilitiesUpToDate()
+
+    def test_vote_without_compatibilities(self):
+        """
+        Ensure an user without stored compatibilities gets them fully
+        computed.
+        """
+        self.extended_user.should_update = False
+        self.extended_user.save()
+
+        data = {'proposition': self.propositions[0].pk, 'option': 'Y'}
+        self.client.post(self.url, data, format='json')
+
+        self.extended_user.refresh_from_db()
+        self.assertFalse(self.extended_user.should_update)
+        self.assertFalse(self.extended_user.update_scheduled)
+        self.assertCompatibilitiesUpToDate()
+
+    def reference_compatibility_counts(self, user):
+        """
+        Returns the (parliamentary_id, valid_votes, matching_votes) of the
+        user as originally computed, with one GROUP BY query for the valid
+        votes and another for the matching ones.
+        """
+        def count_votes(*filters):
+            return dict(
+                user.votes.filter(
+                    Q(proposition__parliamentary_votes__option='Y') |
+                    Q(proposition__parliamentary_votes__option='N'),
+                    *filters
+                ).annotate(
+                    parliamentary=F(
+                        'proposition__parliamentary_votes__parliamentary'
+                    )
+                ).values(
+                    'parliamentary'
+                ).annotate(
+                    votes=Count('parliamentary')
+                ).order_by(
+                    'parliamentary'
+                ).values_list('parliamentary', 'votes')
+            )
+
+        valid_votes = count_votes()
+        matching_votes = count_votes(
+            Q(proposition__parliamentary_votes__option=F('option'))
+        )
+
+        return [
+            (
+                parliamentary_id,
+                valid_votes.get(parliamentary_id, 0),
+                matching_votes.get(parliamentary_id, 0)
+            )
+            for parliamentary_id in Parliamentary.objects.order_by(
+                'id'
+            ).values_list('id', flat=True)
+        ]
+
+    def reference_compatibility(self, valid_votes, matching_votes,
+                                user_valid_votes):
+        """
+        Returns the compatibility score as originally computed.
+        """
+        A = 1
+        B = 2
+
+        try:
+            return (
+                matching_votes * (
+                    user_valid_votes * A + valid_votes * B
+                ) / (
+                    valid_votes * user_valid_votes * (A + B)
+                )
+            ) * 100
+        except ZeroDivisionError:
+            return 0
+
+    def test_matrix_parity(self):
+        """
+        Ensure every engine and the vote matrix give the same counts and
+        scores as the original ORM computation, including abstentions,
+        propositions no user voted on and parliamentarians sharing no votes
+        with the users.
+        """
+        # Only voted on a proposition no user votes on
+        parliamentary = Parliamentary.objects.create(
+            parliamentary_id='4',
+            name='Parliamentary 4',
+            political_party='P0',
+            federal_unit='SP'
+        )
+        ParliamentaryVote.objects.create(
+            proposition=Proposition.objects.create(
+                native_id='3',
+                proposition_type='Projeto de Lei',
+                proposition_type_initials='PL',
+                number=3,
+                year=2018,
+                abstract='Proposition 3',
+                last_update=timezone.now()
+            ),
+            parliamentary=parliamentary,
+            option='Y'
+        )
+        invalidate_vote_matrix()
+        invalidate_vote_bitset_index()
+
+        users_options = [
+            ['Y', 'N', 'Y'],
+            ['N', None, 'A'],
+            [None, 'Y', 'N'],
+            ['A', 'A', None],
+            [None, None, None],
+        ]
+        users = list()
+        for i, options in enumerate(users_options):
+            user = User.objects.create(username='user {}'.format(i))
+            users.append(user)
+            for proposition, option in zip(self.propositions, options):
+                if option:
+                    UserVote.objects.create(
+                        user=user,
+                        proposition=proposition,
+                        option=option
+                    )
+
+        vote_matrix = get_vote_matrix()
+        valid_votes, matching_votes = vote_matrix.counts_batch([
+            list(user.votes.values_list('proposition', 'option'))
+            for user in users
+        ])
+
+        for i, user in enumerate(users):
+            counts = self.reference_compatibility_counts(user)
+            self.assertEqual(counts, sql_compatibility_counts(user))
+            self.assertEqual(counts, matrix_compatibility_counts(user))
+            self.assertEqual(counts, bitset_compatibility_counts(user))
+            self.assertEqual(
+                counts,
+                list(zip(
+                    vote_matrix.parliamentarians_ids.tolist(),
+                    valid_votes[i].tolist(),
+                    matching_votes[i].tolist()
+                ))
+            )
+
+            user_valid_votes = user.votes.filter(
+                option__in=['Y', 'N']
+            ).count()
+            reference = [
+                self.reference_compatibility(valid, matching, user_valid_votes)
+                for parliamentary_id, valid, matching in counts
+            ]
+            self.assertEqual(
+                reference,
+                [
+                    calc_compatibility(valid, matching, user_valid_votes)
+                    for parliamentary_id, valid, matching in counts
+                ]
+            )
+            self.assertEqual(
+                reference,
+                calc_compatibilities(
+                    valid_votes[i],
+                    matching_votes[i],
+                    user_valid_votes
+                ).tolist()
+            )
+
+    def test_store_only_changed_compatibilities(self):
+        """
+        Ensure recomputing compatibilities only rewrites the changed rows.
+        """
+        UserVote.objects.create(
+            user=self.user,
+            proposition=self.propositions[0],
+            option='Y'
+        )
+
+        self.assertEqual(update_user_compatibility(self.user), (4, 0))
+        self.assertEqual(update_user_compatibility(self.user), (0, 4))
+        ids = set(self.user.compatibilities.values_list('id', flat=True))
+
+        # Parliamentary 1 has no 'Y' or 'N' vote on this proposition
+        UserVote.objects.create(
+            user=self.user,
+            proposition=self.propositions[2],
+            option='A'
+        )
+        self.assertEqual(update_user_compatibility(self.user), (3, 1))
+        self.assertEqual(
+            ids,
+            set(self.user.compatibilities.values_list('id', flat=True))
+        )
+        self.assertEqual(update_user_compatibility(self.user), (0, 4))
+
+    def test_bitset_index_catch_up(self):
+        """
+        Ensure the vote bitset index adds new parliamentarians and votes
+        without rebuilding, and is rebuilt when votes are removed.
+        """
+        for proposition, option in zip(self.propositions, ['Y', 'N', 'A']):
+            UserVote.objects.create(
+                user=self.user,
+                proposition=proposition,
+                option=option
+            )
+
+        vote_index = get_vote_bitset_index()
+        self.assertEqual(
+            sql_compatibility_counts(self.user),
+            bitset_compatibility_counts(self.user)
+        )
+
+        parliamentary = Parliamentary.objects.create(
+            parliamentary_id='5',
+            name='Parliamentary 5'
+        )
+        for proposition, option in zip(self.propositions, ['N', 'N', 'Y']):
+            ParliamentaryVote.objects.create(
+                proposition=proposition,
+                parliamentary=parliamentary,
+                option=option
+            )
+
+        self.assertIs(vote_index, get_vote_bitset_index())
+        self.assertEqual(
+            sql_compatibility_counts(self.user),
+            bitset_compatibility_counts(self.user)
+        )
+
+        parliamentary.votes.all().delete()
+
+        self.assertIsNot(vote_index, get_vote_bitset_index())
+        self.assertEqual(
+            sql_compatibility_counts(self.user),
+            bitset_compatibility_counts(self.user)
+        )
+
+    def test_bitset_index_missed_parliamentary(self):
+        """
+        Ensure the vote bitset index is rebuilt, instead of failing, when it
+        meets votes of a parliamentary committed after a greater id was
+        indexed, and falls back to the sql engine while stale.
+        """
+        for proposition, option in zip(self.propositions, ['Y', 'N', 'A']):
+            UserVote.objects.create(
+                user=self.user,
+                proposition=proposition,
+                option=option
+            )
+
+        last_id = Parliamentary.objects.aggregate(last=Max('id'))['last']
+        Parliamentary.objects.create(
+            id=last_id + 10,
+            parliamentary_id='10',
+            name='Parliamentary 10'
+        )
+        vote_index = get_vote_bitset_index()
+
+        parliamentary = Parliamentary.objects.create(
+            id=last_id + 5,
+            parliamentary_id='5',
+            name='Parliamentary 5'
+        )
+        for proposition, option in zip(self.propositions, ['N', 'N', 'Y']):
+            ParliamentaryVote.objects.create(
+                proposition=proposition,
+                parliamentary=parliamentary,
+                option=option
+            )
+
+        self.assertIsNot(vote_index, get_vote_bitset_index())
+        self.assertFalse(get_vote_bitset_index().stale)
+        self.assertEqual(
+            sql_compatibility_counts(self.user),
+            bitset_compatibility_counts(self.user)
+        )
+
+        vote_index = get_vote_bitset_index()
+        vote_index.add_vote(last_id + 20, self.propositions[0].pk, 'Y')
+        self.assertTrue(vote_index.stale)
+        with mock.patch.object(VoteBitsetIndex, 'from_db',
+                               return_value=vote_index):
+            self.assertEqual(
+                sql_compatibility_counts(self.user),
+                bitset_compatibility_counts(self.user)
+            )
+
+    def test_similar_parliamentarians(self):
+        """
+        Ensure similar parliamentarians are ordered by agreement and overlap
+        and the similarity matrix is updated after a votes ingest.
+        """
+        parliamentary = self.parliamentarians[0]
+        url = '/api/parliamentarians/{}/similar/'.format(parliamentary.id)
+
+        # Parliamentary 0 votes Y, N, Y: parliamentary 1 agrees on 1 of 2
+        # propositions, 2 on 1 of 3 and 3 on 0 of 2
+        response = self.client.get(url)
+        self.assertEqual(
+            [
+                (
+                    result['parliamentary']['id'],
+                    result['agreement'],
+                    result['overlap']
+                )
+                for result in response.data
+            ],
+            [
+                (self.parliamentarians[1].id, 50.0, 2),
+                (self.parliamentarians[2].id, 33.33, 3),
+                (self.parliamentarians[3].id, 0.0, 2),
+            ]
+        )
+
+        response = self.client.get(url, {'limit': 1})
+        self.assertEqual(len(response.data), 1)
+
+        for limit in [0, -1]:
+            response = self.client.get(url, {'limit': limit})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data, [])
+
+        proposition = Proposition.objects.create(
+            native_id='3',
+            proposition_type='Projeto de Lei',
+            proposition_type_initials='PL',
+            number=3,
+            year=2018,
+            abstract='Proposition 3',
+            last_update=timezone.now()
+        )
+        for parliamentary, option in [(parliamentary, 'N'),
+                                      (self.parliamentarians[2], 'N')]:
+            ParliamentaryVote.objects.create(
+                proposition=proposition,
+                parliamentary=parliamentary,
+                option=option
+            )
+        schedule_compatibility_refresh([proposition.pk])
+
+        # Parliamentary 2 now agrees on 2 of 4, ahead of 1 by the overlap
+        response = self.client.get(url, {'limit': 1})
+        self.assertEqual(
+            (
+                response.data[0]['parliamentary']['id'],
+                response.data[0]['agreement'],
+                response.data[0]['overlap']
+            ),
+            (self.parliamentarians[2].id, 50.0, 4)
+        )
+
+    def test_vote_schedules_debounced_update(self):
+        """
+        Ensure votes of an user without compatibilities schedule a single
+        recompute.
+        """
+        with mock.patch('api.tasks.update_compatibility.apply_async') as task:
+            for proposition in self.propositions:
+                data = {'proposition': proposition.pk, 'option': 'Y'}
+                self.client.post(self.url, data, format='json')
+
+        self.assertEqual(task.call_count, 1)
+        self.assertEqual(task.call_args[0][0], (self.user.pk,))
+
+        self.extended_user.refresh_from_db()
+        self.assertTrue(self.extended_user.should_update)
+        self.assertTrue(self.extended_user.update_scheduled)
+
+    def test_lost_update_rescheduled(self):
+        """
+        Ensure a scheduled recompute that never ran is scheduled again once
+        it expires.
+        """
+        self.compute()
+        ExtendedUser.objects.filter(user=self.user).update(
+            update_scheduled=timezone.now()
+        )
+
+        with mock.patch('api.tasks.update_compatibility.apply_async') as task:
+            schedule_compatibility_update(self.user)
+            self.assertEqual(task.call_count, 0)
+
+            ExtendedUser.objects.filter(user=self.user).update(
+                update_scheduled=timezone.now() - datetime.timedelta(
+                    seconds=settings.COMPATIBILITY_UPDATE_SCHEDULE_TIMEOUT + 1
+                )
+            )
+            schedule_compatibility_update(self.user)
+            self.assertEqual(task.call_count, 1)
+
+    def test_failed_update_stays_stale(self):
+        """
+        Ensure an user whose recompute failed is still flagged to be
+        updated.
+        """
+        self.compute()
+        ExtendedUser.objects.filter(user=self.user).update(
+            should_update=True,
+            update_scheduled=timezone.now()
+        )
+
+        with mock.patch(
+            'api.compatibility.store_compatibilities',
+            side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                update_compatibility_task(self.user.pk)
+
+        self.extended_user.refresh_from_db()
+        self.assertTrue(self.extended_user.should_update)
+        self.assertTrue(self.extended_user.update_scheduled)
+
+        update_compatibility_task(self.user.pk)
+
+        self.extended_user.refresh_from_db()
+        self.assertFalse(self.extended_user.should_update)
+        self.assertIsNone(self.extended_user.update_scheduled)
+
+    def test_stale_compatibilities(self):
+        """
+        Ensure stale compatibilities are served while the recompute is
+        scheduled, and computed right away only when there are none.
+        """
+        UserVote.objects.create(
+            user=self.user,
+            proposition=self.propositions[0],
+            option='Y'
+        )
+        url = '/api/parliamentarians/'
+
+        with mock.patch('api.tasks.update_compatibility.apply_async') as task:
+            response = self.client.get(url)
+            self.assertFalse(response.data['stale'])
+            self.assertEqual(task.call_count, 0)
+            self.assertEqual(self.user.compatibilities.count(), 4)
+
+            ExtendedUser.objects.filter(user=self.user).update(
+                should_update=True
+            )
+            response = self.client.get(url)
+            self.assertTrue(response.data['stale'])
+            self.assertEqual(task.call_count, 1)
+
+        response = self.client.get(url)
+        self.assertTrue(response.data['stale'])
+
+    def test_compatibility_map(self):
+        """
+        Ensure the compatibilities of a page of parliamentarians are read
+        with one lookup, and a new map is read once they are written again.
+        """
+        UserVote.objects.create(
+            user=self.user,
+            proposition=self.propositions[0],
+            option='Y'
+        )
+        self.compute()
+        url = '/api/parliamentarians/'
+
+        response = self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertFalse(any(
+            'api_compatibility' in query['sql']
+            for query in queries.captured_queries
+        ))
+        self.assertEqual(
+            [parliamentary['compatibility']
+             for parliamentary in response.data['results']],
+            [round(compatibility, 2)
+             for _, _, _, compatibility in self.compatibilities()]
+        )
+
+        self.client.post(
+            self.url,
+            {'proposition': self.propositions[1].pk, 'option': 'N'},
+            format='json'
+        )
+        response = self.client.get(url)
+        self.assertEqual(
+            [parliamentary['compatibility']
+             for parliamentary in response.data['results']],
+            [round(compatibility, 2)
+             for _, _, _, compatibility in self.compatibilities()]
+        )
+
+        UserFollowing.objects.create(
+            user=self.user,
+            parliamentary=self.parliamentarians[0]
+        )
+        response = self.client.get('/api/user_following/')
+        self.assertEqual(
+            response.data['results'][0]['parliamentary']['compatibility'],
+            round(self.compatibilities()[0][3], 2)
+        )
+
+    def test_most_compatible(self):
+        """
+        Ensure most_compatible pages and filters the compatibilities in
+        compatibility order.
+        """
+        for proposition, option in zip(self.propositions, ['Y', 'N', 'N']):
+            UserVote.objects.create(
+                user=self.user,
+                proposition=proposition,
+                option=option
+            )
+        self.compute()
+        url = '/api/statistics/most_compatible/'
+
+        ordered = [
+            compatibility.parliamentary_id
+            for compatibility in self.user.compatibilities.order_by(
+                '-compatibility',
+                'id'
+            )
+        ]
+
+        response = self.client.get(url, {'limit': 2, 'offset': 1})
+        self.assertEqual(response.data['count'], 4)
+        self.assertFalse(response.data['stale'])
+        self.assertEqual(
+            [result['parliamentary']['id']
+             for result in response.data['results']],
+            ordered[1:3]
+        )
+        self.assertNotIn('user', response.data['results'][0])
+
+        response = self.client.get(url, {'political_party': 'P1'})
+        self.assertEqual(
+            [result['parliamentary']['id']
+             for result in response.data['results']],
+            [
+                parliamentary_id for parliamentary_id in ordered
+                if parliamentary_id in [self.parliamentarians[1].id,
+                                        self.parliamentarians[3].id]
+            ]
+        )
+
+        response = self.client.get(url, {'federal_unit': 'SP'})
+        self.assertEqual(response.data['count'], 0)
+
+    def test_most_compatible_groups(self):
+        """
+        Ensure the party and federal unit compatibilities are the
+        parliamentarians compatibilities weighted by their valid votes.
+        """
+        for proposition, option in zip(self.propositions, ['Y', 'N', 'N']):
+            UserVote.objects.create(
+                user=self.user,
+                proposition=proposition,
+                option=option
+            )
+        self.compute()
+
+        expected = dict()
+        for compatibility in self.user.compatibilities.select_related(
+            'parliamentary'
+        ):
+            for name in [compatibility.parliamentary.political_party,
+                         compatibility.parliamentary.federal_unit]:
+                totals = expected.setdefault(name, [0, 0])
+                totals[0] += \
+                    compatibility.compatibility * compatibility.valid_votes
+                totals[1] += compatibility.valid_votes
+
+        for url, names in [
+            ('/api/statistics/most_compatible_parties/', ['P0', 'P1']),
+            ('/api/statistics/most_compatible_federal_units/', ['DF']),
+        ]:
+            response = self.client.get(url)
+            self.assertFalse(response.data['stale'])
+            results = response.data['results']
+            self.assertEqual(sorted(result['name'] for result in results),
+                             names)
+            for result in results:
+                weighted, valid_votes = expected[result['name']]
+                self.assertEqual(result['valid_votes'], valid_votes)
+                self.assertEqual(
+                    result['compatibility'],
+                    round(weighted / valid_votes, 2)
+                )
+            self.assertEqual(
+                [result['compatibility'] for result in results],
+                sorted([result['compatibility'] for result in results],
+                       reverse=True)
+            )
+
+    def test_stale_group_compatibilities(self):
+        """
+        Ensure recomputing the compatibilities deletes the aggregates of the
+        groups the parliamentarians no longer belong to.
+        """
+        UserVote.objects.create(
+            user=self.user,
+            proposition=self.propositions[0],
+            option='Y'
+        )
+        self.compute()
+        self.assertEqual(
+            {name for group, name, *totals in self.group_compatibilities()},
+            {'P0', 'P1', 'DF'}
+        )
+
+        for recompute, political_party, federal_unit in [
+            (update_user_compatibility, 'P2', 'SP'),
+            (lambda user: refresh_users_compatibilities([user.pk]),
+             'P3', 'RJ'),
+        ]:
+            Parliamentary.objects.update(
+                political_party=political_party,
+                federal_unit=federal_unit
+            )
+            invalidate_vote_matrix()
+            recompute(self.user)
+            self.assertEqual(
+                [(group, name)
+                 for group, name, *totals in self.group_compatibilities()],
+                [(GroupCompatibility.FEDERAL_UNIT, federal_unit),
+                 (GroupCompatibility.POLITICAL_PARTY, political_party)]
+            )
+
+    @override_settings(COMPATIBILITY_REFRESH_PROCESSES=1,
+                       COMPATIBILITY_REFRESH_CHUNK_SIZE=1)
+    def test_refresh_after_ingest(self):
+        """
+        Ensure a parliamentary votes ingest refreshes the compatibilities of
+        the users who voted on the affected propositions.
+        """
+        other_user = User.objects.create(username='other')
+        ExtendedUser.objects.create(user=other_user, should_update=False)
+        for user in [self.user, other_user]:
+            UserVote.objects.create(
+                user=user,
+                proposition=self.propositions[0],
+                option='Y'
+            )
+            update_user_compatibility(user)
+        UserVote.objects.create(
+            user=self.user,
+            proposition=self.propositions[1],
+            option='N'
+        )
+        self.compute()
+
+        proposition = self.propositions[1]
+        ParliamentaryVote.objects.filter(proposition=proposition).delete()
+        for parliamentary in self.parliamentarians:
+            ParliamentaryVote.objects.create(
+                proposition=proposition,
+                parliamentary=parliamentary,
+                option='N'
+            )
+
+        other_compatibilities = list(
+            other_user.compatibilities.values_list('compatibility')
+        )
+        schedule_compatibility_refresh([proposition.pk])
+
+        refresh = CompatibilityRefresh.objects.get()
+        self.assertIsNotNone(refresh.finished)
+        self.assertEqual(refresh.total_users, 1)
+        self.assertEqual(refresh.processed_users, 1)
+
+        self.extended_user.refresh_from_db()
+        self.assertFalse(self.extended_user.should_update)
+        self.assertFalse(self.extended_user.update_scheduled)
+        self.assertCompatibilitiesUpToDate()
+        self.assertEqual(
+            other_compatibilities,
+            list(other_user.compatibilities.values_list('compatibility'))
+        )
+
+    @override_settings(COMPATIBILITY_REFRESH_PROCESSES=1)
+    def test_resume_refresh(self):
+        """
+        Ensure an interrupted refresh job resumes with the users who were
+        not refreshed yet.
+        """
+        UserVote.objects.create(
+            user=self.user,
+            proposition=self.propositions[0],
+            option='Y'
+        )
+        self.extended_user.update_scheduled = timezone.now()
+        self.extended_user.save()
+        refresh = CompatibilityRefresh.objects.create(
+            started=timezone.now(),
+            total_users=2,
+            processed_users=1
+        )
+
+        call_command('refresh_compatibilities', stdout=StringIO())
+
+        refresh.refresh_from_db()
+        self.assertIsNotNone(refresh.finished)
+        self.assertEqual(refresh.total_users, 2)
+        self.assertEqual(refresh.processed_users, 2)
+        self.assertCompatibilitiesUpToDate()
+
+
+class PropositionTallyTests(APITestCase):
+
+    def setUp(self):
+        """
+        This method will run before any test.
+        """
+        self.user = User.objects.create(username='teste')
+        ExtendedUser.objects.create(user=self.user, should_update=False)
+        self.other_user = User.objects.create(username='other')
+
+        self.parliamentarians = [
+            Parliamentary.objects.create(
+                parliamentary_id=str(i),
+                name='Parliamentary {}'.format(i)
+            )
+            for i in range(3)
+        ]
+        self.propositions = [
+            Proposition.objects.create(
+                native_id=str(i),
+                proposition_type='Projeto de Lei',
+                proposition_type_initials='PL',
+                number=i,
+                year=2018,
+                abstract='Proposition {}'.format(i),
+                last_update=timezone.now()
+            )
+            for i in range(2)
+        ]
+        UserVote.objects.create(
+            user=self.other_user,
+            proposition=self.propositions[0],
+            option='N'
+        )
+
+        self.url = '/api/user_votes/'
+        self.client.force_authenticate(self.user)
+
+    def approvals(self, proposition):
+        response = self.client.get(
+            '/api/propositions/{}/'.format(proposition.pk)
+        )
+        return (
+            response.data['parliamentarians_approval'],
+            response.data['population_approval']
+        )
+
+    def test_user_votes_tally(self):
+        """
+        Ensure user votes writes keep the tallies up to date.
+        """
+        proposition = self.propositions[0]
+        self.assertEqual(self.approvals(proposition), (0, 0))
+
+        response = self.client.post(
+            self.url,
+            {'proposition': proposition.pk, 'option': 'Y'},
+            format='json'
+        )
+        self.assertEqual(rebuild_tallies(save=False), {})
+        self.assertEqual(self.approvals(proposition), (0, 50.0))
+
+        url = '{}{}/'.format(self.url, response.data['id'])
+        self.client.put(
+            url,
+            {'proposition': self.propositions[1].pk, 'option': 'Y'},
+            format='json'
+        )
+        self.assertEqual(rebuild_tallies(save=False), {})
+        self.assertEqual(self.approvals(proposition), (0, 0))
+        self.assertEqual(self.approvals(self.propositions[1]), (0, 100.0))
+
+        self.client.delete(url)
+        self.assertEqual(rebuild_tallies(save=False), {})
+        self.assertEqual(
+            sum_tallies([self.propositions[1].pk]),
+            {self.propositions[1].pk: {}}
+        )
+
+    def test_parliamentary_votes_tally(self):
+        """
+        Ensure ingested parliamentary votes are added to the tallies.
+        """
+        for parliamentarians, options in [(self.parliamentarians[:2],
+                                           ['Y', 'N']),
+                                          (self.parliamentarians[2:], ['Y'])]:
+            parliamentary_votes = [
+                ParliamentaryVote(
+                    parliamentary=parliamentary,
+                    proposition=self.propositions[0],
+                    option=option
+                )
+                for parliamentary, option in zip(parliamentarians, options)
+            ]
+            ParliamentaryVote.objects.bulk_create(parliamentary_votes)
+            add_parliamentary_votes_tallies(parliamentary_votes)
+
+        self.assertEqual(rebuild_tallies(save=False), {})
+        self.assertEqual(self.approvals(self.propositions[0]), (66.67, 0))
+
+    @override_settings(TALLY_SHARDS=4)
+    def test_sharded_tally(self):
+        """
+        Ensure votes spread over the tally shards, which are summed by the
+        readers and folded together by the compaction.
+        """
+        proposition = self.propositions[0]
+        self.approvals(proposition)
+
+        for i in range(20):
+            user = User.objects.create(username='user {}'.format(i))
+            self.client.force_authenticate(user)
+            self.client.post(
+                self.url,
+                {'proposition': proposition.pk, 'option': 'YN'[i % 2]},
+                format='json'
+            )
+
+        self.assertGreater(
+            PropositionTally.objects.filter(proposition=proposition).count(),
+            1
+        )
+        self.assertEqual(rebuild_tallies(save=False), {})
+        self.assertEqual(self.approvals(proposition), (0, 47.62))
+
+        self.assertEqual(compact_tallies(), 1)
+        self.assertEqual(
+            PropositionTally.objects.filter(proposition=proposition).count(),
+            1
+        )
+        self.assertEqual(rebuild_tallies(save=False), {})
+        self.assertEqual(self.approvals(proposition), (0, 47.62))
+
+    def test_propositions_approvals_query(self):
+        """
+        Ensure the propositions list reads the approvals with the page.
+        """
+        for proposition in self.propositions:
+            self.approvals(proposition)
+
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/propositions/')
+        self.assertEqual(
+            [result['population_approval']
+             for result in response.data['results']],
+            [0, 0]
+        )
+
+    def test_rebuild_tallies(self):
+        """
+        Ensure rebuild_tallies reports and fixes drifted tallies.
+        """
+        self.approvals(self.propositions[0])
+        PropositionTally.objects.update(users_no=5)
+
+        out = StringIO()
+        call_command('rebuild_tallies', '--check', stdout=out)
+        self.assertIn(
+            'Proposition {}: users_no 5 != 1'.format(self.propositions[0].pk),
+            out.getvalue()
+        )
+        self.assertIn('1 tallies drifted', out.getvalue())
+
+        call_command('rebuild_tallies', stdout=StringIO())
+        self.assertEqual(rebuild_tallies(save=False), {})
+
+
+class DemographicsTests(APITestCase):
+
+    def setUp(self):
+        """
+        This method will run before any test.
+        """
+        cache.clear()
+        caches['responses'].clear()
+        self.addCleanup(cache.clear)
+        self.addCleanup(caches['responses'].clear)
+
+        self.proposition = Proposition.objects.create(
+            native_id='1',
+            proposition_type='Projeto de Lei',
+            proposition_type_initials='PL',
+            number=1,
+            year=2018,
+            abstract='Proposition',
+            last_update=timezone.now()
+        )
+        for i, option in enumerate(['Y', 'N', 'O']):
+            ParliamentaryVote.objects.create(
+                parliamentary=Parliamentary.objects.create(
+                    parliamentary_id=str(i),
+                    name='Parliamentary {}'.format(i)
+                ),
+                proposition=self.proposition,
+                option=option
+            )
+
+        voters = [
+            ('north_man', 'N', 'M', 'Y'),
+            ('north_woman', 'N', 'F', 'N'),
+            ('uninformed', None, None, 'A'),
+        ]
+        for username, region, gender, option in voters:
+            user = User.objects.create(username=username)
+            if region is not None:
+                SocialInformation.objects.create(
+                    owner=user,
+                    region=region,
+                    gender=gender,
+                    education='ES',
+                    birth_date=datetime.date(
+                        datetime.date.today().year - 30, 1, 1
+                    )
+                )
+            UserVote.objects.create(
+                user=user,
+                proposition=self.proposition,
+                option=option
+            )
+
+        self.user = User.objects.create(username='teste')
+        ExtendedUser.objects.create(user=self.user, should_update=False)
+        self.social_information = SocialInformation.objects.create(
+            owner=self.user,
+            region='S'
+        )
+        self.client.force_authenticate(self.user)
+
+        self.url = '/api/propositions/{}/social_information_data/'.format(
+            self.proposition.pk
+        )
+
+    def test_social_information_data(self):
+        """
+        Ensure the demographics of a proposition are broken down by every
+        social information dimension.
+        """
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data['proposition'],
+            str(self.proposition.pk)
+        )
+        self.assertEqual(
+            response.data['parliamentarians_total_votes'],
+            {'Y': 33.33, 'N': 33.33, 'A': 0.0, 'others': 33.33, 'count': 3}
+        )
+        self.assertEqual(
+            response.data['population_total_votes'],
+            {'Y': 33.33, 'N': 33.33, 'A': 33.33, 'count': 3}
+        )
+        self.assertEqual(
+            response.data['region']['N'],
+            {'Y': 50.0, 'N': 50.0, 'A': 0.0, 'count': 2}
+        )
+        self.assertEqual(
+            response.data['region'][None],
+            {'Y': 0.0, 'N': 0.0, 'A': 100.0, 'count': 1}
+        )
+        self.assertEqual(
+            response.data['region']['S'],
+            {'Y': 0.0, 'N': 0.0, 'A': 0.0, 'count': 0}
+        )
+        self.assertEqual(
+            response.data['gender']['F'],
+            {'Y': 0.0, 'N': 100.0, 'A': 0.0, 'count': 1}
+        )
+        self.assertEqual(list(response.data['income']),
+                         ['E', 'D', 'C', 'B', 'A', None])
+
+    def test_social_information_data_without_votes(self):
+        """
+        Ensure propositions without votes have no demographics.
+        """
+        UserVote.objects.all().delete()
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_demographics_cache(self):
+        """
+        Ensure the demographics take two queries and are cached until the
+        proposition votes or its voters social information change.
+        """
+        get_demographics(self.proposition.pk)
+        caches['responses'].clear()
+
+        with self.assertNumQueries(2):
+            get_demographics(self.proposition.pk)
+        with self.assertNumQueries(0):
+            get_demographics(self.proposition.pk)
+
+        self.client.post(
+            '/api/user_votes/',
+            {'proposition': self.proposition.pk, 'option': 'Y'},
+            format='json'
+        )
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['population_total_votes']['count'], 4)
+        self.assertEqual(
+            response.data['region']['S'],
+            {'Y': 100.0, 'N': 0.0, 'A': 0.0, 'count': 1}
+        )
+
+        self.client.patch(
+            '/api/social_informations/{}/'.format(self.social_information.pk),
+            {'region': 'NE'},
+            format='json'
+        )
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['region']['S']['count'], 0)
+        self.assertEqual(response.data['region']['NE']['count'], 1)
+
+    def test_demographic_cube(self):
+        """
+        Ensure the cube answers cross filtered slices and is kept up to date
+        by votes and social information changes.
+        """
+        url = '/api/propositions/{}/demographics/'.format(
+            self.proposition.pk
+        )
+
+        response = self.client.get(url, {
+            'gender': 'F',
+            'region': 'NE,N',
+            'education': 'ES'
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data['filters'],
+            {'region': ['NE', 'N'], 'education': ['ES'], 'gender': ['F']}
+        )
+        self.assertEqual(
+            (response.data['N'], response.data['count']),
+            (100.0, 1)
+        )
+
+        self.client.post(
+            '/api/user_votes/',
+            {'proposition': self.proposition.pk, 'option': 'Y'},
+            format='json'
+        )
+        self.client.patch(
+            '/api/social_informations/{}/'.format(self.social_information.pk),
+            {'gender': 'F', 'region': 'NE', 'education': 'ES'},
+            format='json'
+        )
+
+        response = self.client.get(url, {
+            'gender': 'F',
+            'region': 'NE,N',
+            'education': 'ES',
+            'group_by': 'age'
+        })
+        self.assertEqual(
+            (response.data['Y'], response.data['N'], response.data['count']),
+            (50.0, 50.0, 2)
+        )
+        self.assertEqual(response.data['age']['25-34']['count'], 1)
+        self.assertEqual(response.data['age'][None]['count'], 1)
+
+        response = self.client.get(url, {'region': 'null'})
+        self.assertEqual(response.data['count'], 1)
+
+        response = self.client.get(url, {'region': 'XX', 'group_by': 'job'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.data), {'region', 'group_by'})
+
+        cells = set(DemographicCell.objects.filter(votes__gt=0).values_list(
+            'option', 'region', 'gender', 'age', 'votes'
+        ))
+        rebuild_cube()
+        self.assertEqual(
+            set(DemographicCell.objects.values_list(
+                'option', 'region', 'gender', 'age', 'votes'
+            )),
+            cells
+        )
+
+
+class KeysetPaginationTests(APITestCase):
+
+    def setUp(self):
+        """
+        This method will run before any test.
+        """
+        self.user = User.objects.create(username='teste')
+        ExtendedUser.objects.create(user=self.user, should_update=False)
+        self.client.force_authenticate(self.user)
+
+        parliamentary = Parliamentary.objects.create(
+            parliamentary_id='1',
+            name='Parliamentary'
+        )
+        # The listings parse last_update without microseconds
+        now = timezone.now().replace(microsecond=0)
+        self.propositions = list()
+        for i in range(25):
+            proposition = Proposition.objects.create(
+                native_id=str(i),
+                proposition_type='Projeto de Lei',
+                proposition_type_initials='PL',
+                number=i,
+                year=2018,
+                abstract='Proposition {}'.format(i),
+                # Ties on last_update are broken by id
+                last_update=now - datetime.timedelta(days=i // 3)
+            )
+            ParliamentaryVote.objects.create(
+                parliamentary=parliamentary,
+                proposition=proposition,
+                option='Y'
+            )
+            self.propositions.append(proposition)
+
+        self.ordered_ids = [
+            proposition.pk for proposition in sorted(
+                self.propositions,
+                key=lambda proposition: (proposition.last_update,
+                                         proposition.pk),
+                reverse=True
+            )
+        ]
+
+    def traverse(self, url):
+        results = list()
+        while url is not None:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertFalse(any(
+                'OFFSET' in query['sql'] for query in queries.captured_queries
+            ))
+
+            results.extend(response.data['results'])
+            url = response.data['next']
+
+        return results
+
+    def test_propositions_cursor(self):
+        """
+        Ensure the cursor pages go through every proposition in order.
+        """
+        results = self.traverse(
+            '/api/propositions/?pagination=cursor&limit=10'
+        )
+        self.assertEqual(
+            [result['id'] for result in results],
+            self.ordered_ids
+        )
+
+        results = self.traverse(
+            '/api/propositions/voted_by_parliamentary/?pagination=cursor'
+        )
+        self.assertEqual(
+            [result['id'] for result in results],
+            self.ordered_ids
+        )
+
+        response = self.client.get('/api/propositions/?limit=10&offset=20')
+        self.assertEqual(
+            [result['id'] for result in response.data['results']],
+            self.ordered_ids[20:]
+        )
+
+    def test_invalid_cursor(self):
+        """
+        Ensure invalid cursors are not found.
+        """
+        for cursor in ['invalid', 'WyJ4IiwgInkiXQ==']:
+            response = self.client.get(
+                '/api/propositions/', {'cursor': cursor}
+            )
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_user_votes_cursor(self):
+        """
+        Ensure the user votes and non voted propositions are paginated by
+        cursor.
+        """
+        # Ties on the proposition last_update are broken by the vote id
+        for proposition_id in reversed(self.ordered_ids[:12]):
+            UserVote.objects.create(
+                user=self.user,
+                proposition_id=proposition_id,
+                option='N'
+            )
+
+        results = self.traverse('/api/user_votes/?pagination=cursor&limit=5')
+        self.assertEqual(
+            [result['proposition']['id'] for result in results],
+            self.ordered_ids[:12]
+        )
+
+        response = self.client.get('/api/propositions/non_voted_by_user/')
+        self.assertEqual(response.data['id'], self.ordered_ids[12])
+
+        results = self.traverse(
+            '/api/propositions/non_voted_by_user/?pagination=cursor'
+        )
+        self.assertEqual(
+            [result['id'] for result in results],
+            self.ordered_ids[12:]
+        )
+
+
+class SearchTests(APITestCase):
+
+    def setUp(self):
+        """
+        This method will run before any test.
+        """
+        self.user = User.objects.create(username='teste')
+        ExtendedUser.objects.create(user=self.user, should_update=False)
+        self.client.force_authenticate(self.user)
+
+        abstracts = [
+            'Dispõe sobre a saúde pública e a saúde indígena na saúde',
+            'Institui políticas públicas de educação, saúde e transporte',
+            'Altera as regras da previdência',
+        ]
+        self.propositions = [
+            Proposition.objects.create(
+                native_id=str(i),
+                proposition_type='Projeto de Lei',
+                proposition_type_initials='PL',
+                number=123 + i,
+                year=2018,
+                abstract=abstract,
+                last_update=timezone.now().replace(microsecond=0)
+            )
+            for i, abstract in enumerate(abstracts)
+        ]
+        index_propositions(self.propositions)
+
+    def search(self, url, query):
+        response = self.client.get(url, {'query': query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['results']
+
+    def test_stem(self):
+        """
+        Ensure accents, case, plural and gender are folded.
+        """
+        self.assertEqual(search_terms('Saúde PÚBLICA'), ['saud', 'public'])
+        self.assertEqual(search_terms('saudes publicos'), ['saud', 'public'])
+        self.assertEqual(search_terms('ações'), search_terms('ação'))
+        self.assertEqual(search_terms('leis da mulher'), ['lei', 'mulher'])
+
+    def test_search_propositions(self):
+        """
+        Ensure propositions are searched by every word and relevance.
+        """
+        results = self.search('/api/propositions/', 'saude')
+        self.assertEqual(
+            [result['id'] for result in results],
+            [self.propositions[0].pk, self.propositions[1].pk]
+        )
+
+        results = self.search('/api/propositions/', 'Politica publicas')
+        self.assertEqual(
+            [result['id'] for result in results],
+            [self.propositions[1].pk]
+        )
+
+        results = self.search('/api/propositions/', 'PL 125')
+        self.assertEqual(
+            [result['id'] for result in results],
+            [self.propositions[2].pk]
+        )
+
+        # Stopwords only: every proposition containing the query
+        self.assertEqual(
+            [
+                result['id']
+                for result in self.search('/api/propositions/', 'de')
+            ],
+            [proposition.pk for proposition in reversed(self.propositions)]
+        )
+        self.assertEqual(self.search('/api/propositions/', 'sem'), [])
+
+    def test_search_cursor(self):
+        """
+        Ensure cursor pages of a search keep its relevance order.
+        """
+        url = '/api/propositions/?pagination=cursor&limit=1&query=saude'
+        results = list()
+        while url is not None:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            results.extend(response.data['results'])
+            url = response.data['next']
+
+        self.assertEqual(
+            [result['id'] for result in results],
+            [self.propositions[0].pk, self.propositions[1].pk]
+        )
+
+    def test_search_user_votes(self):
+        """
+        Ensure user votes are searched by their propositions.
+        """
+        for proposition in self.propositions:
+            UserVote.objects.create(
+                user=self.user,
+                proposition=proposition,
+                option='Y'
+            )
+
+        results = self.search('/api/user_votes/', 'previdencia')
+        self.assertEqual(
+            [result['proposition']['id'] for result in results],
+            [self.propositions[2].pk]
+        )
+
+    def test_rebuild_search_index(self):
+        """
+        Ensure the rebuild_search_index command indexes every proposition.
+        """
+        Proposition.objects.filter(pk=self.propositions[2].pk).update(
+            abstract='Reforma tributária'
+        )
+
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('3 propositions indexed', out.getvalue())
+
+        results = self.search('/api/propositions/', 'tributaria')
+        self.assertEqual(
+            [result['id'] for result in results],
+            [self.propositions[2].pk]
+        )
+
+
+class AutocompleteTests(APITestCase):
+
+    def setUp(self):
+        """
+        This method will run before any test.
+        """
+        invalidate_autocomplete_index()
+        self.addCleanup(invalidate_autocomplete_index)
+
+        self.parliamentarians = [
+            Parliamentary.objects.create(
+                parliamentary_id=str(i),
+                name=name,
+                political_party=political_party,
+                federal_unit=federal_unit
+            )
+            for i, (name, political_party, federal_unit) in enumerate([
+                ('José da Silva', 'PT', 'SP'),
+                ('Maria Silveira', 'PSDB', 'RJ'),
+                ('João Souza', 'PSOL', 'DF'),
+            ])
+        ]
+
+    def suggest(self, query):
+        response = self.client.get(
+            '/api/parliamentarians/autocomplete/',
+            {'query': query}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [parliamentary['name'] for parliamentary in response.data]
+
+    def test_autocomplete(self):
+        """
+        Ensure suggestions match prefixes regardless of accents and case,
+        complete words first.
+        """
+        self.assertEqual(self.suggest('JOSE'), ['José da Silva'])
+        self.assertEqual(
+            self.suggest('silv'),
+            ['José da Silva', 'Maria Silveira']
+        )
+        self.assertEqual(
+            self.suggest('silveira'),
+            ['Maria Silveira']
+        )
+        self.assertEqual(self.suggest('silva sp'), ['José da Silva'])
+        self.assertEqual(self.suggest('ps'), ['João Souza', 'Maria Silveira'])
+        self.assertEqual(self.suggest(''), [])
+
+    def test_autocomplete_typo(self):
+        """
+        Ensure suggestions tolerate one typo in the whole query.
+        """
+        self.assertEqual(self.suggest('joao suoza'), [])
+        self.assertEqual(self.suggest('joao souze'), ['João Souza'])
+        self.assertEqual(self.suggest('jaoa'), ['João Souza'])
+        self.assertEqual(self.suggest('slva'), ['José da Silva'])
+        self.assertEqual(
+            self.suggest('silvi'),
+            ['José da Silva', 'Maria Silveira']
+        )
+
+    def test_autocomplete_refresh(self):
+        """
+        Ensure created parliamentarians are suggested once the index is
+        invalidated.
+        """
+        self.assertEqual(self.suggest('souza'), ['João Souza'])
+
+        Parliamentary.objects.create(
+            parliamentary_id='3',
+            name='Ana Souza',
+            political_party='PT',
+            federal_unit='BA'
+        )
+        self.assertEqual(self.suggest('souza'), ['João Souza'])
+
+        invalidate_autocomplete_index()
+        self.assertEqual(self.suggest('souza'), ['Ana Souza', 'João Souza'])
+
+    def test_autocomplete_fresh_data(self):
+        """
+        Ensure suggestions serialize the current data of the
+        parliamentarians, not the one read when the index was built.
+        """
+        self.assertEqual(self.suggest('silv'),
+                         ['José da Silva', 'Maria Silveira'])
+
+        Parliamentary.objects.filter(pk=self.parliamentarians[1].pk).update(
+            follower_count=3
+        )
+        self.parliamentarians[0].delete()
+
+        response = self.client.get(
+            '/api/parliamentarians/autocomplete/',
+            {'query': 'silv'}
+        )
+        self.assertEqual(
+            [(parliamentary['name'], parliamentary['follower_count'])
+             for parliamentary in response.data],
+            [('Maria Silveira', 3)]
+        )
+
+
+class ResponseCacheTests(APITestCase):
+
+    def setUp(self):
+        """
+        This method will run before any test.
+        """
+        caches['responses'].clear()
+        self.addCleanup(caches['responses'].clear)
+
+        self.parliamentary = Parliamentary.objects.create(
+            parliamentary_id='1',
+            name='Parliamentary'
+        )
+        self.proposition = Proposition.objects.create(
+            native_id='1',
+            proposition_type='Projeto de Lei',
+            proposition_type_initials='PL',
+            number=1,
+            year=2018,
+            abstract='Proposition',
+            last_update=timezone.now().replace(microsecond=0)
+        )
+        ParliamentaryVote.objects.create(
+            parliamentary=self.parliamentary,
+            proposition=self.proposition,
+            option='Y'
+        )
+        self.user = User.objects.create(username='teste')
+        ExtendedUser.objects.create(user=self.user, should_update=False)
+
+    def test_cached_until_ingest(self):
+        """
+        Ensure anonymous responses are cached until the loader ingests data.
+        """
+        response = self.client.get('/api/parliamentarians/')
+        self.assertEqual(response.data['count'], 1)
+
+        Parliamentary.objects.create(parliamentary_id='2', name='Other')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/parliamentarians/')
+        self.assertEqual(response.data['count'], 1)
+
+        response = self.client.get('/api/parliamentarians/?limit=1')
+        self.assertEqual(response.data['count'], 2)
+
+        bump_generation(INGEST)
+        response = self.client.get('/api/parliamentarians/')
+        self.assertEqual(response.data['count'], 2)
+
+    def test_cached_until_tally(self):
+        """
+        Ensure anonymous propositions responses are cached until the
+        tallies change, and authenticated ones are not cached.
+        """
+        url = '/api/propositions/{}/'.format(self.proposition.pk)
+
+        response = self.client.get(url)
+        self.assertEqual(response.data['population_approval'], 0)
+
+        self.client.force_authenticate(self.user)
+        self.client.post(
+            '/api/user_votes/',
+            {'proposition': self.proposition.pk, 'option': 'Y'},
+            format='json'
+        )
+        response = self.client.get(url)
+        self.assertEqual(response.data['population_approval'], 100.0)
+
+        self.client.force_authenticate(None)
+        response = self.client.get(url)
+        self.assertEqual(response.data['population_approval'], 100.0)
+
+    def test_not_modified_until_ingest(self):
+        """
+        Ensure conditional requests are answered with 304 before any query
+        runs, until the loader ingests data, for each page on its own.
+        """
+        url = '/api/parliamentarians/?limit=1&offset=0'
+
+        response = self.client.get(url)
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+        response = self.client.get(
+            '/api/parliamentarians/?limit=1&offset=1',
+            HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        bump_generation(INGEST)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_propositions_not_modified(self):
+        """
+        Ensure propositions are not modified until their last update or
+        their tallies change, checking If-None-Match and If-Modified-Since.
+        """
+        url = '/api/propositions/'
+
+        response = self.client.get(url)
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.proposition.last_update += datetime.timedelta(days=1)
+        self.proposition.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        bump_generation(TALLY)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_days_ago_changes_daily(self):
+        """
+        Ensure responses showing how many days ago propositions were updated
+        are cached and not modified only within a day.
+        """
+        url = '/api/propositions/voted_by_parliamentary/'
+
+        response = self.client.get(url)
+        days_ago = response.data['results'][0]['days_ago']
+        etag = response['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        tomorrow = timezone.now() + datetime.timedelta(days=1)
+        with mock.patch('django.utils.timezone.now', return_value=tomorrow):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                response.data['results'][0]['days_ago'],
+                days_ago + 1
+            )
+
+            response = self.client.get(url)
+            self.assertEqual(
+                response.data['results'][0]['days_ago'],
+                days_ago + 1
+            )
+
+    def test_authenticated_not_conditional(self):
+        """
+        Ensure authenticated requests, whose responses depend on the user,
+        are not answered with 304.
+        """
+        url = '/api/parliamentarians/'
+
+        etag = self.client.get(url)['ETag']
+
+        ExtendedUser.objects.filter(user=self.user).update(should_update=True)
+        self.client.force_authenticate(self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.has_header('ETag'))
+
+
+class LeaderboardTests(APITestCase):
+
+    def setUp(self):
+        """
+        This method will run before any test.
+        """
+        cache.clear()
+        caches['responses'].clear()
+        self.addCleanup(cache.clear)
+        self.addCleanup(caches['responses'].clear)
+
+        self.parliamentarians = [
+            Parliamentary.objects.create(
+                parliamentary_id=str(i),
+                name='Parliamentary {}'.format(i)
+            )
+            for i in range(3)
+        ]
+        self.proposition = Proposition.objects.create(
+            native_id='1',
+            proposition_type='Projeto de Lei',
+            proposition_type_initials='PL',
+            number=1,
+            year=2018,
+            abstract='Proposition',
+            last_update=timezone.now().replace(microsecond=0)
+        )
+        self.user = User.objects.create(username='teste')
+
+    def test_most_active(self):
+        """
+        Ensure most_active pages the stored leaderboard with a count and a
+        range read.
+        """
+        for parliamentary, option in zip(self.parliamentarians,
+                                         ['A', 'Y', 'N']):
+            ParliamentaryVote.objects.create(
+                parliamentary=parliamentary,
+                proposition=self.proposition,
+                option=option
+            )
+        refresh_leaderboard(LeaderboardEntry.MOST_ACTIVE)
+
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                '/api/statistics/most_active/',
+                {'limit': 1, 'offset': 1}
+            )
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(response.data['results'], [{
+            'parliamentary': ParliamentarySerializer(
+                self.parliamentarians[2]
+            ).data,
+            'votes': 1
+        }])
+
+    def test_refresh_changes_etag(self):
+        """
+        Ensure a leaderboard is counted live until it is first stored, and
+        that storing changed entries changes its ETag.
+        """
+        url = '/api/statistics/most_active/'
+        ParliamentaryVote.objects.create(
+            parliamentary=self.parliamentarians[0],
+            proposition=self.proposition,
+            option='Y'
+        )
+
+        with mock.patch('api.tasks.refresh_leaderboard.apply_async'):
+            response = self.client.get(url)
+        self.assertEqual(response.data['count'], 1)
+        self.assertFalse(LeaderboardEntry.objects.exists())
+
+        refresh_leaderboard(LeaderboardEntry.MOST_ACTIVE)
+        etag = self.client.get(url)['ETag']
+
+        ParliamentaryVote.objects.create(
+            parliamentary=self.parliamentarians[1],
+            proposition=self.proposition,
+            option='N'
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        refresh_leaderboard(LeaderboardEntry.MOST_ACTIVE)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+
+    def test_following_refreshes_most_followed(self):
+        """
+        Ensure following and unfollowing parliamentarians refresh the
+        most_followed leaderboard.
+        """
+        url = '/api/statistics/most_followed/'
+        parliamentary = self.parliamentarians[1]
+
+        self.client.force_authenticate(self.user)
+        self.client.post(
+            '/api/user_following/',
+            {'parliamentary': parliamentary.pk},
+            format='json'
+        )
+        self.client.force_authenticate(None)
+
+        response = self.client.get(url)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(response.data['results'][0]['followers'], 1)
+        self.assertEqual(
+            response.data['results'][0]['parliamentary']['id'],
+            parliamentary.pk
+        )
+        self.assertEqual(
+            response.data['results'][0]['parliamentary']['follower_count'],
+            1
+        )
+
+        response = self.client.get(
+            '/api/parliamentarians/{}/'.format(parliamentary.pk)
+        )
+        self.assertEqual(response.data['follower_count'], 1)
+
+        self.client.force_authenticate(self.user)
+        self.client.delete(
+            '/api/user_following/{}/'.format(parliamentary.pk)
+        )
+        self.client.force_authenticate(None)
+
+        response = self.client.get(url)
+        self.assertEqual(
+            [entry['followers'] for entry in response.data['results']],
+            [0, 0, 0]
+        )
+
+    def test_reconcile_follower_counts(self):
+        """
+        Ensure the follower_count drifted from the followings is repaired,
+        along with the most_followed leaderboard.
+        """
+        parliamentary = self.parliamentarians[2]
+        UserFollowing.objects.create(
+            user=self.user,
+            parliamentary=parliamentary
+        )
+        Parliamentary.objects.filter(
+            pk=self.parliamentarians[0].pk
+        ).update(follower_count=3)
+
+        self.assertEqual(reconcile_follower_counts(), 2)
+        self.assertEqual(
+            list(Parliamentary.objects.order_by('id').values_list(
+                'follower_count',
+                flat=True
+            )),
+            [0, 0, 1]
+        )
+        self.assertEqual(reconcile_follower_counts(), 0)
+
+        response = self.client.get('/api/statistics/most_followed/')
+        self.assertEqual(
+            response.data['results'][0]['parliamentary']['id'],
+            parliamentary.pk
+        )
+
+
+class CachedAuthenticationTests(APITestCase):
+
+    def setUp(self):
+        """
+        This method will run before any test.
+        """
+        caches['auth'].clear()
+        self.addCleanup(caches['auth'].clear)
+
+        self.user = User.objects.create_user(
+            username='teste',
+            password='teste'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.url = '/api/users/actual_user/'
+
+    def basic(self, username, password):
+        return 'Basic ' + b64encode(
+            '{}:{}'.format(username, password).encode('utf-8')
+        ).decode('ascii')
+
+    def authenticated_queries(self, authorization):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                self.url,
+                HTTP_AUTHORIZATION=authorization
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        return [
+            query['sql'] for query in queries.captured_queries
+            if 'authtoken_token' in query['sql'] or
+            'FROM "auth_user"' in query['sql']
+        ]
+
+    def test_cached_token(self):
+        """
+        Ensure resolved tokens are not queried again, until deleted.
+        """
+        authorization = 'Token ' + self.token.key
+
+        self.assertTrue(self.authenticated_queries(authorization))
+        self.assertEqual(self.authenticated_queries(authorization), [])
+
+        request = APIRequestFactory().get(
+            self.url,
+            HTTP_AUTHORIZATION=authorization
+        )
+        with CaptureQueriesContext(connection) as queries:
+            user, token = CachedTokenAuthentication().authenticate(request)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual((user, token), (self.user, self.token))
+
+        self.token.delete()
+        response = self.client.get(
+            self.url,
+            HTTP_AUTHORIZATION=authorization
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cached_basic(self):
+        """
+        Ensure checked Basic credentials are not checked again, until the
+        password changes.
+        """
+        authorization = self.basic('teste', 'teste')
+
+        self.assertTrue(self.authenticated_queries(authorization))
+        with mock.patch.object(User, 'check_password') as check_password:
+            self.assertEqual(self.authenticated_queries(authorization), [])
+        self.assertFalse(check_password.called)
+
+        self.user.set_password('nova')
+        self.user.save()
+        response = self.client.get(
+            self.url,
+            HTTP_AUTHORIZATION=authorization
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.authenticated_queries(self.basic('teste', 'nova'))
+
+    def test_cached_user_changes(self):
+        """
+        Ensure changes to the user of cached credentials apply at once.
+        """
+        self.user.is_superuser = True
+        self.user.save()
+
+        for authorization in ['Token ' + self.token.key,
+                              self.basic('teste', 'teste')]:
+            response = self.client.get(
+                '/api/users/',
+                HTTP_AUTHORIZATION=authorization
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.user.is_superuser = False
+        self.user.first_name = 'Novo'
+        self.user.save()
+
+        for authorization in ['Token ' + self.token.key,
+                              self.basic('teste', 'teste')]:
+            response = self.client.get(
+                '/api/users/',
+                HTTP_AUTHORIZATION=authorization
+            )
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+            response = self.client.get(
+                self.url,
+                HTTP_AUTHORIZATION=authorization
+            )
+            self.assertEqual(response.data['first_name'], 'Novo')
+
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.get(
+            self.url,
+            HTTP_AUTHORIZATION='Token ' + self.token.key
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cached_permissions_changes(self):
+        """
+        Ensure the cached credentials of an user are resolved again after
+        his groups or permissions, or the permissions of his groups, change.
+        """
+        authorization = 'Token ' + self.token.key
+        group = Group.objects.create(name='group')
+        permission = Permission.objects.get(codename='add_user')
+
+        for change in [
+            lambda: self.user.groups.add(group),
+            lambda: group.permissions.add(permission),
+            lambda: group.user_set.clear(),
+            lambda: self.user.user_permissions.add(permission),
+        ]:
+            self.authenticated_queries(authorization)
+            self.assertEqual(self.authenticated_queries(authorization), [])
+
+            change()
+            self.assertTrue(self.authenticated_queries(authorization))
+
+
+class PermissionsTests(APITestCase):
+
+    def setUp(self):
+        """
+        This method will run before any test.
+        """
+        self.superuser = User.objects.create_superuser(
+            username='superuser',
+            email='super@user.com',
+            password='superuser'
+        )
+        self.user = User.objects.create(username='teste')
+        self.other = User.objects.create(username='outro')
+        self.social_information = SocialInformation.objects.create(
+            owner=self.user
+        )
+        self.other_social_information = SocialInformation.objects.create(
+            owner=self.other
+        )
+
+    def queries_count(self, user, method, url):
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url)
+
+        return response.status_code, len(queries)
+
+    def test_social_information_permissions_queries(self):
+        """
+        Ensure social information authorization adds no queries to the
+        object the view fetches.
+        """
+        url = '/api/social_informations/{}/'
+
+        status_code, superuser_queries = self.queries_count(
+            self.superuser,
+            'get',
+            url.format(self.social_information.pk)
+        )
+        self.assertEqual(
+            self.queries_count(
+                self.user,
+                'get',
+                url.format(self.social_information.pk)
+            ),
+            (status.HTTP_200_OK, superuser_queries)
+        )
+        self.assertEqual(
+            self.queries_count(
+                self.user,
+                'get',
+                url.format(self.other_social_information.pk)
+            ),
+            (status.HTTP_403_FORBIDDEN, superuser_queries)
+        )
+        self.assertEqual(
+            self.queries_count(
+                self.user,
+                'delete',
+                url.format(self.social_information.pk)
+            ),
+            (status.HTTP_403_FORBIDDEN, 0)
+        )
+        self.assertEqual(
+            self.queries_count(self.user, 'get', '/api/social_informations/'),
+            (status.HTTP_403_FORBIDDEN, 0)
+        )
+
+    def test_social_information_id_memo(self):
+        """
+        Ensure the social information of the request user is queried once
+        per request.
+        """
+        request = APIRequestFactory().post('/api/social_informations/')
+        request.user = self.user
+
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                social_information_id(request),
+                self.social_information.pk
+            )
+            self.assertEqual(
+                social_information_id(request),
+                self.social_information.pk
+            )
+
+    def test_user_permissions_queries(self):
+        """
+        Ensure users authorization adds no queries to the object the view
+        fetches.
+        """
+        url = '/api/users/{}/'
+
+        status_code, superuser_queries = self.queries_count(
+            self.superuser,
+            'get',
+            url.format(self.user.pk)
+        )
+        self.assertEqual(
+            self.queries_count(self.user, 'get', url.format(self.user.pk)),
+            (status.HTTP_200_OK, superuser_queries)
+        )
+
+        status_code, queries = self.queries_count(
+            self.user,
+            'get',
+            url.format(self.other.pk)
+        )
+        self.assertEqual(status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(queries, 1)
+
+        self.assertEqual(
+            self.queries_count(self.user, 'get', '/api/users/'),
+            (status.HTTP_403_FORBIDDEN, 0)
+        )
+
+    def test_anonymous_actual_user(self):
+        """
+        Ensure anonymous users may ask for the actual user, and get none.
+        """
+        response = self.client.get('/api/users/actual_user/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), [])
+
+        response = self.client.get('/api/users/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ValuesSerializerTests(APITestCase):
+
+    def setUp(self):
+        """
+        This method will run before any test.
+        """
+        self.user = User.objects.create(username='teste')
+        self.parliamentary = Parliamentary.objects.create(
+            parliamentary_id='1',
+            name='Parliamentary',
+            gender='F',
+            political_party='PT',
+            federal_unit='DF',
+            photo='http://photo.com/1.jpg'
+        )
+        Proposition.objects.create(
+            native_id='1',
+            proposition_type='Projeto de Lei',
+            proposition_type_initials='PL',
+            number=1,
+            year=2018,
+            abstract='Proposition',
+            last_update=timezone.now().replace(microsecond=0)
+        )
+        Compatibility.objects.create(
+            user=self.user,
+            parliamentary=self.parliamentary,
+            valid_votes=3,
+            matching_votes=2,
+            compatibility=66.66666666666667
+        )
+
+    def assertSameJSON(self, serializer_class, values_serializer, queryset):
+        self.assertEqual(
+            JSONRenderer().render(
+                values_serializer.serialize(
+                    queryset.values(*values_serializer.lookups())
+                )
+            ),
+            JSONRenderer().render(serializer_class(queryset, many=True).data)
+        )
+
+    def test_same_json(self):
+        """
+        Ensure the values() serializers render the same JSON as the
+        ModelSerializers, including datetimes and nested serializers.
+        """
+        self.assertSameJSON(
+            ParliamentarySerializer,
+            parliamentary_values_serializer,
+            Parliamentary.objects.all()
+        )
+        self.assertSameJSON(
+            PropositionSerializer,
+            proposition_values_serializer,
+            Proposition.objects.all()
+        )
+        self.assertSameJSON(
+            CompatibilitySerializer,
+            compatibility_values_serializer,
+            Compatibility.objects.all()
+        )
+
+    def test_list_endpoints(self):
+        """
+        Ensure the list endpoints serve the values() rows as the
+        ModelSerializers would.
+        """
+        response = self.client.get('/api/parliamentarians/')
+        self.assertEqual(
+            response.data['results'],
+            ParliamentarySerializer(
+                Parliamentary.objects.all(),
+                many=True
+            ).data
+        )
+
+        response = self.client.get('/api/propositions/')
+        proposition = PropositionSerializer(Proposition.objects.get()).data
+        proposition['parliamentarians_approval'] = 0
+        proposition['population_approval'] = 0
+        self.assertEqual(response.data['results'], [proposition])
@@ -1,44 +1,51 @@
-from api.models import Compatibility, Parliamentary, ParliamentaryVote
-
-from django.db.models import Count, F, Q
-
-
-def get_query(self):
-    query = self.request.GET.get('query')
-    try:
-        query_int = int(query)
-    except (ValueError, TypeError):
-        query_int = -1
-
-    return (query, query_int)
+import logging
+from datetime import timedelta
+
+from api.compatibility import (
+    COMPATIBILITY_A, COMPATIBILITY_B, bump_compatibility_version,
+    update_user_compatibility, update_user_group_compatibilities
+)
+from api.leaderboards import SCHEDULED_KEY as LEADERBOARD_SCHEDULED_KEY
+from api.models import (
+    CompatibilityRefresh, ExtendedUser, LeaderboardEntry, Parliamentary,
+    ParliamentaryVote, Proposition
+)
+from api.response_cache import FOLLOWING, bump_generation
+from api.search import search_propositions
+from api.tallies import calc_approvals
+from api.tasks import (
+    refresh_compatibilities as refresh_compatibilities_task,
+    refresh_leaderboard as refresh_leaderboard_task,
+    update_compatibility as update_compatibility_task
+)
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import ExpressionWrapper, F, FloatField, Max, Q
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from kombu.exceptions import OperationalError
+
+
+logger = logging.getLogger(__name__)
 
 
 def propositions_filter(self, queryset):
-    (query, query_int) = get_query(self)
+    query = self.request.GET.get('query')
 
     if query:
-        queryset = queryset.filter(
-            Q(abstract__contains=query) |
-            Q(number__contains=query) |
-            Q(proposition_type__contains=query) |
-            Q(proposition_type_initials__contains=query) |
-            Q(year=query_int)
-        )
+        queryset = search_propositions(queryset, query)
 
     return queryset
 
 
 def user_votes_filter(self, queryset):
-    (query, query_int) = get_query(self)
+    query = self.request.GET.get('query')
 
     if query:
-        queryset = queryset.filter(
-            Q(proposition__abstract__contains=query) |
-            Q(proposition__number__contains=query) |
-            Q(proposition__proposition_type__contains=query) |
-            Q(proposition__proposition_type_initials__contains=query) |
-            Q(proposition__year=query_int)
-        )
+        queryset = search_propositions(queryset, query, 'proposition')
 
     return queryset
 
@@ -69,199 +76,293 @@ def user_following_filter(self, queryset):
     return queryset
 
 
-def update_compatibility(self):
-
-    # Constants
-    A = 1
-    B = 2
+def compatibilities_filter(self, queryset):
+    political_party = self.request.GET.get('political_party')
+    federal_unit = self.request.GET.get('federal_unit')
 
-    all_parliamentarians_ids = Parliamentary.objects.all().values_list(
-        'id',
-        flat=True
-    )
+    if political_party:
+        queryset = queryset.filter(
+            parliamentary__political_party=political_party
+        )
 
-    valid_votes_queryset = self.request.user.votes.filter(
-        Q(proposition__parliamentary_votes__option='Y') |
-        Q(proposition__parliamentary_votes__option='N')
-    ).annotate(
-        parliamentary=F('proposition__parliamentary_votes__parliamentary')
-    ).values(
-        'parliamentary'
-    ).annotate(
-        valid_votes=Count('parliamentary')
-    ).order_by(
-        'parliamentary'
-    )
+    if federal_unit:
+        queryset = queryset.filter(parliamentary__federal_unit=federal_unit)
 
-    valid_votes = list()
-    valid_votes_parliamentarians_ids = list()
-    for valid_vote in valid_votes_queryset:
-        valid_votes.append(valid_vote)
-        valid_votes_parliamentarians_ids.append(valid_vote['parliamentary'])
-
-    for parliamentary_id in all_parliamentarians_ids:
-        if parliamentary_id not in valid_votes_parliamentarians_ids:
-            valid_votes.append({
-                'parliamentary': parliamentary_id,
-                'valid_votes': 0
-            })
-
-    valid_votes = sorted(valid_votes, key=lambda k: k['parliamentary'])
-
-    matching_votes_queryset = self.request.user.votes.filter(
-        (
-            Q(proposition__parliamentary_votes__option='Y') |
-            Q(proposition__parliamentary_votes__option='N')
-        ),
-        Q(proposition__parliamentary_votes__option=F('option'))
-    ).annotate(
-        parliamentary=F('proposition__parliamentary_votes__parliamentary')
-    ).values(
-        'parliamentary'
-    ).annotate(
-        matching_votes=Count('parliamentary')
-    ).order_by(
-        'parliamentary'
-    )
+    return queryset
 
-    matching_votes = list()
-    matching_votes_parliamentarians_ids = list()
-    for valid_vote in matching_votes_queryset:
-        matching_votes.append(valid_vote)
-        matching_votes_parliamentarians_ids.append(valid_vote['parliamentary'])
 
-    for parliamentary_id in all_parliamentarians_ids:
-        if parliamentary_id not in matching_votes_parliamentarians_ids:
-            matching_votes.append({
-                'parliamentary': parliamentary_id,
-                'matching_votes': 0
-            })
+def update_compatibility(self):
+    """
+    Makes sure the request user has compatibilities to be read, returning
+    whether they are stale.
 
-    matching_votes = sorted(matching_votes, key=lambda k: k['parliamentary'])
+    They are computed right away only when the user has none; otherwise the
+    last computed ones are served while a recompute is scheduled.
+    """
+    user = self.request.user
+    extended_user, created = ExtendedUser.objects.get_or_create(user=user)
 
-    if len(valid_votes) == len(matching_votes):
+    if not extended_user.should_update:
+        return False
 
-        compatibilities = list()
+    if not user.compatibilities.exists():
+        update_user_compatibility(user)
+        return False
 
-        for i in range(len(valid_votes)):
+    schedule_compatibility_update(user)
+    return True
 
-            if valid_votes[i]['parliamentary'] == \
-                    matching_votes[i]['parliamentary']:
 
-                compatibility = dict()
+def schedule_compatibility_update(user):
+    """
+    Marks the user compatibilities as stale and schedules their recompute.
 
-                parliamentary = Parliamentary.objects.get(
-                    pk=valid_votes[i]['parliamentary']
-                )
+    Calls made while a recompute is already waiting in the debounce window
+    are coalesced into it. A recompute that didn't run within
+    COMPATIBILITY_UPDATE_SCHEDULE_TIMEOUT seconds (as when its task was
+    lost) is scheduled again.
+    """
+    ExtendedUser.objects.filter(user=user).update(should_update=True)
 
-                compatibility['user'] = self.request.user
-                compatibility['parliamentary'] = parliamentary
-                compatibility['valid_votes'] = valid_votes[i]['valid_votes']
-                compatibility['matching_votes'] = \
-                    matching_votes[i]['matching_votes']
-                # compatibility['compatibility'] = \
-                #     ((compatibility['matching_votes'] /
-                #       self.request.user.votes.count()) * 100)
-                try:
-                    compatibility['compatibility'] = (
-                        compatibility['matching_votes'] * (
-                            self.request.user.votes.filter(
-                                Q(option='Y') | Q(option='N')
-                            ).count()*A +
-                            compatibility['valid_votes']*B
-                        ) / (
-                            compatibility['valid_votes'] *
-                            self.request.user.votes.filter(
-                                Q(option='Y') | Q(option='N')
-                            ).count() * (A+B)
-                        )
-                    ) * 100
-                except ZeroDivisionError:
-                    compatibility['compatibility'] = 0
-
-                compatibility_obj = Compatibility(**compatibility)
-                compatibilities.append(compatibility_obj)
-
-        self.request.user.compatibilities.all().delete()
-
-        Compatibility.objects.bulk_create(compatibilities)
-
-
-def calc_charts_totals_info(total_queryset):
-
-    response = dict()
-
-    answers_list = ['Y', 'N', 'A']
-
-    for answer in answers_list:
-
-        response[answer] = round(
-            (
-                total_queryset.filter(
-                    option=answer
-                ).count() / total_queryset.count() * 100
-            ),
-            2
-        )
+    now = timezone.now()
+    expired = now - timedelta(
+        seconds=settings.COMPATIBILITY_UPDATE_SCHEDULE_TIMEOUT
+    )
+    scheduled = ExtendedUser.objects.filter(
+        Q(update_scheduled=None) | Q(update_scheduled__lt=expired),
+        user=user
+    ).update(update_scheduled=now)
+
+    if scheduled:
+        try:
+            update_compatibility_task.apply_async(
+                (user.id,),
+                countdown=settings.COMPATIBILITY_UPDATE_DEBOUNCE
+            )
+        except OperationalError:
+            # Broker unavailable, the next call will try again
+            logger.exception('Could not schedule compatibility update')
+            ExtendedUser.objects.filter(user=user).update(
+                update_scheduled=None
+            )
+
+
+def schedule_compatibility_refresh(propositions_ids):
+    """
+    Flags the users who voted on the given propositions to be refreshed and
+    schedules a CompatibilityRefresh job for them.
+
+    Ingests made while a job is waiting in the debounce window are
+    coalesced into it.
+    """
+    ExtendedUser.objects.filter(
+        user__votes__proposition__in=propositions_ids
+    ).update(should_update=True, update_scheduled=timezone.now())
+
+    with transaction.atomic():
+        if CompatibilityRefresh.objects.select_for_update().filter(
+            started=None
+        ).exists():
+            return
+
+        refresh = CompatibilityRefresh.objects.create()
 
-    if isinstance(total_queryset[0], ParliamentaryVote):
-        response['others'] = round(
-            (
-                total_queryset.exclude(
-                    Q(option='Y') |
-                    Q(option='N') |
-                    Q(option='A')
-                ).count() / total_queryset.count() * 100
-            ),
-            2
+    try:
+        refresh_compatibilities_task.apply_async(
+            (refresh.pk,),
+            countdown=settings.COMPATIBILITY_REFRESH_DEBOUNCE
         )
+    except OperationalError:
+        logger.exception('Could not schedule compatibility refresh')
+        refresh.delete()
 
-    response['count'] = total_queryset.count()
 
-    return response
+def schedule_leaderboard_refresh(kind):
+    """
+    Schedules the refresh of the leaderboard of the given kind.
 
+    Calls made while a refresh is already waiting in the debounce window
+    are coalesced into it.
+    """
+    key = LEADERBOARD_SCHEDULED_KEY.format(kind=kind)
+    if not cache.add(key, True, settings.LEADERBOARD_REFRESH_DEBOUNCE):
+        return
 
-def calc_charts_social_info(population_total_votes,
-                            filter_arg,
-                            options_list):
+    try:
+        refresh_leaderboard_task.apply_async(
+            (kind,),
+            countdown=settings.LEADERBOARD_REFRESH_DEBOUNCE
+        )
+    except OperationalError:
+        logger.exception('Could not schedule leaderboard refresh')
+        cache.delete(key)
+
+
+def refresh_following_statistics():
+    """
+    Marks the responses showing the parliamentarians follower_count as
+    stale, and schedules the refresh of the leaderboards.
+    """
+    bump_generation(FOLLOWING)
+
+    for kind, _ in LeaderboardEntry.KIND_CHOICES:
+        schedule_leaderboard_refresh(kind)
+
+
+def update_compatibility_vote(user, proposition,
+                              old_option=None, new_option=None):
+    """
+    Updates the stored compatibilities of an user after one of his votes
+    on the given proposition changed from old_option to new_option
+    (None meaning that there was no vote before, or there is no vote after).
+
+    Only the parliamentarians who voted 'Y' or 'N' on the proposition have
+    their valid_votes and matching_votes changed; the scores are updated in
+    place. When the stored rows don't cover every parliamentary (as when
+    none were stored yet, or parliamentarians were ingested since), a full
+    recompute is scheduled instead.
+
+    Must run in the transaction writing the vote: the user is locked, as
+    refresh_users_compatibilities does, so that a concurrent refresh either
+    sees the vote or has its rows updated with it afterwards, never both.
+    """
+
+    with transaction.atomic():
+        ExtendedUser.objects.get_or_create(user=user)
+        extended_user = ExtendedUser.objects.select_for_update().get(
+            user=user
+        )
 
-    population_approval = population_total_votes.filter(option='Y')
-    population_disapproval = population_total_votes.filter(option='N')
-    population_abstention = population_total_votes.filter(option='A')
+        if extended_user.should_update:
+            schedule_compatibility_update(user)
+            return
+
+        if old_option == new_option:
+            return
+
+        if user.compatibilities.count() < Parliamentary.objects.count():
+            schedule_compatibility_update(user)
+            return
+
+        parliamentary_votes = ParliamentaryVote.objects.filter(
+            Q(option='Y') | Q(option='N'),
+            proposition=proposition
+        ).values_list('parliamentary', 'option')
+
+        voters = dict()
+        for parliamentary_id, option in parliamentary_votes:
+            voters.setdefault(option, []).append(parliamentary_id)
+
+        all_voters = voters.get('Y', []) + voters.get('N', [])
+        compatibilities = user.compatibilities.all()
+
+        valid_votes_delta = \
+            int(new_option is not None) - int(old_option is not None)
+        if valid_votes_delta and all_voters:
+            compatibilities.filter(parliamentary__in=all_voters).update(
+                valid_votes=F('valid_votes') + valid_votes_delta
+            )
+
+        for option, matching_votes_delta in ((old_option, -1),
+                                             (new_option, 1)):
+            if voters.get(option):
+                compatibilities.filter(
+                    parliamentary__in=voters[option]
+                ).update(
+                    matching_votes=F('matching_votes') + matching_votes_delta
+                )
 
-    response = dict()
+        if (old_option in ('Y', 'N')) == (new_option in ('Y', 'N')):
+            # The user valid votes count didn't change, so only the
+            # parliamentarians who voted on the proposition are affected
+            compatibilities = compatibilities.filter(
+                parliamentary__in=all_voters
+            )
+
+        user_valid_votes = user.votes.filter(
+            Q(option='Y') | Q(option='N')
+        ).count()
+
+        update_compatibility_scores(compatibilities, user_valid_votes)
+        update_user_group_compatibilities(user)
+        bump_compatibility_version([user.pk])
+
+
+def update_compatibility_user_vote(user, user_vote, data):
+    """
+    Updates the stored compatibilities of an user after user_vote was
+    edited to the serialized data.
+    """
+
+    if user_vote.proposition_id == data['proposition']:
+        update_compatibility_vote(
+            user,
+            user_vote.proposition_id,
+            user_vote.option,
+            data['option']
+        )
+    else:
+        update_compatibility_vote(
+            user,
+            user_vote.proposition_id,
+            old_option=user_vote.option
+        )
+        update_compatibility_vote(
+            user,
+            data['proposition'],
+            new_option=data['option']
+        )
 
-    answers_list = [('Y', population_approval),
-                    ('N', population_disapproval),
-                    ('A', population_abstention)]
 
-    for option in options_list:
+def update_compatibility_scores(compatibilities, user_valid_votes):
+    """
+    Recomputes, with a single UPDATE, the score of the given compatibilities
+    queryset from its stored valid_votes and matching_votes.
+    """
+    A = COMPATIBILITY_A
+    B = COMPATIBILITY_B
+
+    if user_valid_votes == 0:
+        compatibilities.update(compatibility=0)
+        return
+
+    compatibilities.filter(valid_votes=0).update(compatibility=0)
+    compatibilities.exclude(valid_votes=0).update(
+        compatibility=ExpressionWrapper(
+            Cast(
+                F('matching_votes') * (
+                    user_valid_votes*A + F('valid_votes')*B
+                ),
+                FloatField()
+            ) / (
+                F('valid_votes') * user_valid_votes * (A+B)
+            ) * 100,
+            output_field=FloatField()
+        )
+    )
 
-        response[option] = dict()
 
-        if population_total_votes.filter(
-                **{filter_arg: option}
-        ).count() > 0:
+def proposition_approvals(tallied, proposition_id=None):
+    """
+    Returns the parliamentarians and population approvals, rounded, of the
+    proposition (by default tallied itself, an instance or a values() row)
+    from its tally.
+    """
+    if proposition_id is None:
+        proposition_id = \
+            tallied['id'] if isinstance(tallied, dict) else tallied.pk
 
-            for answer, queryset in answers_list:
-                response[option][answer] = round(
-                    (
-                        queryset.filter(
-                            **{filter_arg: option}
-                        ).count() /
-                        population_total_votes.filter(
-                            **{filter_arg: option}
-                        ).count() * 100
-                    ),
-                    2
-                )
-            response[option]['count'] = population_total_votes.filter(
-                **{filter_arg: option}
-            ).count()
+    return tuple(
+        round(approval, 2)
+        for approval in calc_approvals(tallied, proposition_id)
+    )
 
-        else:
-            for answer, queryset in answers_list:
-                response[option][answer] = 0.0
-            response[option]['count'] = 0
 
-    return response
+def propositions_last_update():
+    """
+    Returns the last update of the most recently updated proposition, read
+    from the keyset index.
+    """
+    return Proposition.objects.aggregate(
+        last_update=Max('last_update')
+    )['last_update']
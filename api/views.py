@@ -4,8 +4,8 @@ from datetime import datetime
 
 from django.contrib.auth.models import User
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import IntegrityError
-from django.db.models import Count, Q
+from django.db import IntegrityError, transaction
+from django.db.models import F
 from django.utils import timezone
 
 from rest_framework import mixins, status, viewsets
@@ -15,24 +15,53 @@ from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
 
+from .autocomplete import (
+    get_autocomplete_index, invalidate_autocomplete_index
+)
+from .compatibility import get_compatibility_map
+from .demographics import (
+    CUBE_DIMENSIONS, get_demographics, move_voter_cells, slice_cube,
+    update_user_vote_cube, update_vote_cube, user_profile, voter_profile
+)
+from .leaderboards import leaderboard_rows
 from .models import (
-    ExtendedUser, Parliamentary, ParliamentaryVote, Proposition,
-    SocialInformation, UserFollowing, UserVote, ContactUs
+    ExtendedUser, GroupCompatibility, LeaderboardEntry, Parliamentary,
+    ParliamentaryVote, Proposition, SocialInformation, UserFollowing,
+    UserVote, ContactUs
 )
+from .pagination import OptionalCursorPagination
 from .permissions import SocialInformationPermissions, UserPermissions
 from .serializers import (
-    CompatibilitySerializer, ParliamentarySerializer, PropositionSerializer,
+    GroupCompatibilitySerializer,
+    ParliamentarySerializer, PropositionSerializer,
     SocialInformationSerializer, UserFollowingSerializer, UserSerializer,
-    UserVoteSerializer, ContactUsSerializer
+    UserVoteSerializer, ContactUsSerializer, compatibility_values_serializer,
+    parliamentary_values_serializer, proposition_values_serializer
+)
+from .response_cache import (
+    FOLLOWING, INGEST, LEADERBOARD, TALLY, bump_generation, cache_response,
+    conditional_response
+)
+from .search import SEARCH_RANK, index_propositions, is_ranked
+from .similarity import get_similarity_matrix
+from .tallies import (
+    TALLY_ANNOTATIONS, USERS, add_parliamentary_votes_tallies,
+    annotate_tallies, update_tally, update_user_vote_tally
 )
 from .utils import (
+    compatibilities_filter,
     parliamentarians_filter,
     propositions_filter,
     user_votes_filter,
     user_following_filter,
+    refresh_following_statistics,
+    schedule_compatibility_refresh,
+    schedule_leaderboard_refresh,
     update_compatibility,
-    calc_charts_social_info,
-    calc_charts_totals_info
+    update_compatibility_vote,
+    update_compatibility_user_vote,
+    proposition_approvals,
+    propositions_last_update
 )
 
 
@@ -207,6 +236,13 @@ class SocialInformationViewset(mixins.RetrieveModelMixin,
             **kwargs)
         return response
 
+    def perform_update(self, serializer):
+        old_profile = voter_profile(serializer.instance)
+
+        with transaction.atomic():
+            serializer.save()
+            move_voter_cells(serializer.instance.owner, old_profile)
+
 
 class UserViewset(mixins.CreateModelMixin,
                   mixins.RetrieveModelMixin,
@@ -328,6 +364,7 @@ class UserViewset(mixins.CreateModelMixin,
         API endpoint that allows user to be deleted.
         """
         response = super(UserViewset, self).destroy(request, pk)
+        refresh_following_statistics()
         return response
 
     def retrieve(self, request, pk=None):
@@ -441,9 +478,13 @@ class UserViewset(mixins.CreateModelMixin,
             if social_information_data.get('owner'):
                 del social_information_data['owner']
 
-            SocialInformation.objects.filter(owner=request.user).update(
-                **social_information_data
-            )
+            old_profile = user_profile(request.user)
+
+            with transaction.atomic():
+                SocialInformation.objects.filter(owner=request.user).update(
+                    **social_information_data
+                )
+                move_voter_cells(request.user, old_profile)
         except KeyError:
             pass
 
@@ -531,6 +572,9 @@ class LoaderViewSet(ViewSet):
                 LoaderViewSet.__get_credentials():
             parliamentary_dict = request.data.dict()
             Parliamentary.objects.create(**parliamentary_dict)
+            invalidate_autocomplete_index()
+            bump_generation(INGEST)
+            schedule_leaderboard_refresh(LeaderboardEntry.MOST_FOLLOWED)
 
             response = Response({"status": "OK"}, status=status.HTTP_200_OK)
 
@@ -581,7 +625,9 @@ class LoaderViewSet(ViewSet):
                 '%Y-%m-%dT%H:%M%z'
             )
 
-            Proposition.objects.create(**proposition_dict)
+            proposition = Proposition.objects.create(**proposition_dict)
+            index_propositions([proposition])
+            bump_generation(INGEST)
 
             response = Response({"status": "OK"}, status=status.HTTP_200_OK)
 
@@ -621,7 +667,16 @@ class LoaderViewSet(ViewSet):
                 except ObjectDoesNotExist:
                     pass
 
-            ParliamentaryVote.objects.bulk_create(create_list)
+            with transaction.atomic():
+                ParliamentaryVote.objects.bulk_create(create_list)
+                add_parliamentary_votes_tallies(create_list)
+                bump_generation(INGEST)
+
+            if create_list:
+                schedule_compatibility_refresh(
+                    {vote.proposition_id for vote in create_list}
+                )
+                schedule_leaderboard_refresh(LeaderboardEntry.MOST_ACTIVE)
 
             response = Response({"status": "OK"}, status=status.HTTP_200_OK)
 
@@ -643,46 +698,126 @@ class ParliamentaryViewset(mixins.RetrieveModelMixin,
         queryset = Parliamentary.objects.all()
         return parliamentarians_filter(self, queryset)
 
+    @conditional_response(INGEST, FOLLOWING)
+    @cache_response(INGEST, FOLLOWING)
     def list(self, request):
-        response = super(ParliamentaryViewset, self).list(request)
+        queryset = self.filter_queryset(self.get_queryset()).values(
+            *parliamentary_values_serializer.lookups()
+        )
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            queryset = page
+
+        parliamentarians = parliamentary_values_serializer.serialize(queryset)
+
+        if page is not None:
+            response = self.get_paginated_response(parliamentarians)
+        else:
+            response = Response(parliamentarians)
 
         if request.user.is_authenticated:
 
-            extended_user = ExtendedUser.objects.get(user=request.user)
-            if extended_user.should_update:
-                update_compatibility(self)
-                extended_user.should_update = False
-                extended_user.save()
+            stale = update_compatibility(self)
+            compatibility_map = get_compatibility_map(request.user)
 
             for parliamentary in response.data['results']:
-                compatibility = self.request.user.compatibilities.filter(
-                    parliamentary=parliamentary['id']
-                )[0].compatibility
+                compatibility = compatibility_map.get(parliamentary['id'], 0)
                 parliamentary['compatibility'] = round(compatibility, 2)
 
+            response.data['stale'] = stale
+
         return response
 
+    @list_route(methods=['get'])
+    def autocomplete(self, request):
+        """
+        Returns the parliamentarians whose name, party or federal unit have
+        words starting with every word of ?query, tolerating one typo, for
+        the search box suggestions (?limit, by default 10).
+        """
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            limit = 10
+
+        parliamentarians_ids = get_autocomplete_index().suggest(
+            request.query_params.get('query', ''),
+            max(limit, 0)
+        )
+
+        parliamentarians = {
+            parliamentary['id']: parliamentary
+            for parliamentary in parliamentary_values_serializer.serialize(
+                Parliamentary.objects.filter(
+                    id__in=parliamentarians_ids
+                ).values(*parliamentary_values_serializer.lookups())
+            )
+        }
+
+        return Response([
+            parliamentarians[parliamentary_id]
+            for parliamentary_id in parliamentarians_ids
+            if parliamentary_id in parliamentarians
+        ])
+
+    @detail_route(methods=['get'])
+    def similar(self, request, pk=None):
+        """
+        Returns the parliamentarians who most agree with this one on the
+        propositions both voted on, with the number of such propositions.
+        """
+        parliamentary = self.get_object()
+
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            limit = 10
+
+        most_similar = get_similarity_matrix().most_similar(
+            parliamentary.id,
+            max(limit, 0)
+        )
+        parliamentarians = Parliamentary.objects.in_bulk(
+            [parliamentary_id for parliamentary_id, _, _ in most_similar]
+        )
+
+        similar_list = list()
+        for parliamentary_id, agreement, overlap in most_similar:
+            if parliamentary_id not in parliamentarians:
+                continue
+
+            similar_list.append({
+                'parliamentary': ParliamentarySerializer(
+                    parliamentarians[parliamentary_id]
+                ).data,
+                'agreement': round(agreement, 2),
+                'overlap': overlap
+            })
+
+        return Response(similar_list)
+
+    @conditional_response(INGEST, FOLLOWING)
+    @cache_response(INGEST, FOLLOWING)
     def retrieve(self, request, pk=None):
         response = super(ParliamentaryViewset, self).retrieve(request, pk)
 
         if request.user.is_authenticated:
 
-            extended_user = ExtendedUser.objects.get(user=request.user)
-            if extended_user.should_update:
-                update_compatibility(self)
-                extended_user.should_update = False
-                extended_user.save()
+            stale = update_compatibility(self)
 
-            compatibility = self.request.user.compatibilities.filter(
-                parliamentary=response.data['id']
-            )[0].compatibility
+            compatibility = get_compatibility_map(request.user).get(
+                response.data['id'],
+                0
+            )
             response.data['compatibility'] = round(compatibility, 2)
+            response.data['stale'] = stale
 
             response.data['voted_by_both'] = list()
-            voted_by_both = Proposition.objects.filter(
+            voted_by_both = annotate_tallies(Proposition.objects.filter(
                 user_votes__user=request.user,
                 parliamentary_votes__parliamentary=response.data['id']
-            )
+            ))
             for proposition in voted_by_both:
                 vote = dict()
                 vote['proposition'] = proposition.proposition_type_initials + \
@@ -695,32 +830,10 @@ class ParliamentaryViewset(mixins.RetrieveModelMixin,
                         parliamentary=response.data['id']
                     )[0].option
 
-                parliamentarians_total_votes = \
-                    ParliamentaryVote.objects.filter(
-                        proposition=proposition
-                    )
-                try:
-                    parliamentarians_approval = \
-                        parliamentarians_total_votes.filter(
-                            option='Y'
-                        ).count() / parliamentarians_total_votes.count() * 100
-                except ZeroDivisionError:
-                    parliamentarians_approval = 0
-
-                population_total_votes = UserVote.objects.filter(
-                    proposition=proposition
-                )
-                try:
-                    population_approval = population_total_votes.filter(
-                        option='Y'
-                    ).count() / population_total_votes.count() * 100
-                except ZeroDivisionError:
-                    population_approval = 0
-
-                vote['parliamentarians_approval'] = \
-                    round(parliamentarians_approval, 2)
-                vote['population_approval'] = \
-                    round(population_approval, 2)
+                parliamentarians_approval, population_approval = \
+                    proposition_approvals(proposition)
+                vote['parliamentarians_approval'] = parliamentarians_approval
+                vote['population_approval'] = population_approval
 
                 response.data['voted_by_both'].append(vote)
 
@@ -731,281 +844,217 @@ class PropositionViewset(mixins.RetrieveModelMixin,
                          mixins.ListModelMixin,
                          viewsets.GenericViewSet):
     serializer_class = PropositionSerializer
+    pagination_class = OptionalCursorPagination
 
     def get_queryset(self):
-        queryset = Proposition.objects.all().order_by('-last_update')
+        queryset = annotate_tallies(Proposition.objects.all()).order_by(
+            '-last_update',
+            '-id'
+        )
         return propositions_filter(self, queryset)
 
+    @conditional_response(
+        INGEST,
+        TALLY,
+        last_update=propositions_last_update
+    )
+    @cache_response(INGEST, TALLY)
     def list(self, request):
-        response = super(PropositionViewset, self).list(request)
+        queryset = self.proposition_values(
+            self.filter_queryset(self.get_queryset())
+        )
 
-        for proposition in response.data['results']:
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            queryset = page
 
-            parliamentarians_total_votes = ParliamentaryVote.objects.filter(
-                proposition=proposition['id']
-            )
-            try:
-                parliamentarians_approval = \
-                    parliamentarians_total_votes.filter(
-                        option='Y'
-                    ).count() / parliamentarians_total_votes.count() * 100
-            except ZeroDivisionError:
-                parliamentarians_approval = 0
-
-            population_total_votes = UserVote.objects.filter(
-                proposition=proposition['id']
-            )
-            try:
-                population_approval = population_total_votes.filter(
-                    option='Y'
-                ).count() / population_total_votes.count() * 100
-            except ZeroDivisionError:
-                population_approval = 0
+        propositions = proposition_values_serializer.serialize(queryset)
 
-            proposition['parliamentarians_approval'] = \
-                round(parliamentarians_approval, 2)
-            proposition['population_approval'] = \
-                round(population_approval, 2)
+        for proposition, proposition_serialized in zip(queryset,
+                                                       propositions):
+            parliamentarians_approval, population_approval = \
+                proposition_approvals(proposition)
+            proposition_serialized['parliamentarians_approval'] = \
+                parliamentarians_approval
+            proposition_serialized['population_approval'] = \
+                population_approval
 
-        return response
+        if page is not None:
+            return self.get_paginated_response(propositions)
 
-    def retrieve(self, request, pk=None):
-        response = super(PropositionViewset, self).retrieve(request, pk)
+        return Response(propositions)
 
-        parliamentarians_total_votes = ParliamentaryVote.objects.filter(
-            proposition=response.data['id']
-        )
-        try:
-            parliamentarians_approval = parliamentarians_total_votes.filter(
-                option='Y'
-            ).count() / parliamentarians_total_votes.count() * 100
-        except ZeroDivisionError:
-            parliamentarians_approval = 0
-
-        population_total_votes = UserVote.objects.filter(
-            proposition=response.data['id']
-        )
-        try:
-            population_approval = population_total_votes.filter(
-                option='Y'
-            ).count() / population_total_votes.count() * 100
-        except ZeroDivisionError:
-            population_approval = 0
+    def proposition_values(self, queryset):
+        """
+        Returns the values() rows of the queryset, with the serialized
+        fields, the tally sums and, for searches, the search rank.
+        """
+        fields = proposition_values_serializer.lookups() + TALLY_ANNOTATIONS
+        if is_ranked(queryset):
+            fields.append(SEARCH_RANK)
+
+        return queryset.values(*fields)
+
+    @conditional_response(
+        INGEST,
+        TALLY,
+        last_update=propositions_last_update
+    )
+    @cache_response(INGEST, TALLY)
+    def retrieve(self, request, pk=None):
+        proposition = self.get_object()
+        response = Response(self.get_serializer(proposition).data)
 
-        response.data['parliamentarians_approval'] = \
-            round(parliamentarians_approval, 2)
-        response.data['population_approval'] = \
-            round(population_approval, 2)
+        parliamentarians_approval, population_approval = \
+            proposition_approvals(proposition)
+        response.data['parliamentarians_approval'] = parliamentarians_approval
+        response.data['population_approval'] = population_approval
 
         return response
 
     @list_route(methods=['get'])
     def non_voted_by_user(self, request):
         """
-        Returns one proposition non voted by the current user.
+        Returns one proposition non voted by the current user, or a page of
+        them with ?pagination=cursor.
         """
 
-        user = request.user
-        proposition_voted_by_user = []
-
-        try:
-            for vote in user.votes.all():
-                proposition_voted_by_user.append(vote.proposition)
-
-            proposition_voted = ParliamentaryVote.objects.values(
-                'proposition'
-            ).annotate(count=Count('proposition'))
-
-            proposition_voted_ids = []
-            for proposition in proposition_voted:
-                proposition_voted_ids.append(proposition['proposition'])
-
-            all_propositions = Proposition.objects.filter(
-                id__in=proposition_voted_ids
-            ).order_by('-last_update')
+        if request.user.is_anonymous:
+            return Response(
+                {'status': 'Unauthorized'},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
 
-            response = Response(
-                {'status': 'No Content'},
-                status=status.HTTP_204_NO_CONTENT
+        queryset = self.proposition_values(annotate_tallies(
+            Proposition.objects.filter(
+                id__in=ParliamentaryVote.objects.values('proposition')
+            ).exclude(
+                id__in=UserVote.objects.filter(user=request.user).values(
+                    'proposition'
+                )
             )
+        ).order_by('-last_update', '-id'))
 
-            for proposition in all_propositions:
-                if proposition not in proposition_voted_by_user:
-                    proposition_serialized = PropositionSerializer(proposition)
-                    response = Response(
-                        proposition_serialized.data,
-                        status=status.HTTP_200_OK
-                    )
+        if self.paginator.use_cursor(request):
+            page = self.paginate_queryset(queryset)
+            return self.get_paginated_response(
+                self.serialize_voted_propositions(page)
+            )
 
-                    parliamentarians_total_votes = \
-                        ParliamentaryVote.objects.filter(
-                            proposition=response.data['id']
-                        )
-                    try:
-                        parliamentarians_approval = \
-                            parliamentarians_total_votes.filter(
-                                option='Y'
-                            ).count() / \
-                            parliamentarians_total_votes.count() * 100
-                    except ZeroDivisionError:
-                        parliamentarians_approval = 0
-
-                    population_total_votes = UserVote.objects.filter(
-                        proposition=response.data['id']
-                    )
-                    try:
-                        population_approval = population_total_votes.filter(
-                            option='Y'
-                        ).count() / population_total_votes.count() * 100
-                    except ZeroDivisionError:
-                        population_approval = 0
-
-                    response.data['parliamentarians_approval'] = \
-                        round(parliamentarians_approval, 2)
-                    response.data['population_approval'] = \
-                        round(population_approval, 2)
-                    response.data['days_ago'] = (
-                        timezone.now() - datetime.strptime(
-                            response.data['last_update'] + '-0300',
-                            '%Y-%m-%dT%H:%M:%SZ%z'
-                        )
-                    ).days
-
-                    break
-
-        except AttributeError:
+        proposition = queryset.first()
+        if proposition is None:
             return Response(
-                {'status': 'Unauthorized'},
-                status=status.HTTP_401_UNAUTHORIZED
+                {'status': 'No Content'},
+                status=status.HTTP_204_NO_CONTENT
             )
 
-        return response
+        return Response(
+            self.serialize_voted_propositions([proposition])[0],
+            status=status.HTTP_200_OK
+        )
 
     @list_route(methods=['get'])
+    @conditional_response(
+        INGEST,
+        TALLY,
+        last_update=propositions_last_update,
+        daily=True
+    )
+    @cache_response(INGEST, TALLY, daily=True)
     def voted_by_parliamentary(self, request):
         """
         Returns all propositions voted by parliamentarians.
         """
 
-        proposition_voted = ParliamentaryVote.objects.values(
-            'proposition'
-        ).annotate(count=Count('proposition'))
-
-        proposition_voted_ids = []
-        for proposition in proposition_voted:
-            proposition_voted_ids.append(proposition['proposition'])
-
-        queryset = Proposition.objects.filter(
-            id__in=proposition_voted_ids
-        ).order_by('-last_update')
-
-        # serializer = PropositionSerializer(queryset, many=True)
-        # return Response(serializer.data)
+        queryset = self.proposition_values(annotate_tallies(
+            Proposition.objects.filter(
+                id__in=ParliamentaryVote.objects.values('proposition')
+            )
+        ).order_by('-last_update', '-id'))
 
         page = self.paginate_queryset(queryset)
         if page is not None:
-            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(
+                self.serialize_voted_propositions(page)
+            )
 
-            for proposition in serializer.data:
+        return Response(proposition_values_serializer.serialize(queryset))
 
-                parliamentarians_total_votes = \
-                    ParliamentaryVote.objects.filter(
-                        proposition=proposition['id']
-                    )
-                try:
-                    parliamentarians_approval = \
-                        parliamentarians_total_votes.filter(
-                            option='Y'
-                        ).count() / parliamentarians_total_votes.count() * 100
-                except ZeroDivisionError:
-                    parliamentarians_approval = 0
-
-                population_total_votes = UserVote.objects.filter(
-                    proposition=proposition['id']
-                )
-                try:
-                    population_approval = population_total_votes.filter(
-                        option='Y'
-                    ).count() / population_total_votes.count() * 100
-                except ZeroDivisionError:
-                    population_approval = 0
-
-                proposition['parliamentarians_approval'] = \
-                    round(parliamentarians_approval, 2)
-                proposition['population_approval'] = \
-                    round(population_approval, 2)
-                proposition['days_ago'] = (timezone.now() - datetime.strptime(
-                    proposition['last_update'] + '-0300',
-                    '%Y-%m-%dT%H:%M:%SZ%z'
-                )).days
+    def serialize_voted_propositions(self, propositions):
+        """
+        Returns the serialized propositions values() rows, with their
+        approvals and how many days ago they were updated.
+        """
+        propositions_data = proposition_values_serializer.serialize(
+            propositions
+        )
 
-            return self.get_paginated_response(serializer.data)
+        for proposition_row, proposition in zip(propositions,
+                                                propositions_data):
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+            parliamentarians_approval, population_approval = \
+                proposition_approvals(proposition_row)
+            proposition['parliamentarians_approval'] = \
+                parliamentarians_approval
+            proposition['population_approval'] = population_approval
+            proposition['days_ago'] = (timezone.now() - datetime.strptime(
+                proposition['last_update'] + '-0300',
+                '%Y-%m-%dT%H:%M:%SZ%z'
+            )).days
+
+        return propositions_data
 
     @detail_route(methods=['get'])
     def social_information_data(self, request, pk):
 
-        response = dict()
-
-        parliamentarians_total_votes = ParliamentaryVote.objects.filter(
-            proposition=pk
-        )
-        population_total_votes = UserVote.objects.filter(
-            proposition=pk
-        )
-
-        if parliamentarians_total_votes.count() == 0 \
-                or population_total_votes.count() == 0:
-            return Response(response, status=status.HTTP_404_NOT_FOUND)
+        demographics = get_demographics(int(pk))
+        if demographics is None:
+            return Response(dict(), status=status.HTTP_404_NOT_FOUND)
 
-        response['proposition'] = pk
+        response = dict(proposition=pk)
+        response.update(demographics)
 
-        # Parliamentarians approval
-        response['parliamentarians_total_votes'] = calc_charts_totals_info(
-            parliamentarians_total_votes
-        )
+        return Response(response, status=status.HTTP_200_OK)
 
-        # Population approval
-        response['population_total_votes'] = calc_charts_totals_info(
-            population_total_votes
-        )
+    @detail_route(methods=['get'])
+    def demographics(self, request, pk):
+        """
+        Returns the population votes chart of the voters matching every
+        given dimension filter, such as
+        ?gender=F&region=NE&education=ES, with comma separated values and
+        'null' for uninformed ones. The charts of each value of a dimension
+        are added with ?group_by=<dimension>.
+        """
 
-        # Region
-        response['region'] = calc_charts_social_info(
-            population_total_votes,
-            'user__social_information__region',
-            ['N', 'NE', 'CO', 'SE', 'S', None]
-        )
+        filters = dict()
+        errors = dict()
+        for dimension, values in CUBE_DIMENSIONS.items():
+            if dimension not in request.query_params:
+                continue
 
-        # Income
-        response['income'] = calc_charts_social_info(
-            population_total_votes,
-            'user__social_information__income',
-            ['E', 'D', 'C', 'B', 'A', None]
-        )
+            filters[dimension] = [
+                None if value == 'null' else value
+                for value in request.query_params[dimension].split(',')
+            ]
+            invalid = [
+                value for value in filters[dimension] if value not in values
+            ]
+            if invalid:
+                errors[dimension] = [
+                    'Invalid values: {}.'.format(', '.join(invalid))
+                ]
+
+        group_by = request.query_params.get('group_by')
+        if group_by is not None and group_by not in CUBE_DIMENSIONS:
+            errors['group_by'] = [
+                'Must be one of: {}.'.format(', '.join(CUBE_DIMENSIONS))
+            ]
 
-        # Education
-        response['education'] = calc_charts_social_info(
-            population_total_votes,
-            'user__social_information__education',
-            ['SE', 'EF', 'EM', 'ES', 'PG', None]
-        )
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
 
-        # Race
-        response['race'] = calc_charts_social_info(
-            population_total_votes,
-            'user__social_information__race',
-            ['B', 'PR', 'A', 'PA', 'I', None]
-        )
-
-        # Gender
-        response['gender'] = calc_charts_social_info(
-            population_total_votes,
-            'user__social_information__gender',
-            ['M', 'F', 'O', None]
-        )
+        response = dict(proposition=pk, filters=filters)
+        response.update(slice_cube(int(pk), filters, group_by))
 
         return Response(response, status=status.HTTP_200_OK)
 
@@ -1014,51 +1063,43 @@ class UserVoteViewset(viewsets.ModelViewSet):
 
     serializer_class = UserVoteSerializer
     queryset = UserVote.objects.all()
+    pagination_class = OptionalCursorPagination
+    keyset_ordering = ('-proposition__last_update', '-id')
 
     def get_queryset(self):
         if not self.request.user.is_anonymous:
             user = self.request.user
-            queryset = UserVote.objects.filter(user=user)
+            queryset = annotate_tallies(
+                UserVote.objects.filter(user=user).select_related(
+                    'proposition'
+                ),
+                'proposition'
+            )
         else:
             queryset = UserVote.objects.none()
 
         return user_votes_filter(self, queryset)
 
     def list(self, request):
-        response = super(UserVoteViewset, self).list(request)
+        queryset = self.filter_queryset(self.get_queryset())
 
-        for vote in response.data['results']:
-            proposition = Proposition.objects.get(pk=vote['proposition'])
-            proposition_serializer = PropositionSerializer(proposition)
-            vote['proposition'] = proposition_serializer.data
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            queryset = page
 
-            parliamentarians_total_votes = \
-                ParliamentaryVote.objects.filter(
-                    proposition=vote['proposition']['id']
-                )
-            try:
-                parliamentarians_approval = \
-                    parliamentarians_total_votes.filter(
-                        option='Y'
-                    ).count() / \
-                    parliamentarians_total_votes.count() * 100
-            except ZeroDivisionError:
-                parliamentarians_approval = 0
-
-            population_total_votes = UserVote.objects.filter(
-                proposition=vote['proposition']['id']
+        serializer = self.get_serializer(queryset, many=True)
+
+        for user_vote, vote in zip(queryset, serializer.data):
+            proposition_serializer = PropositionSerializer(
+                user_vote.proposition
             )
-            try:
-                population_approval = population_total_votes.filter(
-                    option='Y'
-                ).count() / population_total_votes.count() * 100
-            except ZeroDivisionError:
-                population_approval = 0
+            vote['proposition'] = proposition_serializer.data
 
+            parliamentarians_approval, population_approval = \
+                proposition_approvals(user_vote, user_vote.proposition_id)
             vote['proposition']['parliamentarians_approval'] = \
-                round(parliamentarians_approval, 2)
-            vote['proposition']['population_approval'] = \
-                round(population_approval, 2)
+                parliamentarians_approval
+            vote['proposition']['population_approval'] = population_approval
             vote['proposition']['days_ago'] = (
                 timezone.now() - datetime.strptime(
                     vote['proposition']['last_update'] + '-0300',
@@ -1066,18 +1107,33 @@ class UserVoteViewset(viewsets.ModelViewSet):
                 )
             ).days
 
-        return response
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+
+        return Response(serializer.data)
 
     def create(self, request):
         user_id = request.user.id
         request.data['user'] = user_id
 
-        extended_user = ExtendedUser.objects.get(user=request.user)
-        if extended_user.should_update is False:
-            extended_user.should_update = True
-            extended_user.save()
+        with transaction.atomic():
+            response = super(UserVoteViewset, self).create(request)
 
-        response = super(UserVoteViewset, self).create(request)
+            update_tally(
+                response.data['proposition'],
+                USERS,
+                new_option=response.data['option']
+            )
+            update_vote_cube(
+                request.user,
+                response.data['proposition'],
+                new_option=response.data['option']
+            )
+            update_compatibility_vote(
+                request.user,
+                response.data['proposition'],
+                new_option=response.data['option']
+            )
 
         proposition = Proposition.objects.get(pk=response.data['proposition'])
         proposition_serializer = PropositionSerializer(proposition)
@@ -1086,12 +1142,27 @@ class UserVoteViewset(viewsets.ModelViewSet):
         return response
 
     def destroy(self, request, pk=None):
-        extended_user = ExtendedUser.objects.get(user=request.user)
-        if extended_user.should_update is False:
-            extended_user.should_update = True
-            extended_user.save()
+        user_vote = self.get_object()
+
+        with transaction.atomic():
+            response = super(UserVoteViewset, self).destroy(request, pk)
+
+            update_tally(
+                user_vote.proposition_id,
+                USERS,
+                old_option=user_vote.option
+            )
+            update_vote_cube(
+                request.user,
+                user_vote.proposition_id,
+                old_option=user_vote.option
+            )
+            update_compatibility_vote(
+                request.user,
+                user_vote.proposition_id,
+                old_option=user_vote.option
+            )
 
-        response = super(UserVoteViewset, self).destroy(request, pk)
         return response
 
     def retrieve(self, request, pk=None):
@@ -1107,11 +1178,6 @@ class UserVoteViewset(viewsets.ModelViewSet):
         user_id = request.user.id
         request.data['user'] = user_id
 
-        extended_user = ExtendedUser.objects.get(user=request.user)
-        if extended_user.should_update is False:
-            extended_user.should_update = True
-            extended_user.save()
-
         response = super(UserVoteViewset, self).partial_update(
             request,
             pk,
@@ -1122,15 +1188,21 @@ class UserVoteViewset(viewsets.ModelViewSet):
         user_id = request.user.id
         request.data['user'] = user_id
 
-        extended_user = ExtendedUser.objects.get(user=request.user)
-        if extended_user.should_update is False:
-            extended_user.should_update = True
-            extended_user.save()
+        user_vote = self.get_object()
 
-        response = super(UserVoteViewset, self).update(
-            request,
-            pk,
-            **kwargs)
+        with transaction.atomic():
+            response = super(UserVoteViewset, self).update(
+                request,
+                pk,
+                **kwargs)
+
+            update_user_vote_tally(user_vote, response.data)
+            update_user_vote_cube(user_vote, response.data)
+            update_compatibility_user_vote(
+                request.user,
+                user_vote,
+                response.data
+            )
 
         proposition = Proposition.objects.get(pk=response.data['proposition'])
         proposition_serializer = PropositionSerializer(proposition)
@@ -1175,11 +1247,8 @@ class UserFollowingViewset(mixins.ListModelMixin,
     def list(self, request):
         response = super(UserFollowingViewset, self).list(request)
 
-        extended_user = ExtendedUser.objects.get(user=request.user)
-        if extended_user.should_update:
-            update_compatibility(self)
-            extended_user.should_update = False
-            extended_user.save()
+        stale = update_compatibility(self)
+        compatibility_map = get_compatibility_map(request.user)
 
         for following in response.data['results']:
             parliamentary = \
@@ -1187,12 +1256,15 @@ class UserFollowingViewset(mixins.ListModelMixin,
             parliamentary_serializer = ParliamentarySerializer(parliamentary)
             following['parliamentary'] = parliamentary_serializer.data
 
-            compatibility = self.request.user.compatibilities.filter(
-                parliamentary=following['parliamentary']['id']
-            )[0].compatibility
+            compatibility = compatibility_map.get(
+                following['parliamentary']['id'],
+                0
+            )
             following['parliamentary']['compatibility'] = \
                 round(compatibility, 2)
 
+        response.data['stale'] = stale
+
         return response
 
     def create(self, request):
@@ -1209,7 +1281,12 @@ class UserFollowingViewset(mixins.ListModelMixin,
                 }
                 return Response(response, status=status.HTTP_400_BAD_REQUEST)
 
-            response = super(UserFollowingViewset, self).create(request)
+            with transaction.atomic():
+                response = super(UserFollowingViewset, self).create(request)
+                Parliamentary.objects.filter(
+                    pk=response.data['parliamentary']
+                ).update(follower_count=F('follower_count') + 1)
+            refresh_following_statistics()
 
             parliamentary = \
                 Parliamentary.objects.get(pk=response.data['parliamentary'])
@@ -1229,10 +1306,15 @@ class UserFollowingViewset(mixins.ListModelMixin,
                 user=request.user,
                 parliamentary__id=pk
             ):
-                UserFollowing.objects.get(
-                    user=request.user,
-                    parliamentary__id=pk
-                ).delete()
+                with transaction.atomic():
+                    deleted, _ = UserFollowing.objects.filter(
+                        user=request.user,
+                        parliamentary__id=pk
+                    ).delete()
+                    Parliamentary.objects.filter(pk=pk).update(
+                        follower_count=F('follower_count') - deleted
+                    )
+                refresh_following_statistics()
                 response = {
                     'detail': 'Deleted.'
                 }
@@ -1265,11 +1347,7 @@ class UserFollowingViewset(mixins.ListModelMixin,
             }
             return Response(response, status=status.HTTP_404_NOT_FOUND)
 
-        extended_user = ExtendedUser.objects.get(user=request.user)
-        if extended_user.should_update:
-            update_compatibility(self)
-            extended_user.should_update = False
-            extended_user.save()
+        stale = update_compatibility(self)
 
         user_following_serializer = UserFollowingSerializer(user_following)
         user_following_dict = dict(user_following_serializer.data)
@@ -1282,11 +1360,13 @@ class UserFollowingViewset(mixins.ListModelMixin,
         user_following_dict['parliamentary'] = \
             parliamentary_serializer.data
 
-        compatibility = self.request.user.compatibilities.filter(
-            parliamentary=user_following_dict['parliamentary']['id']
-        )[0].compatibility
+        compatibility = get_compatibility_map(request.user).get(
+            user_following_dict['parliamentary']['id'],
+            0
+        )
         user_following_dict['parliamentary']['compatibility'] = \
             round(compatibility, 2)
+        user_following_dict['stale'] = stale
 
         return Response(user_following_dict)
 
@@ -1295,97 +1375,178 @@ class StatisticViewset(viewsets.GenericViewSet):
 
     queryset = Parliamentary.objects.all()
 
-    @list_route(methods=['get'])
-    def most_active(self, request):
+    def leaderboard_response(self, request, kind, entry):
         """
-        Returns parliamentarians in votes count order.
+        Returns the page of the stored leaderboard of the given kind, with
+        an entry(count, parliamentary) for each of its parliamentarians.
+
+        Until the leaderboard is first stored, it is counted live and its
+        refresh is scheduled.
         """
+        entries = LeaderboardEntry.objects.filter(
+            kind=kind
+        ).order_by('rank').values_list('count', 'payload')
 
-        most_active = ParliamentaryVote.objects.filter(
-            Q(option='Y') | Q(option='N')
-        ).values('parliamentary').annotate(
-            votes=Count('option')
-        ).order_by('-votes', 'parliamentary__name')
+        paginator = LimitOffsetPagination()
 
-        for parliamentary in most_active:
-            parliamentary_obj = Parliamentary.objects.get(
-                id=parliamentary['parliamentary']
-            )
-            parliamentary['parliamentary'] = ParliamentarySerializer(
-                parliamentary_obj
-            ).data
+        page = paginator.paginate_queryset(entries, request)
+        if not (paginator.count if page is not None else entries):
+            schedule_leaderboard_refresh(kind)
+            entries = [
+                (count, payload)
+                for _, _, _, count, payload in leaderboard_rows(kind)
+            ]
+            page = paginator.paginate_queryset(entries, request)
 
-        paginator = LimitOffsetPagination()
+        if page is not None:
+            entries = page
+
+        leaderboard = [
+            entry(count, json.loads(payload)) for count, payload in entries
+        ]
 
-        page = paginator.paginate_queryset(most_active, request)
         if page is not None:
-            return paginator.get_paginated_response(page)
+            return paginator.get_paginated_response(leaderboard)
 
-        return Response(most_active)
+        return Response(leaderboard)
 
     @list_route(methods=['get'])
+    @conditional_response(INGEST, FOLLOWING, LEADERBOARD)
+    def most_active(self, request):
+        """
+        Returns parliamentarians in votes count order.
+        """
+
+        return self.leaderboard_response(
+            request,
+            LeaderboardEntry.MOST_ACTIVE,
+            lambda count, parliamentary: {
+                'parliamentary': parliamentary,
+                'votes': count
+            }
+        )
+
+    @list_route(methods=['get'])
+    @conditional_response(INGEST, FOLLOWING, LEADERBOARD)
     def most_followed(self, request):
         """
         Returns parliamentarians in followers count order.
         """
 
-        most_followed = Parliamentary.objects.values('id').annotate(
-            followers=Count('followers')
-        ).order_by('-followers', 'name')
+        return self.leaderboard_response(
+            request,
+            LeaderboardEntry.MOST_FOLLOWED,
+            lambda count, parliamentary: {
+                'followers': count,
+                'parliamentary': parliamentary
+            }
+        )
 
-        for parliamentary in most_followed:
-            parliamentary_obj = Parliamentary.objects.get(
-                id=parliamentary['id']
-            )
-            del parliamentary['id']
-            parliamentary['parliamentary'] = ParliamentarySerializer(
-                parliamentary_obj
-            ).data
+    @list_route(methods=['get'])
+    def most_compatible(self, request):
+        """
+        Returns parliamentarians in compatibility order, optionally
+        filtered by political_party and federal_unit.
+        """
+
+        stale = update_compatibility(self)
+
+        # Ordered as the (user, -compatibility, id) index, so that only the
+        # requested page is read
+        compatibilities = request.user.compatibilities.order_by(
+            '-compatibility',
+            'id'
+        )
+        compatibilities = compatibilities_filter(
+            self,
+            compatibilities
+        ).values(*compatibility_values_serializer.lookups())
 
         paginator = LimitOffsetPagination()
 
-        page = paginator.paginate_queryset(most_followed, request)
+        page = paginator.paginate_queryset(compatibilities, request)
         if page is not None:
-            return paginator.get_paginated_response(page)
+            compatibilities = page
+
+        compatibilities_list = list()
 
-        return Response(most_followed)
+        for compatibility_serialized in \
+                compatibility_values_serializer.serialize(compatibilities):
+
+            del compatibility_serialized['user']
+            compatibility_serialized['compatibility'] = \
+                round(compatibility_serialized['compatibility'], 2)
+
+            compatibilities_list.append(compatibility_serialized)
+
+        if page is not None:
+            response = paginator.get_paginated_response(compatibilities_list)
+            response.data['stale'] = stale
+            return response
+
+        return Response(compatibilities_list)
 
     @list_route(methods=['get'])
-    def most_compatible(self, request):
+    def most_compatible_parties(self, request):
         """
-        Returns parliamentarians in compatibility order.
+        Returns political parties in compatibility order, weighting the
+        compatibility of their parliamentarians by the valid votes.
         """
 
-        extended_user = ExtendedUser.objects.get(user=request.user)
+        return self.most_compatible_groups(
+            request,
+            GroupCompatibility.POLITICAL_PARTY
+        )
 
-        if extended_user.should_update:
-            update_compatibility(self)
-            extended_user.should_update = False
-            extended_user.save()
+    @list_route(methods=['get'])
+    def most_compatible_federal_units(self, request):
+        """
+        Returns federal units delegations in compatibility order, weighting
+        the compatibility of their parliamentarians by the valid votes.
+        """
 
-        compatibilities = request.user.compatibilities.all().order_by(
-            '-compatibility'
+        return self.most_compatible_groups(
+            request,
+            GroupCompatibility.FEDERAL_UNIT
         )
-        compatibilities_list = list()
 
-        for compatibility in compatibilities:
+    def most_compatible_groups(self, request, group):
 
-            compatibility_serialized = CompatibilitySerializer(
-                compatibility
-            ).data
-            del compatibility_serialized['user']
-            compatibility_serialized['compatibility'] = \
-                round(compatibility_serialized['compatibility'], 2)
+        stale = update_compatibility(self)
 
-            compatibilities_list.append(compatibility_serialized)
+        group_compatibilities = request.user.group_compatibilities.filter(
+            group=group
+        ).order_by(
+            '-compatibility',
+            'name'
+        )
 
         paginator = LimitOffsetPagination()
 
-        page = paginator.paginate_queryset(compatibilities_list, request)
+        page = paginator.paginate_queryset(group_compatibilities, request)
         if page is not None:
-            return paginator.get_paginated_response(page)
+            group_compatibilities = page
 
-        return Response(compatibilities_list)
+        group_compatibilities_list = list()
+
+        for group_compatibility_serialized in GroupCompatibilitySerializer(
+            group_compatibilities,
+            many=True
+        ).data:
+
+            group_compatibility_serialized['compatibility'] = \
+                round(group_compatibility_serialized['compatibility'], 2)
+
+            group_compatibilities_list.append(group_compatibility_serialized)
+
+        if page is not None:
+            response = paginator.get_paginated_response(
+                group_compatibilities_list
+            )
+            response.data['stale'] = stale
+            return response
+
+        return Response(group_compatibilities_list)
 
 
 class ContactUsViewset(mixins.CreateModelMixin,
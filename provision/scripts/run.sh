@@ -20,4 +20,9 @@ done
 
 echo "Postgres is up - continuing"
 
+# Runs the given command (as the celery worker and beat) instead of the API
+if [ $# -gt 0 ]; then
+  exec "$@"
+fi
+
 gunicorn voxpopapi.wsgi -b 0.0.0.0:8000
@@ -88,8 +88,8 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 10,
     'DEFAULT_PERMISSION_CLASSES': (),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.BasicAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedBasicAuthentication',
+        'api.authentication.CachedTokenAuthentication',
         'oauth2_provider.contrib.rest_framework.OAuth2Authentication',
         'rest_framework_social_oauth2.authentication.SocialAuthentication',
     )
@@ -170,6 +170,59 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATIC_ROOT = '/static/'
 
+# Compatibility
+
+# Engine used to compute the users compatibilities with the parliamentarians:
+# 'sql' (one database aggregation query), 'matrix' (in-memory numpy vote
+# matrix) or 'bitset' (in-memory parliamentary votes bitsets, updated
+# incrementally)
+COMPATIBILITY_ENGINE = 'bitset'
+
+# Seconds a scheduled compatibility recompute waits, so that the votes cast
+# meanwhile are coalesced into it
+COMPATIBILITY_UPDATE_DEBOUNCE = 30
+
+# Seconds after which a scheduled compatibility recompute that didn't run
+# (as when its task was lost) may be scheduled again
+COMPATIBILITY_UPDATE_SCHEDULE_TIMEOUT = 10 * 60
+
+# Refresh of the compatibilities of all users affected by a parliamentary
+# votes ingest: seconds it waits for further ingests, number of processes
+# (None for one per CPU) and users per chunk given to each process
+COMPATIBILITY_REFRESH_DEBOUNCE = 60
+COMPATIBILITY_REFRESH_PROCESSES = None
+COMPATIBILITY_REFRESH_CHUNK_SIZE = 100
+
+# Seconds the {parliamentary: compatibility} map of an user is cached for the
+# current version of his compatibilities
+COMPATIBILITY_MAP_TIMEOUT = 60 * 60
+
+# File where the parliamentarians similarity matrix is stored after every
+# parliamentary votes ingest, in the (git ignored) data directory shared by
+# the API and the celery worker
+SIMILARITY_MATRIX_PATH = os.path.join(
+    BASE_DIR,
+    'data',
+    'similarity_matrix.npz'
+)
+
+# Seconds the parliamentarians autocomplete index of a process is used before
+# being built again, so that processes other than the one creating the
+# parliamentarians pick them up
+AUTOCOMPLETE_TTL = 60 * 60
+
+# Tallies
+
+# Counter rows each proposition vote tally is sharded in, so that votes cast
+# at the same time on a proposition don't wait for each other
+TALLY_SHARDS = 8
+
+# Statistics
+
+# Seconds a scheduled most_active or most_followed leaderboard refresh waits,
+# so that the ingests and followings made meanwhile are coalesced into it
+LEADERBOARD_REFRESH_DEBOUNCE = 10
+
 # Celery application definition
 
 CELERY_BROKER_URL = 'redis://redis:6379'
@@ -186,6 +239,20 @@ CELERY_BEAT_SCHEDULE = {
     'get_propositions': {
         'task': 'api.tasks.get_propositions',
         'schedule': crontab(minute=0, hour=0, day_of_week='wednesday')
+    },
+    'compact_tallies': {
+        'task': 'api.tasks.compact_tallies',
+        'schedule': crontab(minute='*/10')
+    },
+    # Moves the voters who changed age buckets in the demographic cube
+    'rebuild_demographic_cube': {
+        'task': 'api.tasks.rebuild_demographic_cube',
+        'schedule': crontab(minute=0, hour=3)
+    },
+    # Repairs the parliamentarians follower_count drifted from UserFollowing
+    'reconcile_follower_counts': {
+        'task': 'api.tasks.reconcile_follower_counts',
+        'schedule': crontab(minute=30)
     }
     # 'task_example': {
     #     'task': 'app.tasks.task_example',
@@ -193,3 +260,35 @@ CELERY_BEAT_SCHEDULE = {
     #     'args': (*args)
     # }
 }
+
+# Response cache
+
+# Cached responses of the public read endpoints and the generation counters
+# keying them, and the users resolved from Basic and Token credentials
+# (for TIMEOUT seconds, at most MAX_ENTRIES of them). The
+# 'api.cache_backends.RedisCache' backend, with the CELERY_BROKER_URL as
+# LOCATION, shares them between processes
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+    },
+    'auth': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'auth',
+        'TIMEOUT': 5 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+# Seconds a cached response is kept, at most, while its data doesn't change
+RESPONSE_CACHE_TIMEOUT = 60 * 60
+
+# Seconds the demographics of a proposition are cached, at most, while its
+# votes don't change (the voters ages move on regardless)
+DEMOGRAPHICS_CACHE_TIMEOUT = 60 * 60
@@ -14,3 +14,14 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "voxpopapi.settings")
 
 application = get_wsgi_application()
+
+# Builds the parliamentarians autocomplete index at worker startup, instead
+# of in the first search box request
+from django.db import DatabaseError  # noqa: E402
+
+from api.autocomplete import get_autocomplete_index  # noqa: E402
+
+try:
+    get_autocomplete_index()
+except DatabaseError:
+    pass